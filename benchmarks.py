@@ -0,0 +1,891 @@
+"""Бенчмарки горячих участков игры
+
+Запуск: python benchmarks.py [имя ...] [--baseline PATH] [--save-baseline PATH]
+Без имён выполняются все бенчмарки из BENCHMARKS. С --baseline рядом с каждым
+числом печатается его изменение относительно сохранённых результатов, эталон
+для этой машины лежит в benchmarks_baseline.json.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+import platformer
+from platformer import (
+    AssetCache, BulletPool, FrameProfiler, InputState, ObservationRenderer, Platform, PlatformerEnv, Player, Recording,
+    RenderQueue, Renderer, TurretGroup, Turret, VectorEnv, World,
+    build_level, compile_level, load_compiled_level, make_level_factory, write_level_json, read_level_json,
+)
+
+SURFACE_METHODS = {
+    "copy", "scale", "smoothscale", "flip", "rotate",
+    "convert", "convert_alpha", "subsurface", "render",
+}
+
+
+class SurfaceCounter:
+    """Контекстный менеджер, считающий создание поверхностей pygame
+
+    Учитываются вызовы конструктора pygame.Surface и методов, возвращающих
+    новую поверхность (copy, transform.scale, Font.render и т.д.).
+
+    :ivar count: Количество созданных поверхностей
+    :type count: int
+    """
+
+    def __init__(self):
+        """
+        Конструктор класса SurfaceCounter
+        """
+        self.count = 0
+        self._surface_class = None
+
+    def __enter__(self):
+        counter = self
+        self._surface_class = pygame.Surface
+
+        class CountingSurface(self._surface_class):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+
+        pygame.Surface = CountingSurface
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+        pygame.Surface = self._surface_class
+        return False
+
+    def _profile(self, frame, event, arg):
+        if event == "c_call" and getattr(arg, "__name__", None) in SURFACE_METHODS:
+            self.count += 1
+
+
+def setup_display():
+    """
+    Инициализирует pygame с минимальным окном для convert()
+    """
+    pygame.init()
+    if pygame.display.get_surface() is None:
+        pygame.display.set_mode((1, 1))
+
+
+def legacy_player_image(player):
+    """
+    Формирование кадра игрока так, как это делалось до введения состояний спрайта
+
+    :param player: Объект игрока
+    :type player: Player
+    """
+    if player.immune:
+        image = player.original_image.copy()
+        blue_filter = pygame.Surface(image.get_size())
+        blue_filter.fill((100, 200, 255))
+        image.blit(blue_filter, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+        player.image = pygame.transform.scale(image, (50, 70))
+    else:
+        player.image = pygame.transform.scale(player.original_image, (50, 70))
+
+
+def bench_player_frames(frames=2000):
+    """
+    Сравнивает количество созданных поверхностей и время кадра Player.update
+    до и после перехода на заранее подготовленные кадры
+
+    :param frames: Количество кадров для каждого замера
+    :type frames: int
+    :returns: Список строк результатов (режим, состояние, поверхностей/кадр, мкс/кадр)
+    :rtype: list
+    """
+    setup_display()
+    results = []
+    for mode in ("before", "after"):
+        for immune in (False, True):
+            player = Player(100, 100)
+            with SurfaceCounter() as counter:
+                start = time.perf_counter()
+                for _ in range(frames):
+                    player.immune = immune
+                    player.immune_time = sys.maxsize if immune else 0
+                    player.rect.topleft = (100, 100)
+                    player.update([], [], [], [], 1000, 600, 0, 0)
+                    if mode == "before":
+                        legacy_player_image(player)
+                elapsed = time.perf_counter() - start
+            state = "immune" if immune else "normal"
+            results.append((mode, state, counter.count / frames, elapsed / frames * 1e6))
+    return results
+
+
+class GCMonitor:
+    """Контекстный менеджер, измеряющий количество и длительность сборок мусора
+
+    :ivar collections: Количество сборок
+    :type collections: int
+    :ivar total_pause: Суммарная длительность сборок в секундах
+    :type total_pause: float
+    :ivar max_pause: Самая долгая сборка в секундах
+    :type max_pause: float
+    """
+
+    def __init__(self):
+        """
+        Конструктор класса GCMonitor
+        """
+        self.collections = 0
+        self.total_pause = 0.0
+        self.max_pause = 0.0
+        self._start = None
+
+    def __enter__(self):
+        gc.collect()
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self._callback)
+        return False
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            pause = time.perf_counter() - self._start
+            self.collections += 1
+            self.total_pause += pause
+            self.max_pause = max(self.max_pause, pause)
+            self._start = None
+
+
+def _fire_bullets(bullets, turrets):
+    """
+    Турели выпускают заданное количество пуль и обновляют их до попадания в стену
+
+    :param bullets: Общее количество выстрелов
+    :type bullets: int
+    :param turrets: Количество турелей
+    :type turrets: int
+    """
+    group = TurretGroup(*(Turret(0, y * 40, "right") for y in range(turrets)))
+    walls = [Platform(300, 0, 20, turrets * 40 + 100)]
+    fired = 0
+    while fired < bullets or any(turret.bullets for turret in group):
+        for turret in group:
+            if fired < bullets:
+                turret.shoot()
+                fired += 1
+            for bullet in turret.bullets[:]:
+                if bullet.update(walls):
+                    turret.remove_bullet(bullet)
+                else:
+                    group.bullet_grid.move(bullet)
+
+
+def bench_bullet_pool(bullets=10000, turrets=20):
+    """
+    Стресс-тест: турели выпускают заданное количество пуль, которые
+    разбиваются о стену, с пулом пуль и без него
+
+    Время и паузы GC измеряются в отдельном прогоне без tracemalloc.
+
+    :param bullets: Общее количество выстрелов
+    :type bullets: int
+    :param turrets: Количество турелей
+    :type turrets: int
+    :returns: Список строк результатов (режим, создано пуль, пик памяти в КиБ, сборок GC,
+        суммарная пауза GC в мс, максимальная пауза GC в мс, мкс на выстрел)
+    :rtype: list
+    """
+    setup_display()
+    results = []
+    original_pool = platformer.bullet_pool
+    try:
+        for mode, max_size in (("no pool", 0), ("pool", 1024)):
+            platformer.bullet_pool = pool = BulletPool(max_size)
+            tracemalloc.start()
+            _fire_bullets(bullets, turrets)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            platformer.bullet_pool = pool = BulletPool(max_size)
+            with GCMonitor() as monitor:
+                start = time.perf_counter()
+                _fire_bullets(bullets, turrets)
+                elapsed = time.perf_counter() - start
+            results.append((mode, pool.created, peak / 1024, monitor.collections,
+                            monitor.total_pause * 1000, monitor.max_pause * 1000, elapsed / bullets * 1e6))
+    finally:
+        platformer.bullet_pool = original_pool
+    return results
+
+
+def generate_level_data(entities, seed=0):
+    """
+    Генерирует описание уровня заданного размера в формате default_level_data()
+
+    Уровень вытягивается в ширину так, чтобы на экран шириной 1000 пикселей
+    приходилось около 25 объектов. Земля разбита на сегменты по 2000 пикселей,
+    а размеры платформ берутся из небольшого набора, как в рисованных уровнях.
+
+    :param entities: Общее количество объектов уровня
+    :type entities: int
+    :param seed: Зерно генератора случайных чисел
+    :type seed: int
+    :returns: Описание уровня
+    :rtype: dict
+    """
+    rng = random.Random(seed)
+    width = max(platformer.SCREEN_WIDTH, entities * 40)
+    height = platformer.LEVEL_HEIGHT
+    data = {
+        "width": width,
+        "height": height,
+        "platforms": [(x, height - 40, min(2000, width - x), 40) for x in range(0, width, 2000)],
+        "vertical_platforms": [],
+        "spikes": [],
+        "turrets": [],
+        "items": [],
+        "checkpoint": (width - 100, height - 120),
+    }
+    for _ in range(entities - len(data["platforms"]) - 1):
+        x = rng.randrange(200, width - 200)
+        roll = rng.random()
+        if roll < 0.4:
+            data["platforms"].append((x, rng.randrange(250, height - 100), rng.randrange(80, 221, 20), rng.choice((20, 25, 30))))
+        elif roll < 0.5:
+            data["vertical_platforms"].append((x, rng.randrange(300, height - 160), rng.randrange(20, 36, 5), rng.randrange(80, 181, 20)))
+        elif roll < 0.7:
+            size = rng.choice((30, 50))
+            data["spikes"].append((x, height - 40 - size, size, size))
+        elif roll < 0.75:
+            data["turrets"].append((x, rng.randrange(200, height - 100), rng.choice(("left", "right"))))
+        else:
+            data["items"].append((x, rng.randrange(200, height - 80), rng.choice(("life", "speed", "immune"))))
+    return data
+
+
+def bench_level_load(sizes=(10 ** 3, 10 ** 4, 10 ** 5)):
+    """
+    Сравнивает загрузку уровня из JSON и из скомпилированного файла
+
+    Скомпилированный уровень загружается двумя способами: целиком через
+    load_compiled_level и так, как его загружает игра, — потоком секций
+    с созданием спрайтов рядом с точкой появления.
+
+    :param sizes: Количество объектов генерируемых уровней
+    :type sizes: tuple
+    :returns: Список строк результатов (объектов, мс JSON, мс компиляции, мс загрузки скомпилированного,
+        мс загрузки скомпилированного потоком)
+    :rtype: list
+    """
+    setup_display()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            data = generate_level_data(size)
+            json_path = os.path.join(directory, f"level{size}.json")
+            compiled_path = os.path.join(directory, f"level{size}.lvl")
+            write_level_json(data, json_path)
+            gc.collect()
+            start = time.perf_counter()
+            build_level(read_level_json(json_path))
+            json_time = time.perf_counter() - start
+            start = time.perf_counter()
+            compile_level(data, compiled_path)
+            compile_time = time.perf_counter() - start
+            gc.collect()
+            start = time.perf_counter()
+            load_compiled_level(compiled_path)
+            load_time = time.perf_counter() - start
+            gc.collect()
+            start = time.perf_counter()
+            make_level_factory(compiled_path)().update(0)
+            stream_time = time.perf_counter() - start
+            results.append((size, json_time * 1000, compile_time * 1000, load_time * 1000, stream_time * 1000))
+    return results
+
+
+def random_recording(ticks, seed=0):
+    """
+    Записывает сессию со случайным управлением на встроенном уровне
+
+    Управление меняется не чаще раза в 15 тиков, как при игре человека.
+
+    :param ticks: Длина сессии в тиках
+    :type ticks: int
+    :param seed: Зерно генератора случайных чисел
+    :type seed: int
+    :returns: Запись с контрольной суммой конечного состояния
+    :rtype: Recording
+    """
+    rng = random.Random(seed)
+    world = World()
+    recording = Recording(world.tick_rate)
+    controls = InputState()
+    for tick in range(ticks):
+        if tick % 15 == 0:
+            controls = InputState.from_bits(rng.randrange(8))
+        recording.append(controls)
+        world.step(controls)
+    recording.finish(world)
+    return recording
+
+
+def bench_replay(sessions=20, ticks=3600):
+    """
+    Измеряет скорость повтора записанных сессий без отрисовки
+
+    :param sessions: Количество сессий
+    :type sessions: int
+    :param ticks: Длина каждой сессии в тиках
+    :type ticks: int
+    :returns: Строка результатов (сессий, тиков, совпавших сумм, тиков/с, мс на сессию)
+    :rtype: list
+    """
+    setup_display()
+    recordings = [random_recording(ticks, seed) for seed in range(sessions)]
+    matched = 0
+    start = time.perf_counter()
+    for recording in recordings:
+        matched += platformer.replay(recording)[1]
+    elapsed = time.perf_counter() - start
+    total = sessions * ticks
+    return [(sessions, total, matched, total / elapsed, elapsed / sessions * 1000)]
+
+
+def scripted_controls(tick):
+    """
+    Управление для бенчмарков: всё время вправо с прыжком раз в 40 тиков
+
+    :param tick: Номер тика
+    :type tick: int
+    :rtype: InputState
+    """
+    return InputState(right=True, jump=tick % 40 == 0)
+
+
+def _scaling_world(level):
+    """
+    Создаёт мир на готовом уровне с практически бесконечными жизнями игрока
+
+    :param level: Кортеж объектов уровня
+    :type level: tuple
+    :rtype: World
+    """
+    world = World(lambda: level)
+    world.player.lives = 10 ** 9
+    return world
+
+
+def bench_scaling(sizes=(10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5), ticks=300):
+    """
+    Прогоняет фиксированное число тиков симуляции и отрисовки на уровнях разного размера
+
+    Уровни строятся generate_level_data и build_level, отрисовка идёт в
+    поверхность вне экрана. Время кадра снимается FrameProfiler, пик памяти
+    (построение уровня и первые 60 тиков) — отдельным прогоном под tracemalloc.
+
+    :param sizes: Количество объектов уровней
+    :type sizes: tuple
+    :param ticks: Количество тиков на уровень
+    :type ticks: int
+    :returns: Список строк результатов (объектов, тиков/с, p50 мс, p95 мс, p99 мс,
+        худший кадр мс, p95 турелей мс, пик памяти в МиБ)
+    :rtype: list
+    """
+    setup_display()
+    screen = pygame.Surface((platformer.SCREEN_WIDTH, platformer.SCREEN_HEIGHT))
+    background = pygame.Surface(screen.get_size())
+    results = []
+    for size in sizes:
+        data = generate_level_data(size)
+        tracemalloc.start()
+        world = _scaling_world(build_level(data))
+        assert world.level_width == data["width"]
+        world.run(60, InputState(right=True))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del world
+        gc.collect()
+
+        world = _scaling_world(build_level(data))
+        renderer = Renderer(screen, background)
+        renderer.set_level(*world.level)
+        profiler = FrameProfiler(window=ticks)
+        world.profiler = renderer.profiler = profiler
+        start = time.perf_counter()
+        for tick in range(ticks):
+            profiler.begin_frame()
+            world.step(scripted_controls(tick))
+            renderer.draw(world.player, world.camera_x, world.camera_y)
+            profiler.end_frame()
+        elapsed = time.perf_counter() - start
+        p50, p95, p99 = profiler.percentiles()
+        worst = max(sum(frame) for frame in profiler.recent)
+        results.append((size, ticks / elapsed, p50, p95, p99, worst, profiler.percentiles("turrets")[1], peak / 2 ** 20))
+    return results
+
+
+def bench_vector_env(num_envs=16, steps=500, workers=None):
+    """
+    Сравнивает пропускную способность одной среды и VectorEnv
+
+    :param num_envs: Количество сред векторного прогона
+    :type num_envs: int
+    :param steps: Количество шагов каждой среды
+    :type steps: int
+    :param workers: Количество процессов, по умолчанию по числу ядер
+    :type workers: int
+    :returns: Список строк результатов (режим, сред, процессов, шагов/с, шагов/час в миллионах)
+    :rtype: list
+    """
+    rng = random.Random(0)
+    actions = [[rng.randrange(PlatformerEnv.ACTIONS) for _ in range(num_envs)] for _ in range(steps)]
+    results = []
+
+    env = PlatformerEnv()
+    env.reset()
+    start = time.perf_counter()
+    for step_actions in actions:
+        if env.step(step_actions[0])[2]:
+            env.reset()
+    rate = steps / (time.perf_counter() - start)
+    results.append(("single", 1, 1, rate, rate * 3600 / 1e6))
+
+    with VectorEnv(num_envs, workers) as vector:
+        vector.reset()
+        start = time.perf_counter()
+        for step_actions in actions:
+            vector.step(step_actions)
+        rate = steps * num_envs / (time.perf_counter() - start)
+        results.append(("vector", num_envs, len(vector._processes), rate, rate * 3600 / 1e6))
+    return results
+
+
+def bench_observation(ticks=300):
+    """
+    Сравнивает получение наблюдения из полного кадра и из ObservationRenderer
+
+    Полный путь — Renderer.draw в поверхность размером с экран и копия
+    пикселей через surfarray.array3d, как делал бы агент без отдельного
+    рендера наблюдений.
+
+    :param ticks: Количество кадров на режим
+    :type ticks: int
+    :returns: Список строк результатов (режим, ширина, высота, байт на кадр, мс на кадр)
+    :rtype: list
+    """
+    setup_display()
+    cameras = []
+    world = World()
+    for tick in range(ticks):
+        world.step(scripted_controls(tick))
+        cameras.append((world.camera_x, world.camera_y))
+    screen = pygame.Surface((platformer.SCREEN_WIDTH, platformer.SCREEN_HEIGHT))
+    renderer = Renderer(screen, pygame.Surface(screen.get_size()))
+    renderer.set_level(*world.level)
+
+    def full(camera_x, camera_y):
+        renderer.draw(world.player, camera_x, camera_y)
+        return pygame.surfarray.array3d(screen)
+
+    modes = [("full", full)]
+    for mode, size in (("pixels", (100, 60)), ("grid", (50, 30))):
+        observer = ObservationRenderer(*size, mode=mode)
+        modes.append((mode, lambda camera_x, camera_y, observer=observer: observer.render(world, camera_x, camera_y)))
+    results = []
+    for mode, observe in modes:
+        gc.collect()
+        start = time.perf_counter()
+        for camera_x, camera_y in cameras:
+            frame = observe(camera_x, camera_y)
+        elapsed = time.perf_counter() - start
+        height, width = frame.shape[:2] if mode != "full" else frame.shape[1::-1]
+        results.append((mode, width, height, frame.nbytes, elapsed / ticks * 1000))
+    return results
+
+
+def bench_assets(size=10 ** 4, repeats=5):
+    """
+    Сравнивает загрузку изображений из отдельных файлов и из атласа
+
+    Для каждого режима замеряется AssetCache.preload на пустом кэше, затем
+    на этом кэше строится уровень и считаются различные поверхности
+    спрайтов и пиксельная память поверхностей-владельцев (срезы атласа
+    учитываются один раз вместе с атласом).
+
+    :param size: Количество объектов уровня
+    :type size: int
+    :param repeats: Количество замеров загрузки, берётся лучший
+    :type repeats: int
+    :returns: Список строк результатов (режим, декодировано файлов, мс загрузки,
+        поверхностей спрайтов, МиБ пикселей)
+    :rtype: list
+    """
+    setup_display()
+    data = generate_level_data(size)
+    results = []
+    for mode, manifest in (("files", None), ("atlas", platformer.ATLAS_MANIFEST)):
+        timings = []
+        for _ in range(repeats):
+            cache = AssetCache(manifest=manifest)
+            gc.collect()
+            start = time.perf_counter()
+            cache.preload()
+            timings.append(time.perf_counter() - start)
+        previous = platformer.assets
+        platformer.assets = cache
+        try:
+            level = build_level(data)
+        finally:
+            platformer.assets = previous
+        images = {id(sprite.image): sprite.image for group in level[:4] for sprite in group}
+        owners = {}
+        for image in list(images.values()) + list(cache.images.values()):
+            while image.get_parent() is not None:
+                image = image.get_parent()
+            owners[id(image)] = image
+        pixels = sum(image.get_width() * image.get_height() * image.get_bytesize() for image in owners.values())
+        decoded = sum(path not in cache.regions for path, _ in cache.images) + (cache.atlas is not None)
+        results.append((mode, decoded, min(timings) * 1000, len(images), pixels / 2 ** 20))
+    return results
+
+
+def bench_render_queue(counts=(100, 1000, 5000), frames=100):
+    """
+    Сравнивает отрисовку отдельными blit и через RenderQueue
+
+    Спрайты трёх видов раскладываются по экрану случайно и распределяются
+    по четырём слоям. В режиме "blit" каждый объект выводится отдельным
+    вызовом в порядке слоёв, в режимах "queue" и "queue sorted" списки
+    слоёв ставятся в очередь и выводятся по одному blits на слой.
+
+    :param counts: Количества спрайтов
+    :type counts: tuple
+    :param frames: Количество кадров на замер
+    :type frames: int
+    :returns: Список строк результатов (спрайтов, режим, вызовов за кадр, мкс на кадр)
+    :rtype: list
+    """
+    setup_display()
+    rng = random.Random(0)
+    screen = pygame.Surface((platformer.SCREEN_WIDTH, platformer.SCREEN_HEIGHT))
+    images = []
+    for size, color in (((15, 15), (255, 50, 50)), ((30, 30), (255, 215, 0)), ((70, 60), (50, 255, 50))):
+        image = pygame.Surface(size, pygame.SRCALPHA)
+        image.fill(color)
+        images.append(image)
+    results = []
+    for count in counts:
+        sprites = [
+            (rng.choice(images), pygame.Rect(rng.randrange(screen.get_width()), rng.randrange(screen.get_height()), 1, 1),
+             rng.randrange(4))
+            for _ in range(count)
+        ]
+        ordered = sorted(sprites, key=lambda sprite: sprite[2])
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(frames):
+            for image, rect, layer in ordered:
+                screen.blit(image, rect)
+        results.append((count, "blit", count, (time.perf_counter() - start) / frames * 1e6))
+        layers = [[(image, rect) for image, rect, sprite_layer in sprites if sprite_layer == layer] for layer in range(4)]
+        for mode, queue in (("queue", RenderQueue()), ("queue sorted", RenderQueue(sort=True))):
+            gc.collect()
+            start = time.perf_counter()
+            for _ in range(frames):
+                queue.clear()
+                for layer, items in enumerate(layers):
+                    queue.extend(items, layer)
+                queue.flush(screen)
+            results.append((count, mode, queue.draw_calls, (time.perf_counter() - start) / frames * 1e6))
+    return results
+
+
+def bench_collision(tile_widths=(400, 64, 16), ticks=600):
+    """
+    Сравнивает столкновения по прямоугольникам платформ и по CollisionMap
+
+    Пол и полки уровня нарезаются на платформы шириной tile_width, поэтому
+    при уменьшении ширины рядом с игроком оказывается всё больше платформ
+    при той же геометрии. Игрок бежит вправо и прыгает по scripted_controls.
+
+    :param tile_widths: Ширины платформ
+    :type tile_widths: tuple
+    :param ticks: Количество тиков на замер
+    :type ticks: int
+    :returns: Список строк результатов (ширина платформы, платформ, режим,
+        мс создания мира с картой, мкс на тик игрока)
+    :rtype: list
+    """
+    setup_display()
+    width = 8000
+    results = []
+    for tile_width in tile_widths:
+        spans = [(0, 760, width, 40)] + [(x, 600 - x % 3 * 80, 800, 24) for x in range(400, width - 800, 1200)]
+        data = {
+            "width": width, "height": platformer.LEVEL_HEIGHT,
+            "platforms": [(x, y, min(tile_width, left + span - x), height)
+                          for left, y, span, height in spans for x in range(left, left + span, tile_width)],
+            "vertical_platforms": [], "spikes": [], "turrets": [], "items": [],
+            "checkpoint": (width - 100, 680),
+        }
+        for mode in ("rects", "tiles"):
+            level = build_level(data)
+            start = time.perf_counter()
+            world = World(lambda: level, tile_collision=mode == "tiles")
+            build = (time.perf_counter() - start) * 1000
+            profiler = FrameProfiler(window=ticks)
+            world.profiler = profiler
+            gc.collect()
+            for tick in range(ticks):
+                profiler.begin_frame()
+                world.step(scripted_controls(tick))
+                profiler.end_frame()
+            results.append((tile_width, len(data["platforms"]), mode, build,
+                            profiler.percentiles("player")[0] * 1000))
+    return results
+
+
+def bench_hazards(size=10 ** 4, ticks=12000, chunk=100):
+    """
+    Сравнивает касание шипов и пуль по прямоугольникам и по маскам
+
+    Два мира с настоящими изображениями и рядом шипов на полу через каждые
+    90 пикселей идут по scripted_controls в режимах Player.pixel_perfect =
+    False и True. Миры продвигаются поочерёдно кусками по chunk тиков,
+    чтобы колебания частоты процессора одинаково влияли на оба режима.
+    Маски строятся один раз на изображение и проверяются только после
+    пересечения прямоугольников.
+
+    :param size: Количество объектов уровня
+    :type size: int
+    :param ticks: Количество тиков каждого мира
+    :type ticks: int
+    :param chunk: Количество тиков между переключениями миров
+    :type chunk: int
+    :returns: Список строк результатов (режим, попаданий, мкс на тик игрока,
+        мкс на тик, накладные расходы тика в процентах)
+    :rtype: list
+    """
+    setup_display()
+    data = generate_level_data(size)
+    floor = data["height"] - 40
+    data["spikes"] += [(x, floor - 30, 30, 30) for x in range(300, data["width"] - 200, 90)]
+    modes = ("rects", "masks")
+    worlds = {}
+    for mode in modes:
+        world = _scaling_world(build_level(data))
+        world.player.pixel_perfect = mode == "masks"
+        world.profiler = FrameProfiler(window=ticks)
+        worlds[mode] = world
+    elapsed = dict.fromkeys(modes, 0.0)
+    gc.collect()
+    for first in range(0, ticks, chunk):
+        for mode in modes:
+            world = worlds[mode]
+            profiler = world.profiler
+            start = time.perf_counter()
+            for tick in range(first, min(first + chunk, ticks)):
+                profiler.begin_frame()
+                world.step(scripted_controls(tick))
+                profiler.end_frame()
+            elapsed[mode] += time.perf_counter() - start
+    results = []
+    for mode in modes:
+        world = worlds[mode]
+        results.append((mode, 10 ** 9 - world.player.lives, world.profiler.percentiles("player")[0] * 1000,
+                        elapsed[mode] / ticks * 1e6, (elapsed[mode] / elapsed["rects"] - 1) * 100))
+    return results
+
+
+def bench_snapshot(sizes=(10 ** 3, 10 ** 4), ticks=600, repeats=10):
+    """
+    Сравнивает перезапуск уровня пересозданием (World.reset) и восстановлением снимка
+
+    Перед каждым замером мир проходит ticks тиков по scripted_controls, чтобы
+    игрок собрал предметы, а турели выпустили пули. Для snapshot и restart
+    берётся лучшее время из repeats замеров.
+
+    :param sizes: Количество объектов уровней
+    :type sizes: tuple
+    :param ticks: Количество тиков перед каждым замером
+    :type ticks: int
+    :param repeats: Количество замеров каждого режима
+    :type repeats: int
+    :returns: Список строк результатов (объектов, режим, мкс, ускорение относительно reset)
+    :rtype: list
+    """
+    setup_display()
+    results = []
+    for size in sizes:
+        data = generate_level_data(size)
+        world = World(lambda: build_level(data))
+        times = {"reset": [], "snapshot": [], "restart": []}
+        for repeat in range(repeats):
+            for tick in range(ticks):
+                world.step(scripted_controls(tick))
+            start = time.perf_counter()
+            world.snapshot()
+            times["snapshot"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            if repeat < 3:
+                world.reset()
+                times["reset"].append(time.perf_counter() - start)
+            else:
+                world.restart()
+                times["restart"].append(time.perf_counter() - start)
+        reset = min(times["reset"])
+        for mode in ("reset", "snapshot", "restart"):
+            best = min(times[mode])
+            results.append((size, mode, best * 1e6, reset / best))
+    return results
+
+
+BENCHMARKS = {
+    "scaling": (bench_scaling, ("entities", "ticks/s", "p50 ms", "p95 ms", "p99 ms", "max ms", "turrets p95 ms", "peak MiB")),
+    "player": (bench_player_frames, ("mode", "state", "surfaces/frame", "us/frame")),
+    "level_load": (bench_level_load, ("entities", "json ms", "compile ms", "compiled load ms", "streamed load ms")),
+    "replay": (bench_replay, ("sessions", "ticks", "matched", "ticks/s", "ms/session")),
+    "vector_env": (bench_vector_env, ("mode", "envs", "workers", "steps/s", "M steps/hour")),
+    "assets": (bench_assets, ("mode", "files decoded", "load ms", "sprite surfaces", "pixel MiB")),
+    "hazards": (bench_hazards, ("mode", "hits", "player us/tick", "us/tick", "overhead %")),
+    "snapshot": (bench_snapshot, ("entities", "mode", "us", "speedup")),
+    "collision": (bench_collision, ("tile width", "platforms", "mode", "build ms", "player us/tick")),
+    "render_queue": (bench_render_queue, ("sprites", "mode", "draw calls", "us/frame")),
+    "observation": (bench_observation, ("mode", "width", "height", "bytes/frame", "ms/frame")),
+    "bullets": (bench_bullet_pool, ("mode", "created", "peak KiB", "gc runs", "gc ms", "gc max ms", "us/shot")),
+}
+
+
+def format_value(value, baseline=None):
+    """
+    Форматирует значение ячейки таблицы, добавляя изменение относительно базовой линии
+
+    :param value: Значение
+    :param baseline: Значение той же ячейки в базовой линии или None
+    :returns: Строка ячейки
+    :rtype: str
+    """
+    if not isinstance(value, float):
+        return str(value)
+    text = f"{value:.2f}"
+    if isinstance(baseline, (int, float)) and baseline:
+        text += f" ({(value - baseline) / baseline * 100:+.1f}%)"
+    return text
+
+
+def print_table(name, header, rows, baseline=None):
+    """
+    Печатает результаты бенчмарка в виде таблицы
+
+    :param name: Имя бенчмарка
+    :type name: str
+    :param header: Заголовки столбцов
+    :type header: tuple
+    :param rows: Строки результатов
+    :type rows: list
+    :param baseline: Строки того же бенчмарка из базовой линии или None
+    :type baseline: list
+    """
+    print(f"== {name}")
+    print("\t".join(header))
+    if baseline is None or len(baseline) != len(rows):
+        baseline = [()] * len(rows)
+    for row, base in zip(rows, baseline):
+        base = list(base) + [None] * (len(row) - len(base))
+        print("\t".join(format_value(value, old) for value, old in zip(row, base)))
+
+
+def load_baseline(path):
+    """
+    Читает сохранённые результаты бенчмарков
+
+    :param path: Путь к JSON-файлу
+    :type path: str
+    :returns: Словарь {имя бенчмарка: строки результатов}
+    :rtype: dict
+    """
+    with open(path, encoding="utf-8") as file:
+        return {name: entry["rows"] for name, entry in json.load(file).items()}
+
+
+def save_baseline(path, results):
+    """
+    Сохраняет результаты бенчмарков как базовую линию
+
+    Результаты бенчмарков, не запускавшихся в этот раз, сохраняются из
+    прежнего файла.
+
+    :param path: Путь к JSON-файлу
+    :type path: str
+    :param results: Словарь {имя бенчмарка: строки результатов}
+    :type results: dict
+    """
+    data = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            data = json.load(file)
+    for name, rows in results.items():
+        data[name] = {"header": list(BENCHMARKS[name][1]),
+                      "rows": [[round(value, 4) if isinstance(value, float) else value for value in row]
+                               for row in rows]}
+    entries = []
+    for name, entry in data.items():
+        rows = ",\n".join(f"      {json.dumps(row)}" for row in entry["rows"])
+        entries.append(f'  {json.dumps(name)}: {{\n    "header": {json.dumps(entry["header"])},\n'
+                       f'    "rows": [\n{rows}\n    ]\n  }}')
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("{\n" + ",\n".join(entries) + "\n}\n")
+
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки бенчмарков
+
+    :param argv: Список аргументов, по умолчанию sys.argv[1:]
+    :type argv: list
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description="Platformer benchmarks")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"бенчмарки для запуска: {', '.join(BENCHMARKS)} (по умолчанию все)")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="показать изменение результатов относительно сохранённой базовой линии")
+    parser.add_argument("--save-baseline", metavar="PATH",
+                        help="сохранить результаты как базовую линию")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    """
+    Запускает выбранные бенчмарки и печатает результаты
+    """
+    args = parse_args(argv)
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    results = {}
+    for name in args.names or list(BENCHMARKS):
+        bench, header = BENCHMARKS[name]
+        results[name] = bench()
+        print_table(name, header, results[name], baseline.get(name))
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
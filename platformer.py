@@ -1,613 +1,5369 @@
+import argparse
+import contextlib
+import csv
+import functools
+import gc
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+import weakref
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict, deque, namedtuple
+from multiprocessing import shared_memory
+
 import pygame
+try:
+    import numpy as np
+except ImportError:
+    np = None
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 600
 LEVEL_WIDTH = 4000
 LEVEL_HEIGHT = 800
 
+ASSET_PATHS = {
+    'pictures/background.png': "opaque",
+    'pictures/bullet.png': "alpha",
+    'pictures/finish.png': "alpha",
+    'pictures/heart.png': "alpha",
+    'pictures/hero.png': "alpha",
+    'pictures/immune.png': "alpha",
+    'pictures/platform.png': "opaque",
+    'pictures/speed.png': "alpha",
+    'pictures/spike.png': "alpha",
+    'pictures/turret.png': "alpha",
+    'pictures/vertical_platform.png': "opaque",
+}
+ATLAS_MANIFEST = 'pictures/atlas.json'
+DEFAULT_LEVEL = 'levels/default.json'
 
-class Player(pygame.sprite.Sprite):
-    """Представляет управляемого игроком персонажа
 
-    :ivar image: Графическое представление персонажа
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    :ivar vel_x: Скорость по оси X
-    :type vel_x: int
-    :ivar vel_y: Скорость по оси Y
-    :type vel_y: int
-    :ivar speed: Базовая скорость движения
-    :type speed: int
-    :ivar jump_power: Сила прыжка
-    :type jump_power: int
-    :ivar gravity: Сила гравитации
-    :type gravity: float
-    :ivar on_ground: Флаг нахождения на поверхности
-    :type on_ground: bool
-    :ivar lives: Количество жизней (начальное: 3)
-    :type lives: int
-    :ivar score: Набранные очки
-    :type score: int
-    :ivar speed_boost: Бонус скорости
-    :type speed_boost: int
-    :ivar speed_boost_time: Время окончания действия бонуса скорости
-    :type speed_boost_time: int
-    :ivar immune: Флаг иммунитета к урону
-    :type immune: bool
-    :ivar immune_time: Время окончания иммунитета
-    :type immune_time: int
+class AssetCache:
+    """Общий для процесса кэш изображений
+
+    Исходные PNG декодируются один раз, а масштабированные и отражённые
+    варианты хранятся в ограниченном LRU-кэше. Отсутствующие файлы не
+    кэшируются: FileNotFoundError пробрасывается вызывающему коду.
+
+    Если есть атлас, собранный pack_atlas, при первом обращении декодируется
+    только он, а исходные изображения выдаются как subsurface-срезы атласа
+    без копирования пикселей. Изображения, которых нет в манифесте,
+    загружаются из отдельных файлов.
+
+    :ivar images: Декодированные исходные изображения по ключу (путь, режим)
+        (до создания окна преобразование невозможно, и режимом считается None)
+    :type images: dict
+    :ivar manifest: Путь к манифесту атласа или None, чтобы не использовать атлас
+    :type manifest: str
+    :ivar atlas: Декодированный атлас или None
+    :type atlas: pygame.Surface
+    :ivar regions: Области изображений в атласе по пути исходного файла,
+        None до первой загрузки
+    :type regions: dict
+    :ivar variants: LRU-кэш вариантов по ключу (путь, размер, отражение, выполненный режим)
+    :type variants: collections.OrderedDict
+    :ivar max_variants: Максимальное количество хранимых вариантов
+    :type max_variants: int
+    :ivar hits: Количество попаданий в кэш вариантов
+    :type hits: int
+    :ivar misses: Количество промахов кэша вариантов
+    :type misses: int
+    :ivar masks: Маски непрозрачных пикселей по изображению
+    :type masks: weakref.WeakKeyDictionary
     """
 
-    def __init__(self, x, y):
+    def __init__(self, max_variants=256, manifest=ATLAS_MANIFEST):
         """
-        Конструктор класса Player
+        Конструктор класса AssetCache
 
-        :param x: Начальная координата X
-        :type x: int
-        :param y: Начальная координата Y
-        :type y: int
+        :param max_variants: Размер LRU-кэша вариантов, по умолчанию 256
+        :type max_variants: int
+        :param manifest: Путь к манифесту атласа, по умолчанию ATLAS_MANIFEST;
+            None — загружать каждое изображение из своего файла
+        :type manifest: str
         """
-        super().__init__()
+        self.manifest = manifest
+        self.atlas = None
+        self.regions = None
+        self._atlas_converted = False
+        self.images = {}
+        self.masks = weakref.WeakKeyDictionary()
+        self.variants = OrderedDict()
+        self.max_variants = max_variants
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _mode(convert):
+        """
+        Режим преобразования, который можно выполнить сейчас
+
+        До pygame.display.set_mode() преобразовать изображение нельзя, поэтому
+        такие изображения кэшируются отдельно от преобразованных, а после
+        создания окна загружаются заново.
+
+        :param convert: Запрошенный режим ("alpha", "opaque" или None)
+        :type convert: str
+        :rtype: str
+        """
+        return convert if pygame.display.get_surface() is not None else None
+
+    def _decode(self, path, convert):
+        """
+        Загружает исходное изображение, декодируя файл только при первом обращении
+
+        :param path: Путь к файлу изображения
+        :type path: str
+        :param convert: Режим преобразования ("alpha", "opaque" или None)
+        :type convert: str
+        :returns: Исходное изображение
+        :rtype: pygame.Surface
+        """
+        convert = self._mode(convert)
+        key = (path, convert)
+        image = self.images.get(key)
+        if image is None:
+            if self.regions is None or (convert and not self._atlas_converted):
+                self.load_atlas()
+            region = self.regions.get(path)
+            if region is not None:
+                image = self.atlas.subsurface(region)
+                if convert == "opaque":
+                    image = image.convert()
+            else:
+                image = pygame.image.load(path)
+                if convert:
+                    image = image.convert_alpha() if convert == "alpha" else image.convert()
+            self.images[key] = image
+        return image
+
+    def load_atlas(self):
+        """
+        Декодирует атлас, описанный манифестом
+
+        Если манифеста или атласа нет, изображения загружаются из отдельных файлов.
+        Так же загружаются изображения, исходный файл которых изменился после
+        упаковки: его CRC-32 не совпадает с записанной в манифесте.
+
+        :returns: Количество изображений, которые берутся из атласа
+        :rtype: int
+        """
+        self.atlas = None
+        self.regions = {}
+        self._atlas_converted = pygame.display.get_surface() is not None
+        if self.manifest is None:
+            return 0
         try:
-            self.original_image = pygame.image.load('pictures/hero.png').convert_alpha()
-            self.image = pygame.transform.scale(self.original_image, (50, 70))
+            with open(self.manifest, encoding="utf-8") as file:
+                manifest = json.load(file)
+            atlas = pygame.image.load(os.path.join(os.path.dirname(self.manifest), manifest["image"]))
         except FileNotFoundError:
-            self.image = pygame.Surface((50, 70))
-            self.image.fill((50, 100, 255))
-            self.original_image = self.image.copy()
+            return 0
+        if self._atlas_converted:
+            atlas = atlas.convert_alpha()
+        self.atlas = atlas
+        sources = manifest.get("sources", {})
+        for path, region in manifest["sprites"].items():
+            checksum = _source_checksum(path)
+            # Без исходного файла атлас остаётся единственной копией изображения
+            if checksum is None or checksum == sources.get(path):
+                self.regions[path] = pygame.Rect(region)
+        return len(self.regions)
 
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.vel_x = 0
-        self.vel_y = 0
-        self.speed = 6
-        self.jump_power = 15
-        self.gravity = 0.8
-        self.on_ground = False
-        self.lives = 3
-        self.score = 0
-        self.speed_boost = 0
-        self.speed_boost_time = 0
-        self.immune = False
-        self.immune_time = 0
+    def get(self, path, size=None, flip=False, convert="alpha"):
+        """
+        Возвращает изображение из кэша, загружая его при промахе
+
+        Возвращаемая поверхность общая для всех вызывающих и не должна изменяться.
 
-    def update(self, platforms, spikes, turrets, collectibles, screen_width, screen_height, camera_x, camera_y):
+        :param path: Путь к файлу изображения
+        :type path: str
+        :param size: Целевой размер (ширина, высота) или None для исходного
+        :type size: tuple
+        :param flip: Отразить изображение по горизонтали
+        :type flip: bool
+        :param convert: Режим преобразования ("alpha", "opaque" или None)
+        :type convert: str
+        :returns: Изображение
+        :rtype: pygame.Surface
+        :raises FileNotFoundError: Если файл изображения не найден
         """
-        Обновляет состояние игрока каждый кадр
+        key = (path, size, flip, self._mode(convert))
+        image = self.variants.get(key)
+        if image is not None:
+            self.variants.move_to_end(key)
+            self.hits += 1
+            return image
+        self.misses += 1
+        image = self._decode(path, convert)
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+        if flip:
+            image = pygame.transform.flip(image, True, False)
+        self.variants[key] = image
+        if len(self.variants) > self.max_variants:
+            self.variants.popitem(last=False)
+        return image
 
-        :param platforms: Группа платформ для проверки коллизий
-        :type platforms: pygame.sprite.Group
-        :param spikes: Группа шипов
-        :type spikes: pygame.sprite.Group
-        :param turrets: Группа турелей
-        :type turrets: pygame.sprite.Group
-        :param collectibles: Группа собираемых предметов
-        :type collectibles: pygame.sprite.Group
-        :param screen_width: Ширина экрана
-        :type screen_width: int
-        :param screen_height: Высота экрана
-        :type screen_height: int
-        :param camera_x: Позиция камеры по X
-        :type camera_x: int
-        :param camera_y: Позиция камеры по Y
-        :type camera_y: int
+    def mask(self, image):
         """
-        keys = pygame.key.get_pressed()
-        self.vel_x = 0
-        speed = self.speed + self.speed_boost
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            self.vel_x = -speed
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            self.vel_x = speed
+        Возвращает маску непрозрачных пикселей изображения
 
-        if (keys[pygame.K_UP] or keys[pygame.K_w] or keys[pygame.K_SPACE]) and self.on_ground:
-            self.vel_y = -self.jump_power
-            self.on_ground = False
-        self.vel_y += self.gravity
-        if self.vel_y > 20:
-            self.vel_y = 20
-        self.rect.x += self.vel_x
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_x > 0:
-                    self.rect.right = platform.rect.left
-                elif self.vel_x < 0:
-                    self.rect.left = platform.rect.right
-        self.rect.y += self.vel_y
-        self.on_ground = False
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
-                if self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
-                    self.on_ground = True
-                    self.vel_y = 0
-                elif self.vel_y < 0:
-                    self.rect.top = platform.rect.bottom
-                    self.vel_y = 0
-        if self.rect.left < 0:
-            self.rect.left = 0
-        if self.rect.right > LEVEL_WIDTH:
-            self.rect.right = LEVEL_WIDTH
-        if self.rect.top > LEVEL_HEIGHT + 100:
-            self.lives -= 1
-            self.rect.x = 100
-            self.rect.y = 100
-            self.vel_y = 0
+        Маска строится при первом обращении и хранится, пока жива поверхность,
+        поэтому общие изображения из get() делят одну маску на все спрайты.
 
-        current_time = pygame.time.get_ticks()
-        if current_time > self.speed_boost_time:
-            self.speed_boost = 0
+        :param image: Изображение
+        :type image: pygame.Surface
+        :rtype: pygame.mask.Mask
+        """
+        mask = self.masks.get(image)
+        if mask is None:
+            mask = self.masks[image] = pygame.mask.from_surface(image)
+        return mask
 
-        if current_time > self.immune_time:
-            self.immune = False
+    def preload(self, paths=None):
+        """
+        Заранее декодирует изображения, чтобы не обращаться к диску во время игры
 
-        if not self.immune:
-            for spike in spikes:
-                if self.rect.colliderect(spike.rect):
-                    self.lives -= 1
-                    self.immune = True
-                    self.immune_time = current_time + 1000
-                    self.vel_y = -10
-                    break
+        :param paths: Словарь {путь: режим}, по умолчанию ASSET_PATHS
+        :type paths: dict
+        :returns: Количество загруженных изображений
+        :rtype: int
+        """
+        if paths is None:
+            paths = ASSET_PATHS
+        loaded = 0
+        for path, convert in paths.items():
+            try:
+                self._decode(path, convert)
+                loaded += 1
+            except FileNotFoundError:
+                pass
+        return loaded
 
-        if not self.immune:
-            for turret in turrets:
-                for bullet in turret.bullets:
-                    if self.rect.colliderect(bullet.rect):
-                        self.lives -= 1
-                        self.immune = True
-                        self.immune_time = current_time + 1000
-                        turret.bullets.remove(bullet)
+    def clear(self):
+        """
+        Очищает кэш и сбрасывает счётчики
+        """
+        self.images.clear()
+        self.masks.clear()
+        self.variants.clear()
+        self.atlas = None
+        self.regions = None
+        self.hits = 0
+        self.misses = 0
 
-        for collectible in collectibles:
-            if self.rect.colliderect(collectible.rect):
-                collectible.apply_effect(self)
-                collectibles.remove(collectible)
-                self.score += 10
 
-        if self.immune:
-            self.image = self.original_image.copy()
-            blue_filter = pygame.Surface(self.image.get_size())
-            blue_filter.fill((100, 200, 255))
-            self.image.blit(blue_filter, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
-            self.image = pygame.transform.scale(self.image, (50, 70))
+def _source_checksum(path):
+    """
+    CRC-32 исходного файла изображения для проверки свежести атласа
+
+    :param path: Путь к файлу
+    :type path: str
+    :returns: Контрольная сумма или None, если файла нет
+    :rtype: int
+    """
+    try:
+        with open(path, "rb") as file:
+            return zlib.crc32(file.read())
+    except FileNotFoundError:
+        return None
+
+
+def pack_atlas(paths=None, manifest_path=ATLAS_MANIFEST, width=1024, max_size=256, padding=1):
+    """
+    Упаковывает изображения в один атлас PNG и записывает манифест
+
+    Изображения больше max_size по длинной стороне предварительно
+    уменьшаются с сохранением пропорций: в игре спрайты рисуются намного
+    меньше исходных PNG, а при загрузке декодируется только атлас. Затем
+    изображения раскладываются по полкам в порядке убывания высоты. Атлас
+    сохраняется рядом с манифестом под тем же именем с расширением .png.
+    Манифест хранит имя атласа, его размер, область (x, y, ширина, высота)
+    и CRC-32 исходного файла каждого изображения.
+
+    :param paths: Пути к изображениям, по умолчанию ASSET_PATHS без фона,
+        который рисуется плиткой в исходном размере
+    :param manifest_path: Путь к манифесту, по умолчанию ATLAS_MANIFEST
+    :type manifest_path: str
+    :param width: Ширина атласа, по умолчанию 1024
+    :type width: int
+    :param max_size: Наибольшая сторона изображения в атласе, None — без уменьшения
+    :type max_size: int
+    :param padding: Зазор между изображениями в пикселях, по умолчанию 1
+    :type padding: int
+    :returns: Области изображений по пути исходного файла
+    :rtype: dict
+    :raises ValueError: Если изображение шире атласа
+    """
+    if paths is None:
+        paths = [path for path in ASSET_PATHS if path != 'pictures/background.png']
+    images = {}
+    for path in paths:
+        image = pygame.image.load(path)
+        image_width, image_height = image.get_size()
+        if max_size is not None and max(image_width, image_height) > max_size:
+            ratio = max_size / max(image_width, image_height)
+            size = (max(1, round(image_width * ratio)), max(1, round(image_height * ratio)))
+            if image.get_bitsize() >= 24:
+                image = pygame.transform.smoothscale(image, size)
+            else:
+                image = pygame.transform.scale(image, size)
+        images[path] = image
+    regions = {}
+    x = y = shelf = 0
+    for path in sorted(images, key=lambda path: (-images[path].get_height(), path)):
+        image_width, image_height = images[path].get_size()
+        if image_width > width:
+            raise ValueError(f"{path} is wider than the atlas ({image_width} > {width})")
+        if x + image_width > width:
+            x = 0
+            y += shelf + padding
+            shelf = 0
+        regions[path] = (x, y, image_width, image_height)
+        x += image_width + padding
+        shelf = max(shelf, image_height)
+    atlas = pygame.Surface((width, y + shelf), pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    for path, image in images.items():
+        # BLEND_RGBA_MAX по прозрачному фону копирует пиксели вместе с альфой без смешивания
+        atlas.blit(image, regions[path][:2], special_flags=pygame.BLEND_RGBA_MAX)
+    image_name = os.path.splitext(os.path.basename(manifest_path))[0] + ".png"
+    pygame.image.save(atlas, os.path.join(os.path.dirname(manifest_path), image_name))
+    manifest = {
+        "image": image_name,
+        "size": list(atlas.get_size()),
+        "sprites": {path: list(region) for path, region in regions.items()},
+        "sources": {path: _source_checksum(path) for path in regions},
+    }
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+        file.write("\n")
+    return regions
+
+
+assets = AssetCache()
+
+
+class SpatialGrid:
+    """Равномерная сетка (spatial hash) для быстрого поиска объектов по области
+
+    Каждый объект с атрибутом rect попадает во все ячейки, которые он
+    перекрывает. Запрос возвращает объекты из ячеек, перекрываемых
+    прямоугольником запроса, в порядке их добавления.
+
+    :ivar cell_size: Размер ячейки в пикселях
+    :type cell_size: int
+    :ivar cells: Содержимое ячеек по ключу (столбец, строка)
+    :type cells: dict
+    """
+
+    def __init__(self, cell_size=128):
+        """
+        Конструктор класса SpatialGrid
+
+        :param cell_size: Размер ячейки в пикселях, по умолчанию 128
+        :type cell_size: int
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        self._item_cells = {}
+        self._order = {}
+        self._counter = 0
+
+    def _cells_for(self, rect):
+        """
+        Вычисляет ключи ячеек, перекрываемых прямоугольником
+
+        :param rect: Прямоугольник
+        :type rect: pygame.Rect
+        :returns: Список ключей ячеек
+        :rtype: list
+        """
+        size = self.cell_size
+        x0 = rect.left // size
+        x1 = (rect.right - 1) // size if rect.width > 0 else x0
+        y0 = rect.top // size
+        y1 = (rect.bottom - 1) // size if rect.height > 0 else y0
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, item):
+        return item in self._order
+
+    def _keys_of(self, item):
+        """
+        Возвращает ключи ячеек, в которых сейчас лежит объект
+
+        Для объектов, загруженных через load, ячейки не запоминаются и
+        ищутся по соседству с текущим rect объекта.
+
+        :param item: Объект сетки
+        :returns: Список ключей или None, если объекта нет в сетке
+        :rtype: list
+        """
+        keys = self._item_cells.get(item)
+        if keys is None and item in self._order:
+            margin = 2 * self.cell_size
+            keys = [key for key in self._cells_for(item.rect.inflate(margin, margin))
+                    if item in self.cells.get(key, ())]
+        return keys
+
+    def insert(self, item):
+        """
+        Добавляет объект в сетку по его текущему rect
+
+        :param item: Объект с атрибутом rect
+        """
+        if item in self._order:
+            self.remove(item)
+        keys = self._cells_for(item.rect)
+        for key in keys:
+            self.cells.setdefault(key, []).append(item)
+        self._item_cells[item] = keys
+        self._order[item] = self._counter
+        self._counter += 1
+
+    def remove(self, item):
+        """
+        Удаляет объект из сетки, если он там есть
+
+        :param item: Объект, ранее добавленный в сетку
+        """
+        keys = self._keys_of(item)
+        if keys is None:
+            return
+        self._item_cells.pop(item, None)
+        del self._order[item]
+        for key in keys:
+            bucket = self.cells[key]
+            bucket.remove(item)
+            if not bucket:
+                del self.cells[key]
+
+    def move(self, item):
+        """
+        Обновляет положение подвижного объекта в сетке
+
+        Ячейки пересчитываются, но списки меняются только если объект
+        перешёл в другие ячейки.
+
+        :param item: Объект, ранее добавленный в сетку
+        """
+        keys = self._cells_for(item.rect)
+        old_keys = self._keys_of(item)
+        if old_keys == keys:
+            return
+        if old_keys is not None:
+            for key in old_keys:
+                bucket = self.cells[key]
+                bucket.remove(item)
+                if not bucket:
+                    del self.cells[key]
         else:
+            self._order[item] = self._counter
+            self._counter += 1
+        for key in keys:
+            self.cells.setdefault(key, []).append(item)
+        self._item_cells[item] = keys
 
-            self.image = pygame.transform.scale(self.original_image, (50, 70))
+    def load(self, items, buckets):
+        """
+        Добавляет неподвижные объекты с заранее вычисленными ячейками
 
+        :param items: Список объектов
+        :type items: list
+        :param buckets: Пара (заголовки, индексы): заголовки (столбец, строка, количество)
+            ячеек и идущие подряд индексы объектов в items для всех ячеек
+        :type buckets: tuple
+        """
+        headers, flat = buckets
+        members = [items[index] for index in flat]
+        cells = self.cells
+        start = 0
+        for cx, cy, size in headers:
+            stop = start + size
+            key = (cx, cy)
+            if key in cells:
+                cells[key].extend(members[start:stop])
+            else:
+                cells[key] = members[start:stop]
+            start = stop
+        self._order.update(zip(items, range(self._counter, self._counter + len(items))))
+        self._counter += len(items)
 
-class Platform(pygame.sprite.Sprite):
-    """Представляет статичную поверхность для передвижения игрока
+    def clear(self):
+        """
+        Удаляет все объекты из сетки
+        """
+        self.cells.clear()
+        self._item_cells.clear()
+        self._order.clear()
 
-    :ivar image: Графическое представление платформы
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
+    def query(self, rect):
+        """
+        Возвращает объекты, которые могут пересекаться с прямоугольником
+
+        :param rect: Прямоугольник запроса
+        :type rect: pygame.Rect
+        :returns: Список кандидатов в порядке добавления
+        :rtype: list
+        """
+        cells = self.cells
+        found = {}
+        for key in self._cells_for(rect):
+            bucket = cells.get(key)
+            if bucket:
+                for item in bucket:
+                    found[item] = None
+        if len(found) < 2:
+            return list(found)
+        return sorted(found, key=self._order.__getitem__)
+
+
+class IndexedGroup(pygame.sprite.Group):
+    """Группа спрайтов со статическим пространственным индексом
+
+    Индекс обновляется при добавлении и удалении спрайтов, поэтому подходит
+    для неподвижных объектов: платформ, шипов и предметов.
+
+    :ivar grid: Пространственный индекс спрайтов группы
+    :type grid: SpatialGrid
+    :ivar collision_map: Растровая карта спрайтов для столкновений или None
+    :type collision_map: CollisionMap
     """
 
-    def __init__(self, x, y, width, height):
+    def __init__(self, *sprites, cell_size=128):
         """
-        Конструктор класса Platform
+        Конструктор класса IndexedGroup
 
-        :param x: Координата X левого верхнего угла
-        :type x: int
-        :param y: Координата Y левого верхнего угла
-        :type y: int
-        :param width: Ширина платформы
+        :param sprites: Начальные спрайты группы
+        :param cell_size: Размер ячейки индекса, по умолчанию 128
+        :type cell_size: int
+        """
+        self.grid = SpatialGrid(cell_size)
+        self.collision_map = None
+        self._bulk = False
+        super().__init__(*sprites)
+
+    def __bool__(self):
+        # pygame.sprite.Group.__bool__ строит список всех спрайтов
+        return bool(self.spritedict)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        if not self._bulk:
+            self.grid.insert(sprite)
+        if self.collision_map is not None:
+            self.collision_map.add(sprite)
+
+    def load_indexed(self, sprites, buckets):
+        """
+        Добавляет спрайты вместе с заранее вычисленными ячейками индекса
+
+        :param sprites: Список спрайтов
+        :type sprites: list
+        :param buckets: Ячейки индекса в формате SpatialGrid.load
+        :type buckets: tuple
+        """
+        self._bulk = True
+        try:
+            for sprite in sprites:
+                self.add_internal(sprite)
+                sprite.add_internal(self)
+        finally:
+            self._bulk = False
+        self.grid.load(sprites, buckets)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.grid.remove(sprite)
+        if self.collision_map is not None:
+            self.collision_map.remove(sprite)
+
+    def build_collision_map(self, width, height, cell_size=8):
+        """
+        Растеризует спрайты группы в карту столкновений и поддерживает её при изменениях
+
+        Карта расширяется, если спрайты выходят за заданные размеры уровня,
+        в том числе в отрицательные координаты.
+
+        :param width: Ширина уровня в пикселях
         :type width: int
-        :param height: Высота платформы
+        :param height: Высота уровня в пикселях
         :type height: int
+        :param cell_size: Размер клетки в пикселях, по умолчанию 8
+        :type cell_size: int
+        :rtype: CollisionMap
         """
-        super().__init__()
-        try:
-            self.image = pygame.image.load('pictures/platform.png').convert()
-            self.image = pygame.transform.scale(self.image, (width, height))
-        except FileNotFoundError:
-            self.image = pygame.Surface((width, height))
-            self.image.fill((139, 69, 19))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+        left = top = 0
+        for sprite in self.spritedict:
+            left = min(left, sprite.rect.left)
+            top = min(top, sprite.rect.top)
+            width = max(width, sprite.rect.right)
+            height = max(height, sprite.rect.bottom)
+        left -= left % cell_size
+        top -= top % cell_size
+        self.collision_map = CollisionMap.from_platforms(self.spritedict, width - left, height - top, cell_size,
+                                                         left, top)
+        return self.collision_map
+
+    def query(self, rect):
+        """
+        Возвращает спрайты группы, которые могут пересекаться с прямоугольником
 
+        :param rect: Прямоугольник запроса
+        :type rect: pygame.Rect
+        :returns: Список спрайтов-кандидатов
+        :rtype: list
+        """
+        return self.grid.query(rect)
 
-class VerticalPlatform(Platform):
-    def __init__(self, x, y, width, height):
-        super().__init__(x, y, width, height)
-        try:
-            self.image = pygame.image.load('pictures/vertical_platform.png').convert()
-            self.image = pygame.transform.scale(self.image, (width, height))
-        except FileNotFoundError:
-            self.image = pygame.Surface((width, height))
-            self.image.fill((139, 69, 19))
 
+class TurretGroup(IndexedGroup):
+    """Группа турелей с общим динамическим индексом пуль
+
+    Турели упорядочены по X в IntervalIndex, который перестраивается после
+    добавления или удаления турелей. update_near обновляет только турели,
+    радиус активации которых достаёт до полосы камеры, поэтому количество
+    пуль зависит от видимой части уровня, а не от размера уровня.
+
+    :ivar bullet_grid: Пространственный индекс пуль всех турелей группы
+    :type bullet_grid: SpatialGrid
+    :ivar swarm: Общий пул пуль NumPy или None
+    :type swarm: BulletSwarm
+    :ivar despawn_margin: Расстояние от полосы камеры, дальше которого пули удаляются
+    :type despawn_margin: int
+    :ivar time_scale: Отношение длины тика к 1/60 секунды для добавляемых турелей
+    :type time_scale: float
+    """
+
+    def __init__(self, *sprites, cell_size=128, despawn_margin=SCREEN_WIDTH):
+        """
+        Конструктор класса TurretGroup
+
+        :param sprites: Начальные турели группы
+        :param cell_size: Размер ячейки индексов, по умолчанию 128
+        :type cell_size: int
+        :param despawn_margin: Расстояние от полосы камеры, дальше которого пули
+            удаляются, по умолчанию SCREEN_WIDTH
+        :type despawn_margin: int
+        """
+        self.bullet_grid = SpatialGrid(cell_size)
+        self.swarm = None
+        self.despawn_margin = despawn_margin
+        self.time_scale = 1
+        self._index = None
+        self._max_radius = 0
+        self._awake = {}
+        super().__init__(*sprites, cell_size=cell_size)
+
+    def use_swarm(self, swarm):
+        """
+        Переключает все турели группы на стрельбу в общий пул пуль
+
+        :param swarm: Пул пуль или None для обычных спрайтов
+        :type swarm: BulletSwarm
+        """
+        self.swarm = swarm
+        for turret in self:
+            turret.swarm = swarm
+
+    def use_time_scale(self, time_scale):
+        """
+        Задаёт длину тика всем турелям группы, в том числе добавленным позже
+
+        :param time_scale: Отношение длины тика к 1/60 секунды
+        :type time_scale: float
+        """
+        self.time_scale = time_scale
+        for turret in self:
+            turret.time_scale = time_scale
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        sprite.bullet_grid = self.bullet_grid
+        sprite.swarm = self.swarm
+        sprite.time_scale = self.time_scale
+        for bullet in sprite.bullets:
+            self.bullet_grid.insert(bullet)
+        self._index = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        for bullet in sprite.bullets:
+            self.bullet_grid.remove(bullet)
+        sprite.bullet_grid = None
+        self._awake.pop(sprite, None)
+        self._index = None
+
+    def active(self, left, right):
+        """
+        Возвращает турели, радиус активации которых пересекает полосу [left, right)
+
+        :param left: Левая граница полосы
+        :type left: int
+        :param right: Правая граница полосы
+        :type right: int
+        :returns: Список турелей, отсортированный по левой границе
+        :rtype: list
+        """
+        if self._index is None:
+            self._index = IntervalIndex(self)
+            self._max_radius = max((turret.activation_radius for turret in self), default=0)
+        radius = self._max_radius
+        return [
+            turret for turret in self._index.query(left - radius, right + radius)
+            if turret.rect.right + turret.activation_radius > left and turret.rect.left - turret.activation_radius < right
+        ]
+
+    def update_near(self, player, platforms, now, left, right):
+        """
+        Обновляет турели около полосы камеры и удаляет далёкие пули
+
+        Активные турели стреляют и двигают свои пули. Турели, вышедшие из
+        радиуса активации, больше не стреляют, но их пули летят, пока не
+        удалятся от полосы дальше despawn_margin.
+
+        :param player: Объект игрока
+        :type player: Player
+        :param platforms: Группа платформ для проверки коллизий пуль
+        :param now: Игровое время в миллисекундах
+        :type now: int
+        :param left: Левая граница полосы камеры
+        :type left: int
+        :param right: Правая граница полосы камеры
+        :type right: int
+        """
+        bounds = (left - self.despawn_margin, right + self.despawn_margin)
+        awake = {}
+        for turret in self.active(left, right):
+            turret.update(player, platforms, now=now, bounds=bounds)
+            awake[turret] = True
+        for turret in self._awake:
+            if turret not in awake and turret.bullets:
+                turret.update(player, platforms, now=now, bounds=bounds, fire=False)
+                if turret.bullets:
+                    awake[turret] = False
+        self._awake = awake
+
+    def state(self):
+        """
+        Таймеры и пули турелей группы вместе с турелями, пули которых ещё летят
+
+        Турели в начальном состоянии (не стреляли, пуль нет) в результат не входят.
+
+        :returns: Кортеж (пары (турель, Turret.state), пары (турель, активна))
+        :rtype: tuple
+        """
+        return (tuple((turret, turret.state()) for turret in self if turret.last_shot or turret.bullets),
+                tuple(self._awake.items()))
+
+    def set_state(self, state):
+        """
+        Восстанавливает турели группы, сохранённые TurretGroup.state
+
+        Турели, не вошедшие в сохранённое состояние, возвращаются в начальное.
+
+        :param state: Результат TurretGroup.state для тех же турелей
+        :type state: tuple
+        """
+        turrets, awake = state
+        saved = dict(turrets)
+        for turret in self:
+            if turret in saved:
+                turret.set_state(saved[turret])
+            elif turret.last_shot or turret.bullets:
+                turret.set_state((0, ()))
+        self._awake = dict(awake)
+
+    def bullets_near(self, rect):
+        """
+        Возвращает пули, которые могут пересекаться с прямоугольником
+
+        :param rect: Прямоугольник запроса
+        :type rect: pygame.Rect
+        :returns: Список пуль-кандидатов
+        :rtype: list
+        """
+        return self.bullet_grid.query(rect)
+
+
+def nearby(group, rect):
+    """
+    Возвращает объекты группы, которые могут пересекаться с прямоугольником
+
+    Для групп с пространственным индексом выполняется запрос к индексу,
+    для обычных групп и списков возвращается вся группа.
+
+    :param group: Группа спрайтов или список
+    :param rect: Прямоугольник запроса
+    :type rect: pygame.Rect
+    :returns: Итерируемый набор кандидатов
+    """
+    query = getattr(group, "query", None)
+    if query is None:
+        return group
+    return query(rect)
+
+
+def sweep(rect, dx, dy, obstacles):
+    """
+    Находит первое препятствие на пути движущегося прямоугольника (swept AABB)
+
+    Для каждого препятствия по методу разделяющих полос вычисляется доля
+    смещения (dx, dy), пройдя которую прямоугольник впервые касается его,
+    поэтому тонкие препятствия не пропускаются при любой скорости. Препятствия,
+    которые прямоугольник уже пересекает и не успевает покинуть, дают время 0;
+    касание краями столкновением не считается.
+
+    :param rect: Прямоугольник в начале движения
+    :type rect: pygame.Rect
+    :param dx: Смещение по оси X
+    :type dx: int
+    :param dy: Смещение по оси Y
+    :type dy: int
+    :param obstacles: Кандидаты, например nearby(platforms, swept_rect(rect, dx, dy))
+    :returns: Кортеж (время от 0 до 1, препятствие, ось удара "x" или "y");
+        без столкновения (1.0, None, None)
+    :rtype: tuple
+    """
+    left, top, right, bottom = rect.left, rect.top, rect.right, rect.bottom
+    best = 1.0
+    hit = None
+    axis = None
+    for obstacle in obstacles:
+        other = obstacle.rect
+        if dx > 0:
+            x_entry = (other.left - right) / dx
+            x_exit = (other.right - left) / dx
+        elif dx < 0:
+            x_entry = (other.right - left) / dx
+            x_exit = (other.left - right) / dx
+        elif left < other.right and right > other.left:
+            x_entry, x_exit = float("-inf"), float("inf")
+        else:
+            continue
+        if dy > 0:
+            y_entry = (other.top - bottom) / dy
+            y_exit = (other.bottom - top) / dy
+        elif dy < 0:
+            y_entry = (other.bottom - top) / dy
+            y_exit = (other.top - bottom) / dy
+        elif top < other.bottom and bottom > other.top:
+            y_entry, y_exit = float("-inf"), float("inf")
+        else:
+            continue
+        entry = max(x_entry, y_entry)
+        exit = min(x_exit, y_exit)
+        if entry >= exit or entry >= 1 or exit <= 0 or (entry < 0 and exit < 1):
+            continue
+        entry = max(entry, 0.0)
+        if hit is None or entry < best:
+            best = entry
+            hit = obstacle
+            axis = "x" if x_entry >= y_entry else "y"
+    return best, hit, axis
+
+
+def sweep_platforms(rect, dx, dy, platforms):
+    """
+    Находит первую платформу на пути прямоугольника
+
+    Если у группы платформ есть карта столкновений CollisionMap, путь
+    проверяется обходом её клеток, иначе — sweep по кандидатам из nearby.
+    Результаты обоих способов совпадают.
+
+    :param rect: Прямоугольник в начале движения
+    :type rect: pygame.Rect
+    :param dx: Смещение по оси X
+    :type dx: int
+    :param dy: Смещение по оси Y
+    :type dy: int
+    :param platforms: Группа платформ или список
+    :returns: Кортеж в формате sweep
+    :rtype: tuple
+    """
+    collision_map = getattr(platforms, "collision_map", None)
+    if collision_map is not None:
+        return collision_map.sweep(rect, dx, dy)
+    return sweep(rect, dx, dy, nearby(platforms, swept_rect(rect, dx, dy)))
+
+
+def swept_rect(rect, dx, dy):
+    """
+    Прямоугольник, покрывающий весь путь rect при смещении (dx, dy)
+
+    :param rect: Прямоугольник в начале движения
+    :type rect: pygame.Rect
+    :param dx: Смещение по оси X
+    :type dx: int
+    :param dy: Смещение по оси Y
+    :type dy: int
+    :rtype: pygame.Rect
+    """
+    return rect.union(rect.move(dx, dy))
+
+
+class IntervalIndex:
+    """Отсортированный по X индекс неподвижных объектов для отсечения по камере
+
+    Объекты шире max_span хранятся отдельно и проверяются перебором, остальные
+    ищутся двоичным поиском по левой границе.
+
+    :ivar max_span: Максимальная ширина объекта в основном индексе
+    :type max_span: int
+    :ivar wide: Объекты шире max_span
+    :type wide: list
+    """
+
+    def __init__(self, items=(), max_span=SCREEN_WIDTH):
+        """
+        Конструктор класса IntervalIndex
+
+        :param items: Объекты с атрибутом rect
+        :param max_span: Максимальная ширина объекта в основном индексе
+        :type max_span: int
+        """
+        self.max_span = max_span
+        self.wide = []
+        narrow = []
+        for item in items:
+            if item.rect.width > max_span:
+                self.wide.append(item)
+            else:
+                narrow.append(item)
+        narrow.sort(key=lambda item: item.rect.left)
+        self._items = narrow
+        self._lefts = [item.rect.left for item in narrow]
+
+    def __len__(self):
+        return len(self._items) + len(self.wide)
+
+    def query(self, left, right):
+        """
+        Возвращает объекты, пересекающие полосу [left, right) по оси X
+
+        :param left: Левая граница полосы
+        :type left: int
+        :param right: Правая граница полосы
+        :type right: int
+        :returns: Список объектов, отсортированный по левой границе
+        :rtype: list
+        """
+        start = bisect_left(self._lefts, left - self.max_span)
+        stop = bisect_left(self._lefts, right, start)
+        found = [item for item in self._items[start:stop] if item.rect.right > left]
+        for item in self.wide:
+            if item.rect.right > left and item.rect.left < right:
+                found.append(item)
+        return found
+
+
+class CollisionMap:
+    """Растровая карта неподвижной геометрии для столкновений за O(клеток)
+
+    Область карты делится на квадратные клетки cell_size пикселей. Клетка
+    занята, если её перекрывает хотя бы одна платформа. Карта хранится по
+    столбцам: каждый столбец — целое число, битовая маска строк, так что
+    проверка столбца на пересечение с полосой строк требует одной операции.
+    Для занятых столбцов запоминаются платформы, которые их перекрывают.
+
+    sweep идёт по клеткам вдоль пути прямоугольника в порядке движения и
+    останавливается на первой занятой клетке, край которой прямоугольник
+    действительно задевает. Время удара считается по краю платформы этой
+    клетки, а не по границе клетки, поэтому результат совпадает с sweep по
+    прямоугольникам платформ, даже если платформы не выровнены по клеткам.
+    Стоимость зависит от числа клеток на пути и платформ в них, а не от
+    количества платформ уровня. Платформы должны лежать в области карты.
+
+    :ivar cell_size: Размер клетки в пикселях
+    :type cell_size: int
+    :ivar left: Координата X левого края карты
+    :type left: int
+    :ivar top: Координата Y верхнего края карты
+    :type top: int
+    :ivar columns: Количество столбцов
+    :type columns: int
+    :ivar rows: Количество строк
+    :type rows: int
+    :ivar data: Маски столбцов, младший бит — верхняя строка
+    :type data: list
+    :ivar owners: Платформы занятых столбцов по номеру столбца
+    :type owners: dict
+    """
+
+    def __init__(self, width, height, cell_size=8, left=0, top=0):
+        """
+        Конструктор класса CollisionMap
+
+        :param width: Ширина области карты в пикселях
+        :type width: int
+        :param height: Высота области карты в пикселях
+        :type height: int
+        :param cell_size: Размер клетки в пикселях, по умолчанию 8
+        :type cell_size: int
+        :param left: Координата X левого края карты, по умолчанию 0
+        :type left: int
+        :param top: Координата Y верхнего края карты, по умолчанию 0
+        :type top: int
+        """
+        self.cell_size = cell_size
+        self.left = left
+        self.top = top
+        self.columns = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.data = [0] * self.columns
+        self.owners = {}
+        self._order = {}
+        self._counter = 0
+
+    @classmethod
+    def from_platforms(cls, platforms, width, height, cell_size=8, left=0, top=0):
+        """
+        Растеризует платформы в новую карту
+
+        :param platforms: Объекты с атрибутом rect
+        :param width: Ширина области карты в пикселях
+        :type width: int
+        :param height: Высота области карты в пикселях
+        :type height: int
+        :param cell_size: Размер клетки в пикселях, по умолчанию 8
+        :type cell_size: int
+        :param left: Координата X левого края карты, по умолчанию 0
+        :type left: int
+        :param top: Координата Y верхнего края карты, по умолчанию 0
+        :type top: int
+        :rtype: CollisionMap
+        """
+        collision_map = cls(width, height, cell_size, left, top)
+        data = collision_map.data
+        owners = collision_map.owners
+        order = collision_map._order
+        # Тот же расчёт, что в add, без вызовов методов на каждую платформу
+        for platform in platforms:
+            rect = platform.rect
+            first, stop = collision_map._cells(rect.left - left, rect.right - left, collision_map.columns)
+            mask = collision_map._rows_mask(rect.top - top, rect.bottom - top)
+            if not mask or stop <= first:
+                continue
+            order[platform] = len(order)
+            data[first:stop] = [column | mask for column in data[first:stop]]
+            for column in range(first, stop):
+                if column in owners:
+                    owners[column].append(platform)
+                else:
+                    owners[column] = [platform]
+        collision_map._counter = len(order)
+        return collision_map
+
+    def _cells(self, low, high, count):
+        """
+        Диапазон клеток, которые перекрывает отрезок [low, high) в координатах карты
+
+        :returns: Полуинтервал (первая, за последней) в пределах [0, count);
+            для отрезка нулевой длины — клетка, в которой он лежит, как в SpatialGrid
+        :rtype: tuple
+        """
+        first = low // self.cell_size
+        stop = (high - 1) // self.cell_size + 1 if high > low else first + 1
+        return max(first, 0), min(stop, count)
+
+    def _rows_mask(self, top, bottom):
+        """
+        Маска строк, которые перекрывает полоса [top, bottom) в координатах карты
+
+        :rtype: int
+        """
+        first, stop = self._cells(top, bottom, self.rows)
+        if stop <= first:
+            return 0
+        return ((1 << (stop - first)) - 1) << first
+
+    def column(self, column):
+        """
+        Маска занятых строк столбца
+
+        :param column: Номер столбца
+        :type column: int
+        :returns: Битовая маска, 0 за пределами карты
+        :rtype: int
+        """
+        if column < 0 or column >= self.columns:
+            return 0
+        return self.data[column]
+
+    def add(self, platform):
+        """
+        Занимает клетки платформы
+
+        :param platform: Объект с атрибутом rect
+        """
+        rect = platform.rect
+        mask = self._rows_mask(rect.top - self.top, rect.bottom - self.top)
+        columns = range(*self._cells(rect.left - self.left, rect.right - self.left, self.columns))
+        if not mask or not columns:
+            return
+        self._order[platform] = self._counter
+        self._counter += 1
+        for column in columns:
+            self.data[column] |= mask
+            self.owners.setdefault(column, []).append(platform)
+
+    def remove(self, platform):
+        """
+        Освобождает клетки платформы, которые не занимают другие платформы
+
+        :param platform: Объект, ранее добавленный в карту
+        """
+        if self._order.pop(platform, None) is None:
+            return
+        rect = platform.rect
+        for column in range(*self._cells(rect.left - self.left, rect.right - self.left, self.columns)):
+            owners = self.owners[column]
+            owners.remove(platform)
+            mask = 0
+            for other in owners:
+                mask |= self._rows_mask(other.rect.top - self.top, other.rect.bottom - self.top)
+            if not owners:
+                del self.owners[column]
+            self.data[column] = mask
+
+    def solid(self, x, y):
+        """
+        Занята ли клетка, содержащая точку
+
+        :rtype: bool
+        """
+        row = (y - self.top) // self.cell_size
+        return 0 <= row < self.rows and bool(self.column((x - self.left) // self.cell_size) >> row & 1)
+
+    def _nearest(self, rect, dx, dy, candidates, best):
+        """
+        Точный sweep по новым кандидатам с учётом уже найденного удара
+
+        При равном времени выигрывает платформа, добавленная раньше, как в
+        sweep по кандидатам из SpatialGrid.
+
+        :returns: Кортеж в формате sweep
+        :rtype: tuple
+        """
+        if len(candidates) > 1:
+            candidates = sorted(candidates, key=self._order.__getitem__)
+        result = sweep(rect, dx, dy, candidates)
+        if result[1] is None:
+            return best
+        if best[1] is None or result[0] < best[0] or (
+                result[0] == best[0] and self._order[result[1]] < self._order[best[1]]):
+            return result
+        return best
+
+    def _walk_x(self, rect, local, dx):
+        """
+        Проходит столбцы по пути прямоугольника вдоль X
+
+        Платформа, впервые встреченная в столбце, не может удариться раньше
+        его ближнего края, поэтому обход заканчивается, как только край
+        следующего занятого столбца дальше найденного удара.
+
+        :param rect: Прямоугольник в координатах уровня
+        :param local: Тот же прямоугольник в координатах карты
+        :returns: Кортеж в формате sweep
+        :rtype: tuple
+        """
+        size = self.cell_size
+        rows = self._rows_mask(local.top, local.bottom)
+        best = (1.0, None, None)
+        if not rows:
+            return best
+        if dx > 0:
+            columns = range(max(local.left // size, 0), min((local.right + dx - 1) // size + 1, self.columns))
+        else:
+            columns = range(min((local.right - 1) // size, self.columns - 1),
+                            max((local.left + dx) // size, 0) - 1, -1)
+        data = self.data
+        seen = None
+        for column in columns:
+            if not data[column] & rows:
+                continue
+            if best[1] is not None:
+                edge = column * size - local.right if dx > 0 else (column + 1) * size - local.left
+                if edge / dx > best[0]:
+                    break
+            if seen is None:
+                fresh = self.owners[column]
+                seen = set(fresh)
+            else:
+                fresh = [platform for platform in self.owners[column] if platform not in seen]
+                seen.update(fresh)
+            if fresh:
+                best = self._nearest(rect, dx, 0, fresh, best)
+        return best
+
+    def _walk_y(self, rect, local, dy):
+        """
+        Проходит строки по пути прямоугольника вдоль Y
+
+        В каждой занятой строке проверяются платформы столбцов, занятых в
+        этой строке; обход заканчивается, как только край следующей занятой
+        строки дальше найденного удара.
+
+        :param rect: Прямоугольник в координатах уровня
+        :param local: Тот же прямоугольник в координатах карты
+        :returns: Кортеж в формате sweep
+        :rtype: tuple
+        """
+        size = self.cell_size
+        data = self.data
+        columns = range(*self._cells(local.left, local.right, self.columns))
+        occupied = 0
+        for column in columns:
+            occupied |= data[column]
+        best = (1.0, None, None)
+        if not occupied:
+            return best
+        if dy > 0:
+            occupied &= self._rows_mask(local.top, local.bottom + dy)
+        else:
+            occupied &= self._rows_mask(local.top + dy, local.bottom)
+        added = set()
+        while occupied:
+            if dy > 0:
+                row = (occupied & -occupied).bit_length() - 1
+                edge = row * size - local.bottom
+            else:
+                row = occupied.bit_length() - 1
+                edge = (row + 1) * size - local.top
+            occupied &= ~(1 << row)
+            if best[1] is not None and edge / dy > best[0]:
+                break
+            fresh = {}
+            for column in columns:
+                if data[column] >> row & 1 and column not in added:
+                    added.add(column)
+                    for platform in self.owners[column]:
+                        fresh[platform] = None
+            if fresh:
+                best = self._nearest(rect, 0, dy, list(fresh), best)
+        return best
+
+    def sweep(self, rect, dx, dy):
+        """
+        Находит первую платформу на пути прямоугольника по клеткам карты
+
+        Сдвиг по одной оси обходит клетки вдоль неё. Для движения по диагонали
+        и без движения проверяются платформы столбцов, занятых в охвате пути.
+
+        :param rect: Прямоугольник в начале движения
+        :type rect: pygame.Rect
+        :param dx: Смещение по оси X
+        :type dx: int
+        :param dy: Смещение по оси Y
+        :type dy: int
+        :returns: Кортеж в формате sweep; без столкновения (1.0, None, None)
+        :rtype: tuple
+        """
+        local = rect.move(-self.left, -self.top) if self.left or self.top else rect
+        if dx and not dy:
+            return self._walk_x(rect, local, dx)
+        if dy and not dx:
+            return self._walk_y(rect, local, dy)
+        area = swept_rect(local, dx, dy)
+        rows = self._rows_mask(area.top, area.bottom)
+        candidates = {}
+        for column in range(*self._cells(area.left, area.right, self.columns)):
+            if self.data[column] & rows:
+                for platform in self.owners[column]:
+                    candidates[platform] = None
+        return self._nearest(rect, dx, dy, list(candidates), (1.0, None, None))
+
+
+class InputState(namedtuple("InputState", ("left", "right", "jump"), defaults=(False, False, False))):
+    """Состояние управления игроком на один тик
+
+    :ivar left: Нажато движение влево
+    :type left: bool
+    :ivar right: Нажато движение вправо
+    :type right: bool
+    :ivar jump: Нажат прыжок
+    :type jump: bool
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_keys(cls, keys):
+        """
+        Создаёт состояние управления по состоянию клавиатуры
+
+        :param keys: Результат pygame.key.get_pressed() или совместимый словарь
+        :returns: Состояние управления
+        :rtype: InputState
+        """
+        return cls(
+            bool(keys[pygame.K_LEFT] or keys[pygame.K_a]),
+            bool(keys[pygame.K_RIGHT] or keys[pygame.K_d]),
+            bool(keys[pygame.K_UP] or keys[pygame.K_w] or keys[pygame.K_SPACE]),
+        )
+
+    @property
+    def bits(self):
+        """
+        Состояние управления, упакованное в битовую маску для записи
+
+        :rtype: int
+        """
+        return self.left | self.right << 1 | self.jump << 2
+
+    @classmethod
+    def from_bits(cls, bits):
+        """
+        Восстанавливает состояние управления из битовой маски
+
+        :param bits: Значение InputState.bits
+        :type bits: int
+        :returns: Состояние управления
+        :rtype: InputState
+        """
+        return cls(bool(bits & 1), bool(bits & 2), bool(bits & 4))
+
+
+class Player(pygame.sprite.Sprite):
+    """Представляет управляемого игроком персонажа
+
+    :ivar image: Графическое представление персонажа
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    :ivar vel_x: Скорость по оси X
+    :type vel_x: int
+    :ivar vel_y: Скорость по оси Y
+    :type vel_y: int
+    :ivar speed: Базовая скорость движения в пикселях за тик при 60 тиках в секунду
+    :type speed: int
+    :ivar jump_power: Сила прыжка в пикселях за тик при 60 тиках в секунду
+    :type jump_power: int
+    :ivar gravity: Сила гравитации в пикселях за тик² при 60 тиках в секунду
+    :type gravity: float
+    :ivar time_scale: Отношение длины тика к 1/60 секунды (60 / tick_rate)
+    :type time_scale: float
+    :ivar carry_x: Накопленная дробная часть перемещения по X
+    :type carry_x: float
+    :ivar carry_y: Накопленная дробная часть перемещения по Y
+    :type carry_y: float
+    :ivar on_ground: Флаг нахождения на поверхности
+    :type on_ground: bool
+    :ivar lives: Количество жизней (начальное: 3)
+    :type lives: int
+    :ivar score: Набранные очки
+    :type score: int
+    :ivar speed_boost: Бонус скорости
+    :type speed_boost: int
+    :ivar speed_boost_time: Время окончания действия бонуса скорости
+    :type speed_boost_time: int
+    :ivar immune: Флаг иммунитета к урону
+    :type immune: bool
+    :ivar immune_time: Время окончания иммунитета
+    :type immune_time: int
+    :ivar frames: Заранее подготовленные кадры для каждого состояния спрайта
+    :type frames: dict
+    :ivar level_width: Ширина уровня, за правую границу которого нельзя выйти
+    :type level_width: int
+    :ivar level_height: Высота уровня, падение ниже которой стоит жизни
+    :type level_height: int
+    :ivar pixel_perfect: Проверять касание шипов и пуль по маскам непрозрачных
+        пикселей после совпадения прямоугольников
+    :type pixel_perfect: bool
+    :ivar spawn: Точка, в которую игрок возвращается после падения с уровня
+    :type spawn: tuple
+    """
+
+    STATE_TINTS = {
+        "immune": (100, 200, 255),
+    }
+
+    def __init__(self, x, y):
+        """
+        Конструктор класса Player
+
+        :param x: Начальная координата X
+        :type x: int
+        :param y: Начальная координата Y
+        :type y: int
+        """
+        super().__init__()
+        try:
+            self.original_image = assets.get('pictures/hero.png')
+            self.image = assets.get('pictures/hero.png', (50, 70))
+        except FileNotFoundError:
+            self.image = pygame.Surface((50, 70))
+            self.image.fill((50, 100, 255))
+            self.original_image = self.image.copy()
+        self.frames = self.build_frames(self.image)
+
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+        self.vel_x = 0
+        self.vel_y = 0
+        self.speed = 6
+        self.jump_power = 15
+        self.gravity = 0.8
+        self.time_scale = 1
+        self.carry_x = 0
+        self.carry_y = 0
+        self.on_ground = False
+        self.lives = 3
+        self.score = 0
+        self.speed_boost = 0
+        self.speed_boost_time = 0
+        self.immune = False
+        self.immune_time = 0
+        self.level_width = LEVEL_WIDTH
+        self.level_height = LEVEL_HEIGHT
+        self.pixel_perfect = True
+        self.spawn = (x, y)
+
+    @classmethod
+    def build_frames(cls, image):
+        """
+        Строит кадры всех состояний спрайта один раз при создании игрока
+
+        :param image: Обычный кадр игрока
+        :type image: pygame.Surface
+        :returns: Словарь {состояние: кадр}
+        :rtype: dict
+        """
+        frames = {"normal": image}
+        for state, tint in cls.STATE_TINTS.items():
+            frame = image.copy()
+            frame.fill(tint, special_flags=pygame.BLEND_RGB_ADD)
+            frames[state] = frame
+        return frames
+
+    def touches(self, rect, image):
+        """
+        Проверяет касание игроком опасного объекта
+
+        Сначала сравниваются прямоугольники, и только при их пересечении —
+        закэшированные маски обычного кадра игрока и изображения объекта.
+
+        :param rect: Прямоугольник объекта
+        :type rect: pygame.Rect
+        :param image: Изображение объекта размером с rect
+        :type image: pygame.Surface
+        :rtype: bool
+        """
+        if not self.rect.colliderect(rect):
+            return False
+        if not self.pixel_perfect:
+            return True
+        offset = (rect.x - self.rect.x, rect.y - self.rect.y)
+        return assets.mask(self.frames["normal"]).overlap(assets.mask(image), offset) is not None
+
+    def state(self):
+        """
+        Изменяемые за игру поля игрока для World.snapshot
+
+        :returns: Кортеж (x, y, vel_x, vel_y, on_ground, lives, score, speed_boost,
+            speed_boost_time, immune, immune_time, spawn, carry_x, carry_y)
+        :rtype: tuple
+        """
+        return (self.rect.x, self.rect.y, self.vel_x, self.vel_y, self.on_ground, self.lives, self.score,
+                self.speed_boost, self.speed_boost_time, self.immune, self.immune_time, self.spawn,
+                self.carry_x, self.carry_y)
+
+    def set_state(self, state):
+        """
+        Восстанавливает поля игрока, сохранённые Player.state
+
+        :param state: Результат Player.state
+        :type state: tuple
+        """
+        (self.rect.x, self.rect.y, self.vel_x, self.vel_y, self.on_ground, self.lives, self.score,
+         self.speed_boost, self.speed_boost_time, self.immune, self.immune_time, self.spawn,
+         self.carry_x, self.carry_y) = state
+        self.image = self.frames[self.sprite_state()]
+
+    def sprite_state(self):
+        """
+        Определяет текущее состояние спрайта
+
+        :returns: Ключ кадра в словаре frames
+        :rtype: str
+        """
+        if self.immune:
+            return "immune"
+        return "normal"
+
+    def _step(self, position, velocity, carry):
+        """
+        Целое перемещение за тик с переносом дробной части в следующий тик
+
+        Шаг округляется так же, как при 60 тиках в секунду, и умножается на
+        time_scale, поэтому при 60 тиках перенос всегда равен нулю.
+
+        :param position: Текущая координата
+        :type position: int
+        :param velocity: Скорость за тик
+        :type velocity: float
+        :param carry: Дробная часть, оставшаяся с прошлого тика
+        :type carry: float
+        :returns: Кортеж (перемещение, новая дробная часть)
+        :rtype: tuple
+        """
+        scale = self.time_scale
+        # pygame.Rect округляет дробные координаты половиной от нуля
+        target = position + velocity / scale
+        step = (int(target + 0.5 if target >= 0 else target - 0.5) - position) * scale + carry
+        target = position + step
+        moved = int(target + 0.5 if target >= 0 else target - 0.5) - position
+        return moved, step - moved
+
+    def update(self, platforms, spikes, turrets, collectibles, screen_width, screen_height, camera_x, camera_y,
+               controls=None, now=None):
+        """
+        Обновляет состояние игрока каждый кадр
+
+        :param platforms: Группа платформ для проверки коллизий
+        :type platforms: pygame.sprite.Group
+        :param spikes: Группа шипов
+        :type spikes: pygame.sprite.Group
+        :param turrets: Группа турелей
+        :type turrets: pygame.sprite.Group
+        :param collectibles: Группа собираемых предметов
+        :type collectibles: pygame.sprite.Group
+        :param screen_width: Ширина экрана
+        :type screen_width: int
+        :param screen_height: Высота экрана
+        :type screen_height: int
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y
+        :type camera_y: int
+        :param controls: Состояние управления, по умолчанию читается с клавиатуры
+        :type controls: InputState
+        :param now: Игровое время в миллисекундах, по умолчанию pygame.time.get_ticks()
+        :type now: int
+        """
+        if controls is None:
+            controls = InputState.from_keys(pygame.key.get_pressed())
+        scale = self.time_scale
+        self.vel_x = 0
+        speed = (self.speed + self.speed_boost) * scale
+        if controls.left:
+            self.vel_x = -speed
+        if controls.right:
+            self.vel_x = speed
+
+        if controls.jump and self.on_ground:
+            self.vel_y = -self.jump_power * scale
+            self.on_ground = False
+        self.vel_y += self.gravity * scale * scale
+        if self.vel_y > 20 * scale:
+            self.vel_y = 20 * scale
+        dx, self.carry_x = self._step(self.rect.x, self.vel_x, self.carry_x)
+        if dx:
+            platform = sweep_platforms(self.rect, dx, 0, platforms)[1]
+            if platform is None:
+                self.rect.x += dx
+            elif dx > 0:
+                self.rect.right = platform.rect.left
+            else:
+                self.rect.left = platform.rect.right
+        fall = self.vel_y
+        if fall < 20 * scale:
+            # скорость растёт каждый тик, поэтому без поправки дуга прыжка зависела бы от длины тика;
+            # с ней путь за одну шестидесятую секунды совпадает с шагом при 60 тиках
+            fall += self.gravity * scale * (1 - scale) / 2
+        dy, self.carry_y = self._step(self.rect.y, fall, self.carry_y)
+        probe = dy
+        if not dy and self.on_ground and self.vel_y > 0:
+            # за короткий тик гравитация может не набрать пиксель: опора под ногами проверяется сдвигом на 1
+            probe = 1
+        self.on_ground = False
+        platform = sweep_platforms(self.rect, 0, probe, platforms)[1]
+        if platform is None:
+            self.rect.y += dy
+        elif self.vel_y > 0:
+            self.rect.bottom = platform.rect.top
+            self.on_ground = True
+            self.vel_y = 0
+            self.carry_y = 0
+        elif self.vel_y < 0:
+            self.rect.top = platform.rect.bottom
+            self.vel_y = 0
+            self.carry_y = 0
+        if self.rect.left < 0:
+            self.rect.left = 0
+        if self.rect.right > self.level_width:
+            self.rect.right = self.level_width
+        if self.rect.top > self.level_height + 100:
+            self.lives -= 1
+            self.rect.topleft = self.spawn
+            self.vel_y = 0
+
+        current_time = pygame.time.get_ticks() if now is None else now
+        if current_time > self.speed_boost_time:
+            self.speed_boost = 0
+
+        if current_time > self.immune_time:
+            self.immune = False
+
+        if not self.immune:
+            for spike in nearby(spikes, self.rect):
+                if self.touches(spike.rect, spike.image):
+                    self.lives -= 1
+                    self.immune = True
+                    self.immune_time = current_time + 1000
+                    self.vel_y = -10 * scale
+                    break
+
+        swarm = getattr(turrets, "swarm", None)
+        if not self.immune and swarm is not None:
+            hits = swarm.hit(self.rect, assets.mask(self.frames["normal"]) if self.pixel_perfect else None)
+            if hits:
+                self.lives -= hits
+                self.immune = True
+                self.immune_time = current_time + 1000
+
+        if not self.immune:
+            if hasattr(turrets, "bullets_near"):
+                for bullet in turrets.bullets_near(self.rect):
+                    if self.touches(bullet.rect, bullet.image):
+                        self.lives -= 1
+                        self.immune = True
+                        self.immune_time = current_time + 1000
+                        bullet.owner.remove_bullet(bullet)
+            else:
+                for turret in turrets:
+                    for bullet in turret.bullets:
+                        if self.touches(bullet.rect, bullet.image):
+                            self.lives -= 1
+                            self.immune = True
+                            self.immune_time = current_time + 1000
+                            turret.remove_bullet(bullet)
+
+        for collectible in nearby(collectibles, self.rect):
+            if self.rect.colliderect(collectible.rect):
+                collectible.apply_effect(self, current_time)
+                collectibles.remove(collectible)
+                self.score += 10
+
+        self.image = self.frames[self.sprite_state()]
+
+
+class Platform(pygame.sprite.Sprite):
+    """Представляет статичную поверхность для передвижения игрока
+
+    :ivar image: Графическое представление платформы
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    """
+
+    image_path = 'pictures/platform.png'
+
+    def __init__(self, x, y, width, height):
+        """
+        Конструктор класса Platform
+
+        :param x: Координата X левого верхнего угла
+        :type x: int
+        :param y: Координата Y левого верхнего угла
+        :type y: int
+        :param width: Ширина платформы
+        :type width: int
+        :param height: Высота платформы
+        :type height: int
+        """
+        super().__init__()
+        try:
+            self.image = assets.get(self.image_path, (width, height), convert="opaque")
+        except FileNotFoundError:
+            self.image = pygame.Surface((width, height))
+            self.image.fill((139, 69, 19))
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+
+
+class VerticalPlatform(Platform):
+    image_path = 'pictures/vertical_platform.png'
+
+
+class Spike(pygame.sprite.Sprite):
+    """Представляет опасное препятствие, наносящее урон при касании
+
+    :ivar image: Графическое представление шипа
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    """
+
+    def __init__(self, x, y, width=30, height=30):
+        """
+        Конструктор класса Spike
+
+        :param x: Координата X левого верхнего угла
+        :type x: int
+        :param y: Координата Y левого верхнего угла
+        :type y: int
+        :param width: Ширина шипа, по умолчанию 30
+        :type width: int
+        :param height: Высота шипа, по умолчанию 30
+        :type height: int
+        """
+        super().__init__()
+        try:
+            self.original_image = assets.get('pictures/spike.png')
+            self.image = assets.get('pictures/spike.png', (width, height))
+        except FileNotFoundError:
+            self.image = pygame.Surface((width, height), pygame.SRCALPHA)
+            pygame.draw.polygon(self.image, (255, 50, 50), [(width // 2, 0), (0, height), (width, height)])
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+
+
+class Turret(pygame.sprite.Sprite):
+    """Представляет стреляющую турель с заданным направлением
+
+    :ivar image: Графическое представление турели
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    :ivar direction: Направление стрельбы
+    :type direction: str
+    :ivar bullets: Список активных пуль
+    :type bullets: list
+    :ivar last_shot: Время последнего выстрела
+    :type last_shot: int
+    :ivar shoot_delay: Задержка между выстрелами в миллисекундах
+    :type shoot_delay: int
+    :ivar bullet_grid: Индекс пуль группы турелей или None
+    :type bullet_grid: SpatialGrid
+    :ivar swarm: Пул пуль, в который стреляет турель, или None
+    :type swarm: BulletSwarm
+    :ivar level_width: Ширина уровня, за пределами которой пули исчезают
+    :type level_width: int
+    :ivar activation_radius: Расстояние от полосы камеры, на котором турель стреляет
+    :type activation_radius: int
+    :ivar bullet_speed: Скорость пули в пикселях за тик при 60 тиках в секунду
+    :type bullet_speed: int
+    :ivar time_scale: Отношение длины тика к 1/60 секунды (60 / tick_rate)
+    :type time_scale: float
+    """
+
+    def __init__(self, x, y, direction="right"):
+        """
+        Конструктор класса Turret
+
+        :param x: Координата X левого верхнего угла
+        :type x: int
+        :param y: Координата Y левого верхнего угла
+        :type y: int
+        :param direction: Направление стрельбы ("left" или "right"), по умолчанию "right"
+        :type direction: str
+        """
+        super().__init__()
+        try:
+            self.image = assets.get('pictures/turret.png', (70, 60))
+            self.base_image = assets.get('pictures/turret.png', (70, 60), flip=direction == "right")
+        except FileNotFoundError:
+            self.base_image = pygame.Surface((70, 60), pygame.SRCALPHA)
+            self.base_image.fill((50, 255, 50))
+            self.image = self.base_image.copy()
+
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+
+        self.direction = direction
+        self.bullets = []
+        self.last_shot = 0
+        self.shoot_delay = 2000
+        self.bullet_grid = None
+        self.swarm = None
+        self.level_width = LEVEL_WIDTH
+        self.activation_radius = SCREEN_WIDTH // 2
+        self.bullet_speed = 5
+        self.time_scale = 1
+
+    def update(self, player, platforms=None, now=None, bounds=None, fire=True):
+        """
+        Обновляет состояние турели каждый кадр
+
+        :param player: Объект игрока
+        :type player: Player
+        :param platforms: Группа платформ для проверки коллизий пуль
+        :type platforms: list
+        :param now: Игровое время в миллисекундах, по умолчанию pygame.time.get_ticks()
+        :type now: int
+        :param bounds: Полоса (left, right) по X, за пределами которой пули удаляются,
+            по умолчанию весь уровень
+        :type bounds: tuple
+        :param fire: Стрелять ли турели на этом кадре, по умолчанию True
+        :type fire: bool
+        """
+        current_time = pygame.time.get_ticks() if now is None else now
+        if fire and current_time - self.last_shot > self.shoot_delay:
+            self.shoot()
+            self.last_shot = current_time
+
+        for bullet in self.bullets[:]:
+            collided = bullet.update(platforms, self.level_width)
+            if not collided and bounds is not None:
+                collided = bullet.rect.right < bounds[0] or bullet.rect.left > bounds[1]
+            if collided:
+                self.remove_bullet(bullet)
+            elif self.bullet_grid is not None:
+                self.bullet_grid.move(bullet)
+
+    def shoot(self):
+        """
+        Производит выстрел из турели
+        """
+        speed = self.bullet_speed * self.time_scale
+        if self.swarm is not None:
+            if self.direction == "right":
+                self.swarm.spawn(self.rect.right, self.rect.centery, speed, 0)
+            else:
+                self.swarm.spawn(self.rect.left, self.rect.centery, -speed, 0)
+            return
+        if self.direction == "right":
+            bullet = bullet_pool.acquire(self.rect.right, self.rect.centery, speed, 0, owner=self)
+        else:
+            bullet = bullet_pool.acquire(self.rect.left, self.rect.centery, -speed, 0, owner=self)
+        self.bullets.append(bullet)
+        if self.bullet_grid is not None:
+            self.bullet_grid.insert(bullet)
+
+    def state(self):
+        """
+        Таймер выстрела и пули турели для World.snapshot
+
+        :returns: Кортеж (last_shot, кортеж пуль (x центра, y центра, vel_x, vel_y, carry_x, carry_y))
+        :rtype: tuple
+        """
+        return self.last_shot, tuple((bullet.rect.centerx, bullet.rect.centery, bullet.vel_x, bullet.vel_y,
+                                      bullet.carry_x, bullet.carry_y)
+                                     for bullet in self.bullets)
+
+    def set_state(self, state):
+        """
+        Восстанавливает таймер и пули турели, сохранённые Turret.state
+
+        Текущие пули возвращаются в bullet_pool, сохранённые берутся из него заново.
+
+        :param state: Результат Turret.state
+        :type state: tuple
+        """
+        self.last_shot, bullets = state
+        for bullet in self.bullets[:]:
+            self.remove_bullet(bullet)
+        for x, y, vel_x, vel_y, carry_x, carry_y in bullets:
+            bullet = bullet_pool.acquire(x, y, vel_x, vel_y, owner=self)
+            bullet.carry_x = carry_x
+            bullet.carry_y = carry_y
+            self.bullets.append(bullet)
+            if self.bullet_grid is not None:
+                self.bullet_grid.insert(bullet)
+
+    def remove_bullet(self, bullet):
+        """
+        Удаляет пулю из списка турели и из индекса пуль и возвращает её в пул
+
+        :param bullet: Пуля этой турели
+        :type bullet: Bullet
+        """
+        self.bullets.remove(bullet)
+        if self.bullet_grid is not None:
+            self.bullet_grid.remove(bullet)
+        bullet_pool.release(bullet)
+
+
+class Bullet:
+    """Представляет снаряд, выпущенный турелью
+
+    Лёгкая запись со __slots__ вместо pygame.sprite.Sprite: пули не входят
+    в группы спрайтов, а экземпляры переиспользуются через BulletPool.
+    Изображение общее для всех пуль одного направления.
+
+    :ivar image: Графическое представление пули
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    :ivar vel_x: Скорость по оси X
+    :type vel_x: float
+    :ivar vel_y: Скорость по оси Y
+    :type vel_y: float
+    :ivar carry_x: Накопленная дробная часть перемещения по X
+    :type carry_x: float
+    :ivar carry_y: Накопленная дробная часть перемещения по Y
+    :type carry_y: float
+    :ivar owner: Турель, выпустившая пулю, или None
+    :type owner: Turret
+    """
+
+    __slots__ = ("image", "rect", "vel_x", "vel_y", "carry_x", "carry_y", "owner")
+
+    _fallback_image = None
+
+    def __init__(self, x, y, vel_x, vel_y, owner=None):
+        """
+        Конструктор класса Bullet
+
+        :param x: Координата X центра пули
+        :type x: int
+        :param y: Координата Y центра пули
+        :type y: int
+        :param vel_x: Скорость по оси X
+        :type vel_x: int
+        :param vel_y: Скорость по оси Y
+        :type vel_y: int
+        :param owner: Турель, выпустившая пулю, по умолчанию None
+        :type owner: Turret
+        """
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(x, y, vel_x, vel_y, owner)
+
+    @classmethod
+    def image_for(cls, vel_x):
+        """
+        Возвращает общее изображение пули для направления полёта
+
+        :param vel_x: Скорость по оси X
+        :type vel_x: int
+        :returns: Изображение пули
+        :rtype: pygame.Surface
+        """
+        try:
+            return assets.get('pictures/bullet.png', (15, 15), flip=vel_x > 0)
+        except FileNotFoundError:
+            if cls._fallback_image is None:
+                cls._fallback_image = pygame.Surface((10, 10))
+                cls._fallback_image.fill((255, 50, 50))
+            return cls._fallback_image
+
+    def reset(self, x, y, vel_x, vel_y, owner=None):
+        """
+        Заново инициализирует пулю без выделения нового объекта
+
+        :param x: Координата X центра пули
+        :type x: int
+        :param y: Координата Y центра пули
+        :type y: int
+        :param vel_x: Скорость по оси X
+        :type vel_x: int
+        :param vel_y: Скорость по оси Y
+        :type vel_y: int
+        :param owner: Турель, выпустившая пулю, по умолчанию None
+        :type owner: Turret
+        """
+        self.image = self.image_for(vel_x)
+        self.rect.size = self.image.get_size()
+        self.rect.center = (x, y)
+        self.vel_x = vel_x
+        self.vel_y = vel_y
+        self.carry_x = 0
+        self.carry_y = 0
+        self.owner = owner
+
+    def update(self, platforms=None, level_width=LEVEL_WIDTH):
+        """
+        Обновляет положение пули с проверкой коллизий
+
+        :param platforms: Группа платформ для проверки коллизий (опционально)
+        :param level_width: Ширина уровня, за пределами которой пуля исчезает
+        :return: True если пуля столкнулась с платформой, иначе False
+        """
+        rect = self.rect
+        # дробная скорость (тик короче или длиннее 1/60 секунды) копится до целого пикселя
+        step_x = self.vel_x + self.carry_x
+        step_y = self.vel_y + self.carry_y
+        dx = round(step_x)
+        dy = round(step_y)
+        self.carry_x = step_x - dx
+        self.carry_y = step_y - dy
+
+        if platforms:
+            time, platform, axis = sweep_platforms(rect, dx, dy, platforms)
+            if platform is not None:
+                rect.x += int(dx * time)
+                rect.y += int(dy * time)
+                if axis == "x":
+                    if dx > 0:
+                        rect.right = platform.rect.left
+                    else:
+                        rect.left = platform.rect.right
+                elif dy > 0:
+                    rect.bottom = platform.rect.top
+                else:
+                    rect.top = platform.rect.bottom
+                return True
+
+        rect.x += dx
+        rect.y += dy
+
+        if rect.right < -50 or rect.left > level_width + 50:
+            return True
+
+        return False
+
+
+class BulletPool:
+    """Ограниченный пул переиспользуемых пуль
+
+    :ivar max_size: Максимальное количество свободных пуль в пуле
+    :type max_size: int
+    :ivar created: Количество созданных пуль
+    :type created: int
+    :ivar reused: Количество выданных повторно пуль
+    :type reused: int
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        Конструктор класса BulletPool
+
+        :param max_size: Максимальное количество свободных пуль, по умолчанию 1024
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.free = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, x, y, vel_x, vel_y, owner=None):
+        """
+        Выдаёт пулю из пула или создаёт новую, если пул пуст
+
+        :param x: Координата X центра пули
+        :type x: int
+        :param y: Координата Y центра пули
+        :type y: int
+        :param vel_x: Скорость по оси X
+        :type vel_x: int
+        :param vel_y: Скорость по оси Y
+        :type vel_y: int
+        :param owner: Турель, выпустившая пулю
+        :type owner: Turret
+        :returns: Пуля
+        :rtype: Bullet
+        """
+        if self.free:
+            bullet = self.free.pop()
+            bullet.reset(x, y, vel_x, vel_y, owner)
+            self.reused += 1
+            return bullet
+        self.created += 1
+        return Bullet(x, y, vel_x, vel_y, owner)
+
+    def release(self, bullet):
+        """
+        Возвращает пулю в пул
+
+        :param bullet: Больше не используемая пуля
+        :type bullet: Bullet
+        """
+        bullet.owner = None
+        if len(self.free) < self.max_size:
+            self.free.append(bullet)
+
+
+bullet_pool = BulletPool()
+
+
+class BulletSwarm:
+    """Пул пуль в виде структуры массивов NumPy для большого количества снарядов
+
+    Позиции, скорости и флаги живых пуль хранятся в массивах, движение и
+    проверки столкновений с платформами и игроком выполняются пакетно,
+    а погибшие пули удаляются уплотнением массивов. Турели с заданным
+    swarm отдают пули в пул через Turret.shoot.
+
+    Платформы раскладываются по клеткам сетки CELL_SIZE пикселей в сжатом
+    виде (номера платформ, отсортированные по клетке, и начало каждой клетки),
+    поэтому пуля проверяется только с платформами клеток своего пути, а
+    стоимость тика зависит от числа пар пуля—платформа рядом, а не от
+    произведения количества пуль и платформ.
+
+    Скорости дробные, если тик короче или длиннее 1/60 секунды; дробная
+    часть перемещения копится в carry_x и carry_y до целого пикселя.
+
+    :ivar count: Количество занятых ячеек пула
+    :type count: int
+    :ivar width: Ширина пули
+    :type width: int
+    :ivar height: Высота пули
+    :type height: int
+    :ivar images: Изображения пули для полёта влево (0) и вправо (1)
+    :type images: tuple
+    """
+
+    CELL_SIZE = 128
+
+    def __init__(self, platforms=(), capacity=256, level_width=LEVEL_WIDTH):
+        """
+        Конструктор класса BulletSwarm
+
+        :param platforms: Платформы, о которые разбиваются пули
+        :param capacity: Начальная ёмкость массивов, по умолчанию 256
+        :type capacity: int
+        :param level_width: Ширина уровня для удаления улетевших пуль
+        :type level_width: int
+        :raises ImportError: Если NumPy не установлен
+        """
+        if np is None:
+            raise ImportError("BulletSwarm requires numpy")
+        self.images = (Bullet.image_for(-1), Bullet.image_for(1))
+        self.width, self.height = self.images[0].get_size()
+        self.level_width = level_width
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.vel_x = np.zeros(capacity, dtype=np.float64)
+        self.vel_y = np.zeros(capacity, dtype=np.float64)
+        self.carry_x = np.zeros(capacity, dtype=np.float64)
+        self.carry_y = np.zeros(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.set_platforms(platforms)
+
+    def __len__(self):
+        return self.count
+
+    def set_platforms(self, platforms):
+        """
+        Запоминает прямоугольники платформ в виде массивов и раскладывает их по клеткам
+
+        :param platforms: Платформы уровня
+        """
+        rects = [platform.rect for platform in platforms]
+        self._platform_left = np.array([rect.left for rect in rects], dtype=np.int32)
+        self._platform_top = np.array([rect.top for rect in rects], dtype=np.int32)
+        self._platform_right = np.array([rect.right for rect in rects], dtype=np.int32)
+        self._platform_bottom = np.array([rect.bottom for rect in rects], dtype=np.int32)
+        self._cell_start = None
+        if not rects:
+            return
+        size = self.CELL_SIZE
+        self._origin = (min(rect.left for rect in rects), min(rect.top for rect in rects))
+        origin_x, origin_y = self._origin
+        self._columns = (max(rect.right for rect in rects) - origin_x - 1) // size + 1
+        self._rows = (max(rect.bottom for rect in rects) - origin_y - 1) // size + 1
+        cells = []
+        indices = []
+        for index, rect in enumerate(rects):
+            for row in range((rect.top - origin_y) // size, (rect.bottom - 1 - origin_y) // size + 1):
+                first = row * self._columns
+                for column in range((rect.left - origin_x) // size, (rect.right - 1 - origin_x) // size + 1):
+                    cells.append(first + column)
+                    indices.append(index)
+        cells = np.array(cells, dtype=np.int64)
+        order = np.argsort(cells, kind="stable")
+        self._cell_platforms = np.array(indices, dtype=np.int64)[order]
+        self._cell_start = np.searchsorted(cells[order], np.arange(self._rows * self._columns + 1))
+
+    def _cell_range(self, low, high, origin, count):
+        """
+        Номера первой и последней клетки, которые пересекает отрезок [low, high)
+
+        Номера ограничены сеткой: платформы лежат только внутри неё.
+
+        :rtype: tuple
+        """
+        size = self.CELL_SIZE
+        first = np.clip((low - origin) // size, 0, count - 1)
+        last = np.clip((high - 1 - origin) // size, 0, count - 1)
+        return first, last
+
+    def _platform_hits(self, sweep_left, sweep_top, sweep_right, sweep_bottom, candidates):
+        """
+        Пакетно проверяет пути пуль на пересечение с платформами их клеток
+
+        :param candidates: Маска пуль, которые нужно проверить
+        :type candidates: numpy.ndarray
+        :returns: Маска пуль, задевших платформу
+        :rtype: numpy.ndarray
+        """
+        hit = np.zeros(len(sweep_left), dtype=bool)
+        column0, column1 = self._cell_range(sweep_left, sweep_right, self._origin[0], self._columns)
+        row0, row1 = self._cell_range(sweep_top, sweep_bottom, self._origin[1], self._rows)
+        start_of = self._cell_start
+        for row_offset in range(int((row1 - row0).max()) + 1):
+            for column_offset in range(int((column1 - column0).max()) + 1):
+                bullets = np.flatnonzero(candidates & (row0 + row_offset <= row1)
+                                         & (column0 + column_offset <= column1))
+                cells = (row0[bullets] + row_offset) * self._columns + column0[bullets] + column_offset
+                start = start_of[cells]
+                counts = start_of[cells + 1] - start
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # Развёртка пар (пуля, платформа клетки) без цикла по пулям
+                pair_bullets = np.repeat(bullets, counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                platforms = self._cell_platforms[np.repeat(start, counts) + offsets]
+                overlaps = ((sweep_left[pair_bullets] < self._platform_right[platforms])
+                            & (sweep_right[pair_bullets] > self._platform_left[platforms])
+                            & (sweep_top[pair_bullets] < self._platform_bottom[platforms])
+                            & (sweep_bottom[pair_bullets] > self._platform_top[platforms]))
+                hit[pair_bullets[overlaps]] = True
+        return hit
+
+    def _grow(self):
+        """
+        Удваивает ёмкость массивов
+        """
+        for name in ("x", "y", "vel_x", "vel_y", "carry_x", "carry_y", "alive"):
+            array = getattr(self, name)
+            grown = np.zeros(len(array) * 2, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def spawn(self, x, y, vel_x, vel_y):
+        """
+        Добавляет пулю с центром в точке (x, y)
+
+        :param x: Координата X центра пули
+        :type x: int
+        :param y: Координата Y центра пули
+        :type y: int
+        :param vel_x: Скорость по оси X
+        :type vel_x: float
+        :param vel_y: Скорость по оси Y
+        :type vel_y: float
+        """
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        self.x[i] = x - self.width // 2
+        self.y[i] = y - self.height // 2
+        self.vel_x[i] = vel_x
+        self.vel_y[i] = vel_y
+        self.carry_x[i] = 0
+        self.carry_y[i] = 0
+        self.alive[i] = True
+        self.count += 1
+
+    def _overlaps(self, left, top, right, bottom):
+        """
+        Пакетно проверяет пересечение живых пуль с прямоугольником
+
+        :returns: Маска пуль, пересекающих прямоугольник
+        :rtype: numpy.ndarray
+        """
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        return ((x < right) & (x + self.width > left) & (y < bottom) & (y + self.height > top)
+                & self.alive[:n])
+
+    def update(self, bounds=None):
+        """
+        Сдвигает все пули, удаляет разбившиеся о платформы и улетевшие за уровень
+
+        :param bounds: Полоса (left, right) по X, за пределами которой пули удаляются,
+            по умолчанию весь уровень
+        :type bounds: tuple
+        """
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        step_x = self.vel_x[:n] + self.carry_x[:n]
+        step_y = self.vel_y[:n] + self.carry_y[:n]
+        dx = np.rint(step_x)
+        dy = np.rint(step_y)
+        self.carry_x[:n] = step_x - dx
+        self.carry_y[:n] = step_y - dy
+        dx = dx.astype(np.int32)
+        dy = dy.astype(np.int32)
+        x += dx
+        y += dy
+        alive = self.alive[:n]
+        alive &= (x + self.width >= -50) & (x <= self.level_width + 50)
+        if bounds is not None:
+            alive &= (x + self.width >= bounds[0]) & (x <= bounds[1])
+        if self._cell_start is not None and alive.any():
+            # Проверяется весь путь пули за тик, чтобы быстрые пули не проходили сквозь тонкие платформы
+            sweep_left = x - np.maximum(dx, 0)
+            sweep_right = x + self.width - np.minimum(dx, 0)
+            sweep_top = y - np.maximum(dy, 0)
+            sweep_bottom = y + self.height - np.minimum(dy, 0)
+            alive &= ~self._platform_hits(sweep_left, sweep_top, sweep_right, sweep_bottom, alive)
+        self.compact()
+
+    def hit(self, rect, mask=None):
+        """
+        Удаляет пули, пересекающие прямоугольник
+
+        :param rect: Прямоугольник (например, игрока)
+        :type rect: pygame.Rect
+        :param mask: Маска непрозрачных пикселей в rect; пули, пересекающие
+            прямоугольник, дополнительно проверяются по маскам
+        :type mask: pygame.mask.Mask
+        :returns: Количество попавших пуль
+        :rtype: int
+        """
+        if self.count == 0:
+            return 0
+        overlaps = self._overlaps(rect.left, rect.top, rect.right, rect.bottom)
+        if mask is not None:
+            for i in np.flatnonzero(overlaps).tolist():
+                image = self.images[int(self.vel_x[i] > 0)]
+                if mask.overlap(assets.mask(image), (int(self.x[i]) - rect.x, int(self.y[i]) - rect.y)) is None:
+                    overlaps[i] = False
+        hits = int(overlaps.sum())
+        if hits:
+            self.alive[:self.count] &= ~overlaps
+            self.compact()
+        return hits
+
+    def state(self):
+        """
+        Копия занятой части массивов для World.snapshot
+
+        :returns: Кортеж массивов (x, y, vel_x, vel_y, carry_x, carry_y, alive) длины count
+        :rtype: tuple
+        """
+        n = self.count
+        return tuple(array[:n].copy() for array in (self.x, self.y, self.vel_x, self.vel_y,
+                                                     self.carry_x, self.carry_y, self.alive))
+
+    def set_state(self, state):
+        """
+        Восстанавливает пули, сохранённые BulletSwarm.state
+
+        :param state: Результат BulletSwarm.state
+        :type state: tuple
+        """
+        n = len(state[0])
+        while len(self.x) < n:
+            self._grow()
+        self.alive[n:self.count] = False
+        for array, saved in zip((self.x, self.y, self.vel_x, self.vel_y, self.carry_x, self.carry_y, self.alive),
+                                state):
+            array[:n] = saved
+        self.count = n
+
+    def compact(self):
+        """
+        Сдвигает живые пули в начало массивов
+        """
+        n = self.count
+        keep = self.alive[:n]
+        k = int(keep.sum())
+        if k == n:
+            return
+        for array in (self.x, self.y, self.vel_x, self.vel_y, self.carry_x, self.carry_y):
+            array[:k] = array[:n][keep]
+        self.alive[:k] = True
+        self.alive[k:n] = False
+        self.count = k
+
+    def visible(self, rect, velocities=False):
+        """
+        Возвращает изображения и позиции пуль, пересекающих прямоугольник
+
+        :param rect: Область в координатах уровня
+        :type rect: pygame.Rect
+        :param velocities: Добавить к каждой паре скорость пули, по умолчанию False
+        :type velocities: bool
+        :returns: Список пар (изображение, прямоугольник в координатах уровня),
+            с velocities — четвёрок (изображение, прямоугольник, vel_x, vel_y)
+        :rtype: list
+        """
+        if self.count == 0:
+            return []
+        indices = np.flatnonzero(self._overlaps(rect.left, rect.top, rect.right, rect.bottom))
+        images = self.images
+        size = (self.width, self.height)
+        if velocities:
+            return [
+                (images[int(self.vel_x[i] > 0)], pygame.Rect((int(self.x[i]), int(self.y[i])), size),
+                 float(self.vel_x[i]), float(self.vel_y[i]))
+                for i in indices.tolist()
+            ]
+        return [
+            (images[int(self.vel_x[i] > 0)], pygame.Rect((int(self.x[i]), int(self.y[i])), size))
+            for i in indices.tolist()
+        ]
+
+
+class Collectible(pygame.sprite.Sprite):
+    """Представляет бонус, который можно собрать для получения различных эффектов
+    :ivar image: Графическое представление предмета
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    :ivar type: Тип предмета ("life", "speed" или "immune")
+    :type type: str
+    """
+
+    def __init__(self, x, y, type="life"):
+        """
+        Конструктор класса Collectible
+
+        :param x: Координата X левого верхнего угла
+        :type x: int
+        :param y: Координата Y левого верхнего угла
+        :type y: int
+        :param type: Тип предмета ("life", "speed" или "immune"), по умолчанию "life"
+        :type type: str
+        """
+        super().__init__()
+        self.type = type
+
+        image_files = {
+            "life": "pictures/heart.png",
+            "speed": "pictures/speed.png",
+            "immune": "pictures/immune.png"
+        }
+
+        try:
+            filename = image_files[type]
+            self.image = assets.get(filename, (30, 30))
+        except FileNotFoundError:
+            self.image = pygame.Surface((20, 20), pygame.SRCALPHA)
+            if type == "life":
+                self.image.fill((255, 50, 50))
+            elif type == "speed":
+                self.image.fill((255, 255, 0))
+            elif type == "immune":
+                self.image.fill((120, 120, 120))
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+
+    def apply_effect(self, player, now=None):
+        """
+        Применяет эффект предмета к игроку
+
+        :param player: Объект игрока, к которому применяется эффект
+        :type player: Player
+        :param now: Игровое время в миллисекундах, по умолчанию pygame.time.get_ticks()
+        :type now: int
+        """
+        if now is None:
+            now = pygame.time.get_ticks()
+        if self.type == "life":
+            player.lives += 1
+        elif self.type == "speed":
+            player.speed_boost = 3
+            player.speed_boost_time = now + 5000
+        elif self.type == "immune":
+            player.immune = True
+            player.immune_time = now + 3000
+
+
+class Checkpoint(pygame.sprite.Sprite):
+    """Представляет цель уровня, достижение которой означает победу
+    :ivar image: Графическое представление флага
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник для коллизий и позиционирования
+    :type rect: pygame.Rect
+    :ivar active: Флаг активности точки сохранения
+    :type active: bool
+    """
+
+    def __init__(self, x, y):
+        """
+        Конструктор класса Checkpoint
+
+        :param x: Координата X левого верхнего угла
+        :type x: int
+        :param y: Координата Y левого верхнего угла
+        :type y: int
+        """
+        super().__init__()
+        try:
+            self.image = assets.get('pictures/finish.png', (60, 80))
+        except FileNotFoundError:
+            self.image = pygame.Surface((40, 60))
+            self.image.fill((50, 255, 50))
+        self.rect = self.image.get_rect()
+        self.rect.x = x
+        self.rect.y = y
+        self.active = True
+
+    def update(self, player):
+        """
+        Проверяет, достиг ли игрок точки сохранения
+
+        :param player: Объект игрока
+        :type player: Player
+        :returns: True если игрок достиг точки сохранения, иначе False
+        :rtype: bool
+        """
+        if self.active and player.rect.colliderect(self.rect):
+            self.active = False
+            return True
+        return False
+
+
+LEVEL_FORMAT_MAGIC = b"PLVL"
+LEVEL_FORMAT_VERSION = 1
+ITEM_TYPES = ("life", "speed", "immune")
+DIRECTIONS = ("left", "right")
+COMPILED_SIZES = {
+    "turrets": (70, 60),
+    "items": (30, 30),
+}
+
+_LEVEL_HEADER = struct.Struct("<4sHHii")
+_COUNT = struct.Struct("<I")
+_BUCKET = struct.Struct("<iiI")
+_PLATFORM_RECORD = struct.Struct("<iiiiB3x")
+_SPIKE_RECORD = struct.Struct("<iiii")
+_TURRET_RECORD = struct.Struct("<iiB3x")
+_ITEM_RECORD = struct.Struct("<iiB3x")
+_CHECKPOINT_RECORD = struct.Struct("<ii")
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """
+    Отключает сборщик мусора на время массового создания объектов
+
+    Во время загрузки большого уровня создаются сотни тысяч объектов, и
+    полные сборки мусора посреди загрузки занимают больше времени, чем
+    само создание объектов.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def default_level_data():
+    """
+    Читает описание встроенного уровня из DEFAULT_LEVEL
+
+    :returns: Словарь с ключами width, height, platforms, vertical_platforms,
+        spikes, turrets, items и checkpoint
+    :rtype: dict
+    """
+    return read_level_json(DEFAULT_LEVEL)
+
+
+class Level(tuple):
+    """Кортеж объектов уровня (platforms, spikes, turrets, collectibles, checkpoint) с размерами уровня
+
+    Распаковывается как обычный кортеж из пяти элементов, поэтому подходит
+    везде, где ожидается результат create_level().
+
+    :ivar width: Ширина уровня в пикселях
+    :type width: int
+    :ivar height: Высота уровня в пикселях
+    :type height: int
+    """
+
+    def __new__(cls, objects, width=LEVEL_WIDTH, height=LEVEL_HEIGHT):
+        """
+        Создаёт кортеж объектов уровня
+
+        :param objects: Объекты уровня в порядке create_level()
+        :type objects: tuple
+        :param width: Ширина уровня, по умолчанию LEVEL_WIDTH
+        :type width: int
+        :param height: Высота уровня, по умолчанию LEVEL_HEIGHT
+        :type height: int
+        """
+        level = super().__new__(cls, objects)
+        level.width = width
+        level.height = height
+        return level
+
+
+def build_level(data):
+    """
+    Создаёт объекты уровня по его описанию
+
+    :param data: Описание уровня (см. default_level_data)
+    :type data: dict
+    :returns: Объекты уровня (platforms, spikes, turrets, collectibles, checkpoint)
+        с размерами из описания
+    :rtype: Level
+    """
+    with gc_paused():
+        return _build_level(data)
+
+
+def _build_level(data):
+    """
+    Создаёт объекты уровня по его описанию без управления сборщиком мусора
+
+    :param data: Описание уровня
+    :type data: dict
+    :returns: Объекты уровня
+    :rtype: Level
+    """
+    level_width = data.get("width", LEVEL_WIDTH)
+    platforms = IndexedGroup()
+    spikes = IndexedGroup()
+    turrets = TurretGroup()
+    collectibles = IndexedGroup()
+
+    for x, y, width, height in data.get("platforms", ()):
+        platforms.add(Platform(x, y, width, height))
+
+    for x, y, width, height in data.get("vertical_platforms", ()):
+        platforms.add(VerticalPlatform(x, y, width, height))
+
+    for x, y, width, height in data.get("spikes", ()):
+        spikes.add(Spike(x, y, width, height))
+
+    for x, y, direction in data.get("turrets", ()):
+        turret = Turret(x, y, direction)
+        turret.level_width = level_width
+        turrets.add(turret)
+
+    for x, y, item_type in data.get("items", ()):
+        collectibles.add(Collectible(x, y, item_type))
+
+    checkpoint = Checkpoint(*data["checkpoint"])
+
+    return Level((platforms, spikes, turrets, collectibles, checkpoint), level_width, data.get("height", LEVEL_HEIGHT))
+
+
+def create_level():
+    """
+    Создает и настраивает игровой уровень из файла DEFAULT_LEVEL
+
+    :returns: Кортеж объектов уровня (platforms, spikes, turrets, collectibles, checkpoint)
+    :rtype: tuple
+    """
+    return load_level(DEFAULT_LEVEL)
+
+
+def read_level_json(path):
+    """
+    Читает описание уровня из JSON-файла
+
+    :param path: Путь к файлу
+    :type path: str
+    :returns: Описание уровня
+    :rtype: dict
+    :raises ValueError: Если в файле нет финиша или указан неизвестный тип объекта
+    """
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    if "checkpoint" not in data:
+        raise ValueError(f"{path}: level has no checkpoint")
+    for x, y, direction in data.get("turrets", ()):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"{path}: unknown turret direction {direction!r}")
+    for x, y, item_type in data.get("items", ()):
+        if item_type not in ITEM_TYPES:
+            raise ValueError(f"{path}: unknown item type {item_type!r}")
+    data.setdefault("width", LEVEL_WIDTH)
+    data.setdefault("height", LEVEL_HEIGHT)
+    return data
+
+
+def write_level_json(data, path):
+    """
+    Сохраняет описание уровня в JSON-файл, по одному объекту на строку
+
+    :param data: Описание уровня
+    :type data: dict
+    :param path: Путь к файлу
+    :type path: str
+    """
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, (list, tuple)) and value and isinstance(value[0], (list, tuple)):
+            records = ",\n".join(f"    {json.dumps(list(record), ensure_ascii=False)}" for record in value)
+            lines.append(f"  {json.dumps(key)}: [\n{records}\n  ]")
+        else:
+            lines.append(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+def _compile_section(records, record_struct, cell_size, size=None):
+    """
+    Сортирует записи раздела по X и вычисляет ячейки пространственного индекса
+
+    :param records: Кортежи (x, y, ...) записей раздела
+    :type records: list
+    :param record_struct: Формат записи
+    :type record_struct: struct.Struct
+    :param cell_size: Размер ячейки индекса
+    :type cell_size: int
+    :param size: Размер объекта, если он не записан в самой записи
+    :type size: tuple
+    :returns: Байты раздела
+    :rtype: bytes
+    """
+    records = sorted(records, key=lambda record: (record[0], record[1]))
+    grid = SpatialGrid(cell_size)
+    buckets = {}
+    for index, record in enumerate(records):
+        width, height = size if size is not None else record[2:4]
+        for key in grid._cells_for(pygame.Rect(record[0], record[1], width, height)):
+            buckets.setdefault(key, []).append(index)
+    buckets = sorted(buckets.items())
+    flat = [index for key, indices in buckets for index in indices]
+    chunks = [_COUNT.pack(len(records))]
+    chunks.extend(record_struct.pack(*record) for record in records)
+    chunks.append(_COUNT.pack(len(buckets)))
+    chunks.extend(_BUCKET.pack(cx, cy, len(indices)) for (cx, cy), indices in buckets)
+    chunks.append(_COUNT.pack(len(flat)))
+    chunks.append(struct.pack(f"<{len(flat)}I", *flat))
+    return b"".join(chunks)
+
+
+def compile_level(data, path, cell_size=128):
+    """
+    Компилирует описание уровня в компактный двоичный файл
+
+    Объекты каждого раздела сортируются по X, а для разделов с
+    пространственным индексом заранее вычисляются ячейки SpatialGrid,
+    чтобы загрузчику не нужно было пересчитывать их.
+
+    :param data: Описание уровня
+    :type data: dict
+    :param path: Путь к выходному файлу
+    :type path: str
+    :param cell_size: Размер ячейки пространственного индекса, по умолчанию 128
+    :type cell_size: int
+    """
+    platforms = [tuple(record) + (0,) for record in data.get("platforms", ())]
+    platforms += [tuple(record) + (1,) for record in data.get("vertical_platforms", ())]
+    turrets = [(x, y, DIRECTIONS.index(direction)) for x, y, direction in data.get("turrets", ())]
+    items = [(x, y, ITEM_TYPES.index(item_type)) for x, y, item_type in data.get("items", ())]
+    with open(path, "wb") as file:
+        file.write(_LEVEL_HEADER.pack(LEVEL_FORMAT_MAGIC, LEVEL_FORMAT_VERSION, cell_size,
+                                      data.get("width", LEVEL_WIDTH), data.get("height", LEVEL_HEIGHT)))
+        file.write(_compile_section(platforms, _PLATFORM_RECORD, cell_size))
+        file.write(_compile_section([tuple(record) for record in data.get("spikes", ())], _SPIKE_RECORD, cell_size))
+        file.write(_compile_section(turrets, _TURRET_RECORD, cell_size, COMPILED_SIZES["turrets"]))
+        file.write(_compile_section(items, _ITEM_RECORD, cell_size, COMPILED_SIZES["items"]))
+        file.write(_CHECKPOINT_RECORD.pack(*data["checkpoint"]))
+
+
+def _read_section(view, offset, record_struct):
+    """
+    Читает записи и ячейки индекса одного раздела скомпилированного уровня
+
+    :param view: Содержимое файла
+    :type view: memoryview
+    :param offset: Смещение начала раздела
+    :type offset: int
+    :param record_struct: Формат записи
+    :type record_struct: struct.Struct
+    :returns: Кортеж (записи, ячейки, смещение следующего раздела)
+    :rtype: tuple
+    """
+    (count,) = _COUNT.unpack_from(view, offset)
+    offset += _COUNT.size
+    end = offset + count * record_struct.size
+    records = list(record_struct.iter_unpack(view[offset:end]))
+    offset = end
+    (bucket_count,) = _COUNT.unpack_from(view, offset)
+    offset += _COUNT.size
+    end = offset + bucket_count * _BUCKET.size
+    headers = list(_BUCKET.iter_unpack(view[offset:end]))
+    offset = end
+    (flat_count,) = _COUNT.unpack_from(view, offset)
+    offset += _COUNT.size
+    end = offset + flat_count * 4
+    flat = view[offset:end].cast("I").tolist()
+    offset = end
+    return records, (headers, flat), offset
+
+
+def read_compiled_level(path):
+    """
+    Читает скомпилированный уровень через mmap без копирования файла
+
+    :param path: Путь к файлу
+    :type path: str
+    :returns: Словарь с размерами уровня, записями и ячейками разделов
+    :rtype: dict
+    :raises ValueError: Если файл не является скомпилированным уровнем
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            magic, version, cell_size, width, height = _LEVEL_HEADER.unpack_from(view, 0)
+            if magic != LEVEL_FORMAT_MAGIC or version != LEVEL_FORMAT_VERSION:
+                raise ValueError(f"{path}: not a compiled level")
+            offset = _LEVEL_HEADER.size
+            sections = {}
+            for name, record_struct in (("platforms", _PLATFORM_RECORD), ("spikes", _SPIKE_RECORD),
+                                        ("turrets", _TURRET_RECORD), ("items", _ITEM_RECORD)):
+                records, buckets, offset = _read_section(view, offset, record_struct)
+                sections[name] = (records, buckets)
+            checkpoint = _CHECKPOINT_RECORD.unpack_from(view, offset)
+        finally:
+            view.release()
+    return {"cell_size": cell_size, "width": width, "height": height,
+            "sections": sections, "checkpoint": checkpoint}
+
+
+def load_compiled_level(path):
+    """
+    Загружает скомпилированный уровень в объекты игры
+
+    Пространственные индексы групп заполняются готовыми ячейками из файла,
+    сборщик мусора на время загрузки отключается.
+
+    :param path: Путь к файлу
+    :type path: str
+    :returns: Объекты уровня (platforms, spikes, turrets, collectibles, checkpoint)
+        с размерами из файла
+    :rtype: Level
+    """
+    with gc_paused():
+        return _load_compiled_level(path)
+
+
+def _load_compiled_level(path):
+    """
+    Загружает скомпилированный уровень без управления сборщиком мусора
+
+    :param path: Путь к файлу
+    :type path: str
+    :returns: Объекты уровня
+    :rtype: Level
+    """
+    compiled = read_compiled_level(path)
+    level_width = compiled["width"]
+    cell_size = compiled["cell_size"]
+    sections = compiled["sections"]
+    platform_classes = (Platform, VerticalPlatform)
+
+    records, buckets = sections["platforms"]
+    platforms = IndexedGroup(cell_size=cell_size)
+    platforms.load_indexed([platform_classes[kind](x, y, w, h) for x, y, w, h, kind in records], buckets)
+
+    records, buckets = sections["spikes"]
+    spikes = IndexedGroup(cell_size=cell_size)
+    spikes.load_indexed([Spike(x, y, w, h) for x, y, w, h in records], buckets)
+
+    records, buckets = sections["turrets"]
+    turrets = TurretGroup(cell_size=cell_size)
+    sprites = [Turret(x, y, DIRECTIONS[direction]) for x, y, direction in records]
+    for turret in sprites:
+        turret.level_width = level_width
+    turrets.load_indexed(sprites, buckets)
+
+    records, buckets = sections["items"]
+    collectibles = IndexedGroup(cell_size=cell_size)
+    collectibles.load_indexed([Collectible(x, y, ITEM_TYPES[item_type]) for x, y, item_type in records], buckets)
+
+    checkpoint = Checkpoint(*compiled["checkpoint"])
+    return Level((platforms, spikes, turrets, collectibles, checkpoint), level_width, compiled["height"])
+
+
+def load_level(path):
+    """
+    Загружает уровень из JSON-файла или скомпилированного файла
+
+    :param path: Путь к файлу уровня (.json или скомпилированный)
+    :type path: str
+    :returns: Объекты уровня (platforms, spikes, turrets, collectibles, checkpoint)
+        с размерами уровня
+    :rtype: Level
+    """
+    if path.endswith(".json"):
+        return build_level(read_level_json(path))
+    return load_compiled_level(path)
+
+
+def read_level_data(path):
+    """
+    Читает описание уровня из JSON-файла или скомпилированного файла
+
+    :param path: Путь к файлу уровня (.json или скомпилированный)
+    :type path: str
+    :returns: Описание уровня в формате default_level_data()
+    :rtype: dict
+    """
+    if path.endswith(".json"):
+        return read_level_json(path)
+    compiled = read_compiled_level(path)
+    sections = compiled["sections"]
+    platforms = sections["platforms"][0]
+    return {
+        "width": compiled["width"],
+        "height": compiled["height"],
+        "platforms": [record[:4] for record in platforms if record[4] == 0],
+        "vertical_platforms": [record[:4] for record in platforms if record[4] == 1],
+        "spikes": sections["spikes"][0],
+        "turrets": [(x, y, DIRECTIONS[direction]) for x, y, direction in sections["turrets"][0]],
+        "items": [(x, y, ITEM_TYPES[item_type]) for x, y, item_type in sections["items"][0]],
+        "checkpoint": compiled["checkpoint"],
+    }
+
+
+class LevelStream:
+    """Уровень, объекты которого создаются по секциям рядом с камерой
+
+    Описание уровня делится на вертикальные секции шириной section_width.
+    Спрайты существуют только для секций в пределах margin пикселей от
+    видимой области; при движении камеры новые секции создаются, а дальние
+    удаляются из групп. Турели удалённых секций не обновляются и не стреляют,
+    их пули возвращаются в пул. Собранные предметы запоминаются и после
+    повторного создания секции не появляются снова.
+
+    Группы уровня остаются теми же объектами на всё время игры, поэтому их
+    можно передавать в World и Renderer как обычный уровень.
+
+    Записи каждого раздела один раз упорядочиваются по X (у скомпилированного
+    уровня они уже отсортированы), а состав секции находится двоичным поиском
+    при первом обращении к ней, поэтому создание потока не перебирает весь уровень.
+
+    :ivar width: Ширина уровня
+    :type width: int
+    :ivar height: Высота уровня
+    :type height: int
+    :ivar section_width: Ширина секции в пикселях
+    :type section_width: int
+    :ivar margin: Запас вокруг видимой области в пикселях
+    :type margin: int
+    :ivar section_count: Количество секций
+    :type section_count: int
+    :ivar live: Созданные спрайты по ключу (раздел описания, номер записи)
+    :type live: dict
+    :ivar active: Номера первой и последней активной секции или None
+    :type active: tuple
+    """
+
+    SIZES = {"turrets": COMPILED_SIZES["turrets"], "items": COMPILED_SIZES["items"]}
+
+    def __init__(self, data, section_width=1024, margin=SCREEN_WIDTH // 2):
+        """
+        Конструктор класса LevelStream
+
+        :param data: Описание уровня (см. default_level_data)
+        :type data: dict
+        :param section_width: Ширина секции в пикселях, по умолчанию 1024
+        :type section_width: int
+        :param margin: Запас вокруг видимой области, по умолчанию половина экрана
+        :type margin: int
+        """
+        self.data = data
+        self.width = data.get("width", LEVEL_WIDTH)
+        self.height = data.get("height", LEVEL_HEIGHT)
+        self.section_width = section_width
+        self.margin = margin
+        self.platforms = IndexedGroup()
+        self.spikes = IndexedGroup()
+        self.turrets = TurretGroup()
+        self.collectibles = IndexedGroup()
+        self.checkpoint = Checkpoint(*data["checkpoint"])
+        self._kinds = {
+            "platforms": (Platform, self.platforms),
+            "vertical_platforms": (VerticalPlatform, self.platforms),
+            "spikes": (Spike, self.spikes),
+            "turrets": (Turret, self.turrets),
+            "items": (Collectible, self.collectibles),
+        }
+        self.section_count = max(1, -(-self.width // section_width))
+        self._sorted = {}
+        for kind in self._kinds:
+            records = data.get(kind, ())
+            size = self.SIZES.get(kind)
+            xs = [record[0] for record in records]
+            order = sorted(range(len(xs)), key=xs.__getitem__)
+            widest = size[0] if size is not None else max((record[2] for record in records), default=0)
+            self._sorted[kind] = ([xs[index] for index in order], order, widest)
+        self._sections = {}
+        self.live = {}
+        self.collected = set()
+        self.active = None
+
+    @property
+    def level(self):
+        """
+        Объекты уровня в порядке, возвращаемом create_level()
+
+        :rtype: Level
+        """
+        return Level((self.platforms, self.spikes, self.turrets, self.collectibles, self.checkpoint),
+                     self.width, self.height)
+
+    def _section_of(self, x):
+        """
+        Возвращает номер секции, в которую попадает координата X
+
+        :param x: Координата X
+        :type x: int
+        :rtype: int
+        """
+        return max(0, min(x // self.section_width, self.section_count - 1))
+
+    def _section(self, number):
+        """
+        Записи, попадающие в секцию, с номерами их первой и последней секции
+
+        :param number: Номер секции
+        :type number: int
+        :returns: Список (раздел, номер записи, первая секция, последняя секция)
+            в порядке разделов и номеров записей
+        :rtype: list
+        """
+        entries = self._sections.get(number)
+        if entries is not None:
+            return entries
+        entries = []
+        low = number * self.section_width
+        high = low + self.section_width
+        for kind, (xs, order, widest) in self._sorted.items():
+            records = self.data[kind]
+            size = self.SIZES.get(kind)
+            # крайние секции принимают и записи за границами уровня
+            start = 0 if number == 0 else bisect_left(xs, low - widest)
+            stop = len(xs) if number == self.section_count - 1 else bisect_left(xs, high)
+            for index in sorted(order[start:stop]):
+                record = records[index]
+                width = size[0] if size is not None else record[2]
+                first = self._section_of(record[0])
+                last = self._section_of(record[0] + width - 1)
+                if first <= number <= last:
+                    entries.append((kind, index, first, last))
+        self._sections[number] = entries
+        return entries
+
+    def update(self, camera_x, view_width=SCREEN_WIDTH):
+        """
+        Создаёт секции, приблизившиеся к камере, и удаляет отдалившиеся
+
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param view_width: Ширина видимой области
+        :type view_width: int
+        :returns: True, если набор объектов уровня изменился
+        :rtype: bool
+        """
+        first = self._section_of(camera_x - self.margin)
+        last = self._section_of(camera_x + view_width + self.margin - 1)
+        previous = self.active
+        if previous == (first, last):
+            return False
+        self.active = (first, last)
+        if previous is not None:
+            for number in range(previous[0], previous[1] + 1):
+                if first <= number <= last:
+                    continue
+                for kind, index, low, high in self._section(number):
+                    if (high < first or low > last) and (kind, index) in self.live:
+                        self._unload(kind, index)
+        for number in range(first, last + 1):
+            if previous is not None and previous[0] <= number <= previous[1]:
+                continue
+            for kind, index, low, high in self._section(number):
+                key = (kind, index)
+                if key not in self.live and key not in self.collected:
+                    self._load(kind, index)
+        return True
+
+    def _load(self, kind, index):
+        """
+        Создаёт спрайт записи описания уровня и добавляет его в группу
+
+        :param kind: Раздел описания уровня
+        :type kind: str
+        :param index: Номер записи в разделе
+        :type index: int
+        """
+        factory, group = self._kinds[kind]
+        sprite = factory(*self.data[kind][index])
+        if kind == "turrets":
+            sprite.level_width = self.width
+        group.add(sprite)
+        self.live[kind, index] = sprite
+
+    def _unload(self, kind, index):
+        """
+        Удаляет спрайт записи из группы и освобождает его пули
+
+        :param kind: Раздел описания уровня
+        :type kind: str
+        :param index: Номер записи в разделе
+        :type index: int
+        """
+        sprite = self.live.pop((kind, index))
+        if not sprite.alive():
+            self.collected.add((kind, index))
+            return
+        if kind == "turrets":
+            for bullet in sprite.bullets[:]:
+                sprite.remove_bullet(bullet)
+        self._kinds[kind][1].remove(sprite)
+
+
+def create_streamed_level():
+    """
+    Создаёт встроенный уровень, объекты которого создаются по секциям
+
+    :returns: Уровень с секциями
+    :rtype: LevelStream
+    """
+    return LevelStream(default_level_data())
+
+
+class WorldState(namedtuple("WorldState", ("tick", "camera", "previous", "flags", "player", "groups", "turrets",
+                                           "swarm", "stream"))):
+    """Снимок изменяемого состояния World для мгновенного восстановления
+
+    Неизменяемые части уровня (изображения, платформы обычного уровня) в снимок
+    не копируются, а спрайты хранятся ссылками, поэтому снимок подходит только
+    для мира, в котором он снят.
+
+    :ivar tick: Номер тика
+    :type tick: int
+    :ivar camera: Позиция камеры (x, y)
+    :type camera: tuple
+    :ivar previous: Положение игрока и камеры на прошлом тике для интерполяции
+    :type previous: tuple
+    :ivar flags: Кортеж (game_over, game_won, активен ли финиш)
+    :type flags: tuple
+    :ivar player: Результат Player.state
+    :type player: tuple
+    :ivar groups: Пары (группа, множество её спрайтов) для групп, состав которых меняется
+    :type groups: tuple
+    :ivar turrets: Результат TurretGroup.state (для обычной группы — пары
+        (турель, Turret.state) стрелявших турелей и пустой кортеж)
+    :type turrets: tuple
+    :ivar swarm: Результат BulletSwarm.state или None
+    :type swarm: tuple
+    :ivar stream: Кортеж (live, collected, active) LevelStream или None
+    :type stream: tuple
+    """
+
+    __slots__ = ()
+
+
+def _restore_members(group, members):
+    """
+    Возвращает группе сохранённый состав спрайтов
+
+    Разница составов вычисляется операциями над множествами, поэтому удаляются
+    и добавляются только изменившиеся спрайты; порядок спрайтов в группе
+    может отличаться от сохранённого.
+
+    :param group: Группа спрайтов или список
+    :param members: Сохранённые спрайты группы
+    :type members: frozenset
+    """
+    if isinstance(group, list):
+        group[:] = [sprite for sprite in group if sprite in members] + list(members.difference(group))
+        return
+    current = group.spritedict.keys()
+    extra = current - members
+    missing = members - current
+    if extra:
+        group.remove(*extra)
+    if missing:
+        group.add(*missing)
+
+
+class World:
+    """Игровой мир с фиксированным шагом симуляции, независимый от отрисовки и ввода
+
+    Мир владеет объектами уровня и игроком, получает управление явно через
+    InputState и ведёт собственные часы: каждый тик продвигает игровое время
+    на 1000 / tick_rate миллисекунд. Поэтому мир можно прогонять быстрее
+    реального времени и без дисплея.
+
+    Скорости и ускорения объектов заданы за тик при 60 тиках в секунду
+    и умножаются на time_scale, поэтому от tick_rate зависит только
+    точность симуляции, а не скорость игры.
+
+    :ivar tick_rate: Количество тиков симуляции в секунду
+    :type tick_rate: int
+    :ivar time_scale: Отношение длины тика к 1/60 секунды (60 / tick_rate)
+    :type time_scale: float
+    :ivar tick: Номер текущего тика
+    :type tick: int
+    :ivar player: Объект игрока
+    :type player: Player
+    :ivar camera_x: Позиция камеры по X
+    :type camera_x: int
+    :ivar camera_y: Позиция камеры по Y
+    :type camera_y: int
+    :ivar game_over: Игра проиграна
+    :type game_over: bool
+    :ivar game_won: Уровень пройден
+    :type game_won: bool
+    :ivar stream: Уровень с секциями, если level_factory вернула LevelStream, иначе None
+    :type stream: LevelStream
+    :ivar level_width: Ширина уровня
+    :type level_width: int
+    :ivar level_height: Высота уровня
+    :type level_height: int
+    :ivar profiler: Замеры этапов кадра или None
+    :type profiler: FrameProfiler
+    :ivar initial: Снимок состояния сразу после создания уровня
+    :type initial: WorldState
+    :ivar saved: Снимок последней контрольной точки или None
+    :type saved: WorldState
+    """
+
+    SNAP_DISTANCE = 200
+    CHECKPOINT_DISTANCE = 1000
+
+    def __init__(self, level_factory=create_level, tick_rate=60,
+                 screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT, bullet_swarm=False, tile_collision=False,
+                 checkpoints=False):
+        """
+        Конструктор класса World
+
+        :param level_factory: Функция, создающая объекты уровня или LevelStream,
+            по умолчанию create_level
+        :type level_factory: callable
+        :param tick_rate: Количество тиков в секунду, по умолчанию 60
+        :type tick_rate: int
+        :param screen_width: Ширина области камеры
+        :type screen_width: int
+        :param screen_height: Высота области камеры
+        :type screen_height: int
+        :param bullet_swarm: Хранить пули в пуле BulletSwarm (нужен NumPy), по умолчанию False
+        :type bullet_swarm: bool
+        :param tile_collision: Отсекать проверки столкновений игрока и пуль растровой
+            картой платформ CollisionMap, по умолчанию False
+        :type tile_collision: bool
+        :param checkpoints: Сохранять контрольную точку, когда игрок стоит на земле
+            в CHECKPOINT_DISTANCE пикселей правее прошлой, по умолчанию False
+        :type checkpoints: bool
+        """
+        self.level_factory = level_factory
+        self.bullet_swarm = bullet_swarm
+        self.tile_collision = tile_collision
+        self.checkpoints = checkpoints
+        self.profiler = None
+        self.tick_rate = tick_rate
+        self.time_scale = 60 / tick_rate
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.reset()
+
+    def reset(self):
+        """
+        Заново создаёт уровень и игрока и сбрасывает часы
+        """
+        level = self.level_factory()
+        if isinstance(level, LevelStream):
+            self.stream = level
+            level.update(0, self.screen_width)
+            level = level.level
+        else:
+            self.stream = None
+        # фабрики, возвращающие обычный кортеж, получают размеры встроенного уровня
+        self.level_width = getattr(level, "width", LEVEL_WIDTH)
+        self.level_height = getattr(level, "height", LEVEL_HEIGHT)
+        self.platforms, self.spikes, self.turrets, self.collectibles, self.checkpoint = level
+        for turret in self.turrets:
+            turret.level_width = self.level_width
+            turret.time_scale = self.time_scale
+        if hasattr(self.turrets, "use_time_scale"):
+            # турели потоковых секций создаются позже и получают масштаб от группы
+            self.turrets.use_time_scale(self.time_scale)
+        if self.tile_collision:
+            self.platforms.build_collision_map(self.level_width, self.level_height)
+        if self.bullet_swarm:
+            self.turrets.use_swarm(BulletSwarm(self.platforms, level_width=self.level_width))
+        self.player = Player(100, 100)
+        self.player.level_width = self.level_width
+        self.player.level_height = self.level_height
+        self.player.time_scale = self.time_scale
+        self.tick = 0
+        self.camera_x = 0
+        self.camera_y = 0
+        self.game_over = False
+        self.game_won = False
+        self._previous = self._snapshot()
+        self.saved = None
+        self.initial = self.snapshot()
+
+    def snapshot(self):
+        """
+        Снимает состояние мира, которое можно вернуть методом restore
+
+        Для обычного уровня копируются поля игрока, состав группы предметов,
+        таймеры и пули турелей и пул BulletSwarm; для уровня с секциями —
+        ещё состав остальных групп и набор созданных секций.
+
+        :returns: Снимок состояния
+        :rtype: WorldState
+        """
+        stream = self.stream
+        if stream is None:
+            groups = (self.collectibles,)
+        else:
+            groups = (self.platforms, self.spikes, self.turrets, self.collectibles)
+        turrets = self.turrets
+        swarm = getattr(turrets, "swarm", None)
+        if hasattr(turrets, "state"):
+            turret_state = turrets.state()
+        else:
+            fired = tuple((turret, turret.state()) for turret in turrets if turret.last_shot or turret.bullets)
+            turret_state = fired, ()
+        return WorldState(
+            self.tick, (self.camera_x, self.camera_y), self._previous,
+            (self.game_over, self.game_won, self.checkpoint.active), self.player.state(),
+            tuple((group, frozenset(group)) for group in groups), turret_state,
+            None if swarm is None else swarm.state(),
+            None if stream is None else (dict(stream.live), frozenset(stream.collected), stream.active),
+        )
+
+    def restore(self, state):
+        """
+        Возвращает мир в состояние снимка без пересоздания уровня
+
+        Снимок можно восстанавливать многократно, например чтобы прогнать
+        несколько вариантов управления из одной точки.
+
+        :param state: Снимок этого мира, полученный методом snapshot
+        :type state: WorldState
+        """
+        turrets = self.turrets
+        stream = self.stream
+        if stream is not None:
+            # удаляемые из группы турели должны вернуть пули в пул до удаления
+            for turret in turrets:
+                turret.set_state((turret.last_shot, ()))
+        for group, members in state.groups:
+            _restore_members(group, members)
+        if hasattr(turrets, "set_state"):
+            turrets.set_state(state.turrets)
+        else:
+            saved = dict(state.turrets[0])
+            for turret in turrets:
+                turret.set_state(saved.get(turret, (0, ())))
+        swarm = getattr(turrets, "swarm", None)
+        if swarm is not None:
+            swarm.set_state(state.swarm)
+        if stream is not None:
+            live, collected, stream.active = state.stream
+            stream.live = dict(live)
+            stream.collected = set(collected)
+            if swarm is not None:
+                swarm.set_platforms(self.platforms)
+        self.player.set_state(state.player)
+        self.tick = state.tick
+        self.camera_x, self.camera_y = state.camera
+        self.game_over, self.game_won, self.checkpoint.active = state.flags
+        self._previous = state.previous
+
+    def restart(self):
+        """
+        Мгновенно возвращает мир в начальное состояние без загрузки уровня
+        """
+        self.restore(self.initial)
+        self.saved = None
+
+    def save_checkpoint(self):
+        """
+        Делает текущее положение игрока точкой возрождения и запоминает снимок мира
+        """
+        self.player.spawn = self.player.rect.topleft
+        self.saved = self.snapshot()
+
+    def respawn(self):
+        """
+        Возвращает мир к последней контрольной точке или в начальное состояние
+        """
+        if self.saved is None:
+            self.restart()
+        else:
+            self.restore(self.saved)
+
+    def _snapshot(self):
+        """
+        Положение игрока и камеры для интерполяции отрисовки
+
+        :rtype: tuple
+        """
+        return self.player.rect.x, self.player.rect.y, self.camera_x, self.camera_y
+
+    def interpolate(self, alpha):
+        """
+        Положение игрока и камеры между двумя последними тиками
+
+        При перемещении игрока больше чем на SNAP_DISTANCE пикселей за тик
+        (возрождение) интерполяция не выполняется.
+
+        :param alpha: Доля тика, прошедшая после последнего шага, от 0 до 1
+        :type alpha: float
+        :returns: Кортеж (x игрока, y игрока, x камеры, y камеры)
+        :rtype: tuple
+        """
+        current = self._snapshot()
+        previous = self._previous
+        if alpha >= 1 or abs(current[0] - previous[0]) + abs(current[1] - previous[1]) > self.SNAP_DISTANCE:
+            return current
+        return tuple(round(old + (new - old) * alpha) for old, new in zip(previous, current))
+
+    @property
+    def level(self):
+        """
+        Объекты уровня в порядке, возвращаемом create_level()
+
+        :rtype: Level
+        """
+        return Level((self.platforms, self.spikes, self.turrets, self.collectibles, self.checkpoint),
+                     self.level_width, self.level_height)
+
+    @property
+    def now(self):
+        """
+        Игровое время текущего тика в миллисекундах
+
+        :rtype: int
+        """
+        return self.tick * 1000 // self.tick_rate
+
+    @property
+    def finished(self):
+        """
+        Игра завершена победой или поражением
+
+        :rtype: bool
+        """
+        return self.game_over or self.game_won
+
+    def step(self, controls=None):
+        """
+        Продвигает симуляцию на один тик
+
+        :param controls: Состояние управления, по умолчанию ничего не нажато
+        :type controls: InputState
+        """
+        if self.finished:
+            return
+        if controls is None:
+            controls = InputState()
+        self._previous = self._snapshot()
+        self.tick += 1
+        now = self.now
+        player = self.player
+        profiler = self.profiler
+        player.update(self.platforms, self.spikes, self.turrets, self.collectibles,
+                      self.screen_width, self.screen_height, self.camera_x, self.camera_y,
+                      controls=controls, now=now)
+        if profiler is not None:
+            profiler.mark("player")
+        turrets = self.turrets
+        swarm = getattr(turrets, "swarm", None)
+        if hasattr(turrets, "update_near"):
+            left = self.camera_x
+            right = left + self.screen_width
+            turrets.update_near(player, self.platforms, now, left, right)
+            if swarm is not None:
+                swarm.update((left - turrets.despawn_margin, right + turrets.despawn_margin))
+        else:
+            for turret in turrets:
+                turret.update(player, self.platforms, now=now)
+            if swarm is not None:
+                swarm.update()
+        if profiler is not None:
+            profiler.mark("turrets")
+        if self.checkpoint.update(player):
+            self.game_won = True
+        if player.lives <= 0:
+            self.game_over = True
+        if profiler is not None:
+            profiler.mark("checkpoint")
+        self.update_camera()
+        if self.stream is not None and self.stream.update(self.camera_x, self.screen_width) and swarm is not None:
+            swarm.set_platforms(self.platforms)
+        if (self.checkpoints and player.on_ground and not player.immune and not self.finished
+                and player.rect.x - player.spawn[0] >= self.CHECKPOINT_DISTANCE):
+            self.save_checkpoint()
+        if profiler is not None:
+            profiler.mark("camera")
+
+    def run(self, ticks, controls=None):
+        """
+        Выполняет несколько тиков с одинаковым управлением
+
+        :param ticks: Количество тиков
+        :type ticks: int
+        :param controls: Состояние управления
+        :type controls: InputState
+        """
+        for _ in range(ticks):
+            self.step(controls)
+
+    def update_camera(self):
+        """
+        Центрирует камеру на игроке в пределах уровня
+        """
+        camera_x = self.player.rect.centerx - self.screen_width // 2
+        camera_y = self.player.rect.centery - self.screen_height // 2
+        self.camera_x = max(0, min(camera_x, self.level_width - self.screen_width))
+        self.camera_y = max(0, min(camera_y, self.level_height - self.screen_height))
+
+    def checksum(self):
+        """
+        Контрольная сумма состояния мира для сравнения прогонов
+
+        Учитываются номер тика, положение и скорость игрока, жизни, очки
+        и позиции всех пуль.
+
+        :returns: CRC32 состояния
+        :rtype: int
+        """
+        player = self.player
+        state = _STATE_HEADER.pack(self.tick, player.rect.x, player.rect.y, round(player.vel_x), float(player.vel_y),
+                                   player.lives, player.score)
+        bullets = sorted(bullet.rect.topleft for turret in self.turrets for bullet in turret.bullets)
+        swarm = getattr(self.turrets, "swarm", None)
+        if swarm is not None:
+            alive = swarm.alive[:swarm.count]
+            bullets += sorted(zip(swarm.x[:swarm.count][alive].tolist(), swarm.y[:swarm.count][alive].tolist()))
+        checksum = zlib.crc32(state)
+        for x, y in bullets:
+            checksum = zlib.crc32(_STATE_POINT.pack(x, y), checksum)
+        return checksum
+
+
+RECORDING_MAGIC = b"PREC"
+RECORDING_VERSION = 1
+RECORDING_SWARM = 1
+RECORDING_STREAM = 2
+RECORDING_TILES = 4
+RECORDING_CHECKPOINTS = 8
+
+_RECORDING_HEADER = struct.Struct("<4sHHIIBxH")
+_STATE_HEADER = struct.Struct("<qiiidii")
+_STATE_POINT = struct.Struct("<ii")
+
+
+def make_level_factory(path=None, stream=False):
+    """
+    Возвращает функцию создания уровня для World
+
+    :param path: Путь к файлу уровня или None для встроенного уровня
+    :type path: str
+    :param stream: Создавать объекты уровня по секциям (LevelStream); скомпилированные
+        уровни всегда создаются по секциям, чтобы загрузка не зависела от размера уровня
+    :type stream: bool
+    :rtype: callable
+    """
+    if stream or (path and not path.endswith(".json")):
+        return functools.partial(LevelStream, read_level_data(path) if path else default_level_data())
+    if path:
+        return functools.partial(load_level, path)
+    return create_level
+
+
+class Recording:
+    """Запись управления игрока по тикам для детерминированного повтора
+
+    Каждый тик хранится одним байтом InputState.bits, на диск поток пишется
+    сжатым zlib. Вместе с управлением сохраняются частота тиков, уровень,
+    режимы мира и контрольная сумма конечного состояния World.checksum().
+
+    :ivar tick_rate: Количество тиков в секунду
+    :type tick_rate: int
+    :ivar level: Путь к файлу уровня или пустая строка для встроенного уровня
+    :type level: str
+    :ivar flags: Режимы мира (RECORDING_SWARM, RECORDING_STREAM, RECORDING_TILES,
+        RECORDING_CHECKPOINTS)
+    :type flags: int
+    :ivar inputs: Управление по тикам
+    :type inputs: bytearray
+    :ivar checksum: Контрольная сумма конечного состояния или 0
+    :type checksum: int
+    """
+
+    def __init__(self, tick_rate=60, level="", flags=0, inputs=b"", checksum=0):
+        """
+        Конструктор класса Recording
+
+        :param tick_rate: Количество тиков в секунду, по умолчанию 60
+        :type tick_rate: int
+        :param level: Путь к файлу уровня, по умолчанию встроенный уровень
+        :type level: str
+        :param flags: Режимы мира, по умолчанию 0
+        :type flags: int
+        :param inputs: Управление по тикам
+        :type inputs: bytes
+        :param checksum: Контрольная сумма конечного состояния
+        :type checksum: int
+        """
+        self.tick_rate = tick_rate
+        self.level = level
+        self.flags = flags
+        self.inputs = bytearray(inputs)
+        self.checksum = checksum
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def append(self, controls):
+        """
+        Добавляет управление очередного тика
+
+        :param controls: Состояние управления
+        :type controls: InputState
+        """
+        self.inputs.append(controls.bits)
+
+    def finish(self, world):
+        """
+        Запоминает контрольную сумму конечного состояния мира
+
+        :param world: Мир, управление которого записывалось
+        :type world: World
+        """
+        self.checksum = world.checksum()
+
+    def controls(self):
+        """
+        Перебирает записанное управление по тикам
+
+        :returns: Итератор состояний управления
+        :rtype: iterator
+        """
+        states = [InputState.from_bits(bits) for bits in range(8)]
+        return (states[bits] for bits in self.inputs)
+
+    def save(self, path):
+        """
+        Сохраняет запись в файл
+
+        :param path: Путь к файлу
+        :type path: str
+        """
+        level = self.level.encode("utf-8")
+        with open(path, "wb") as file:
+            file.write(_RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.tick_rate, len(self.inputs),
+                                              self.checksum, self.flags, len(level)))
+            file.write(level)
+            file.write(zlib.compress(bytes(self.inputs), 9))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает запись из файла
+
+        :param path: Путь к файлу
+        :type path: str
+        :returns: Запись
+        :rtype: Recording
+        :raises ValueError: Если файл не является записью или повреждён
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        try:
+            magic, version, tick_rate, ticks, checksum, flags, level_size = _RECORDING_HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError(f"{path}: not a recording") from None
+        if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+            raise ValueError(f"{path}: not a recording")
+        offset = _RECORDING_HEADER.size
+        level = data[offset:offset + level_size].decode("utf-8")
+        inputs = zlib.decompress(data[offset + level_size:])
+        if len(inputs) != ticks:
+            raise ValueError(f"{path}: recording is truncated")
+        return cls(tick_rate, level, flags, inputs, checksum)
+
+    def world(self):
+        """
+        Создаёт мир в тех же режимах, в которых велась запись
+
+        :returns: Новый мир
+        :rtype: World
+        """
+        level_factory = make_level_factory(self.level or None, bool(self.flags & RECORDING_STREAM))
+        return World(level_factory, tick_rate=self.tick_rate, bullet_swarm=bool(self.flags & RECORDING_SWARM),
+                     tile_collision=bool(self.flags & RECORDING_TILES),
+                     checkpoints=bool(self.flags & RECORDING_CHECKPOINTS))
+
+
+def replay(recording, world=None):
+    """
+    Прогоняет записанное управление без отрисовки и с максимальной скоростью
+
+    :param recording: Запись
+    :type recording: Recording
+    :param world: Мир для прогона, по умолчанию recording.world()
+    :type world: World
+    :returns: Кортеж (мир после прогона, совпала ли контрольная сумма)
+    :rtype: tuple
+    """
+    if world is None:
+        world = recording.world()
+    step = world.step
+    for controls in recording.controls():
+        step(controls)
+    return world, world.checksum() == recording.checksum
+
+
+class FixedStep:
+    """Накопитель реального времени для фиксированного шага симуляции
+
+    Отрисовка идёт с любой частотой, а прошедшее между кадрами время
+    переводится в целое число тиков мира; остаток задаёт долю тика alpha
+    для интерполяции. Если кадр длился дольше max_steps тиков, лишнее время
+    отбрасывается, чтобы медленная машина не уходила в бесконечную
+    догонку.
+
+    :ivar tick_rate: Количество тиков в секунду
+    :type tick_rate: int
+    :ivar max_steps: Наибольшее количество тиков за один кадр
+    :type max_steps: int
+    :ivar accumulator: Накопленное и ещё не просимулированное время в секундах
+    :type accumulator: float
+    :ivar dropped: Количество отброшенных тиков
+    :type dropped: int
+    """
+
+    def __init__(self, tick_rate=60, max_steps=5):
+        """
+        Конструктор класса FixedStep
+
+        :param tick_rate: Количество тиков в секунду, по умолчанию 60
+        :type tick_rate: int
+        :param max_steps: Наибольшее количество тиков за кадр, по умолчанию 5
+        :type max_steps: int
+        """
+        self.tick_rate = tick_rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped = 0
+
+    @property
+    def alpha(self):
+        """
+        Доля тика, накопленная после последнего шага
+
+        :rtype: float
+        """
+        return self.accumulator * self.tick_rate
+
+    def advance(self, elapsed):
+        """
+        Добавляет прошедшее время и возвращает количество тиков для симуляции
+
+        :param elapsed: Время с прошлого кадра в секундах
+        :type elapsed: float
+        :returns: Количество тиков
+        :rtype: int
+        """
+        dt = 1 / self.tick_rate
+        self.accumulator += elapsed
+        steps = int(self.accumulator * self.tick_rate + 1e-9)
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator = max(0.0, self.accumulator - steps * dt)
+        return steps
+
+
+class PlatformerEnv:
+    """Среда в стиле Gym поверх World для обучения агентов
+
+    Действие — число от 0 до 7, битовая маска InputState.bits. Наблюдение —
+    вектор из OBSERVATION_SIZE чисел: состояние игрока, направление на финиш
+    и смещения до NEAREST_BULLETS ближайших пуль, либо кадр ObservationRenderer. Награда — продвижение
+    вправо (1 за 100 пикселей), бонус за очки, штраф за потерянные жизни и
+    награда за прохождение уровня. Окно и часы pygame не используются.
+
+    :ivar world: Мир среды
+    :type world: World
+    :ivar max_ticks: Длина эпизода в тиках
+    :type max_ticks: int
+    :ivar frame_skip: Сколько тиков повторяется каждое действие
+    :type frame_skip: int
+    :ivar observation_shape: Форма наблюдения
+    :type observation_shape: tuple
+    :ivar observation_dtype: Тип элементов наблюдения NumPy
+    :type observation_dtype: str
+    """
+
+    ACTIONS = 8
+    NEAREST_BULLETS = 4
+    OBSERVATION_FIELDS = (
+        "x", "y", "vel_x", "vel_y", "on_ground", "immune", "lives", "score",
+        "checkpoint_dx", "checkpoint_dy", "bullets",
+    ) + tuple(f"bullet{i}_{axis}" for i in range(NEAREST_BULLETS) for axis in ("dx", "dy"))
+    OBSERVATION_SIZE = len(OBSERVATION_FIELDS)
+
+    def __init__(self, level_factory=create_level, max_ticks=3600, frame_skip=1, bullet_swarm=False,
+                 observation="vector", observation_size=(100, 60), tile_collision=False):
+        """
+        Конструктор класса PlatformerEnv
+
+        :param level_factory: Функция, создающая уровень, по умолчанию create_level
+        :type level_factory: callable
+        :param max_ticks: Длина эпизода в тиках, по умолчанию 3600 (минута игры)
+        :type max_ticks: int
+        :param frame_skip: Сколько тиков повторяется каждое действие, по умолчанию 1
+        :type frame_skip: int
+        :param bullet_swarm: Хранить пули в пуле BulletSwarm, по умолчанию False
+        :type bullet_swarm: bool
+        :param observation: "vector" — вектор признаков, "pixels" или "grid" — кадр
+            ObservationRenderer
+        :type observation: str
+        :param observation_size: Ширина и высота кадра для "pixels" и "grid"
+        :type observation_size: tuple
+        :param tile_collision: Отсекать проверки столкновений растровой картой платформ,
+            по умолчанию False
+        :type tile_collision: bool
+        """
+        self.world = World(level_factory, bullet_swarm=bullet_swarm, tile_collision=tile_collision)
+        self.renderer = None
+        self.observation_shape, self.observation_dtype = self.observation_spec(observation, observation_size)
+        if observation != "vector":
+            self.renderer = ObservationRenderer(*observation_size, mode=observation)
+        self.max_ticks = max_ticks
+        self.frame_skip = frame_skip
+        self._actions = [InputState.from_bits(bits) for bits in range(self.ACTIONS)]
+
+    @classmethod
+    def observation_spec(cls, observation="vector", observation_size=(100, 60)):
+        """
+        Форма и тип элементов наблюдения без создания среды
+
+        :param observation: "vector", "pixels" или "grid"
+        :type observation: str
+        :param observation_size: Ширина и высота кадра для "pixels" и "grid"
+        :type observation_size: tuple
+        :returns: Кортеж (форма, тип NumPy)
+        :rtype: tuple
+        :raises ValueError: Если вид наблюдения неизвестен
+        """
+        width, height = observation_size
+        if observation == "vector":
+            return (cls.OBSERVATION_SIZE,), "float32"
+        if observation == "pixels":
+            return (height, width, 3), "uint8"
+        if observation == "grid":
+            return (height, width), "uint8"
+        raise ValueError(f"unknown observation mode {observation!r}")
+
+    def reset(self):
+        """
+        Начинает новый эпизод
+
+        :returns: Первое наблюдение
+        """
+        self.world.restart()
+        return self.observe()
+
+    def step(self, action):
+        """
+        Выполняет действие в течение frame_skip тиков
+
+        :param action: Номер действия от 0 до 7
+        :type action: int
+        :returns: Кортеж (наблюдение, награда, эпизод завершён, словарь с tick, lives, score, won)
+        :rtype: tuple
+        """
+        reward, done = self.advance(action)
+        player = self.world.player
+        info = {"tick": self.world.tick, "lives": player.lives, "score": player.score, "won": self.world.game_won}
+        return self.observe(), reward, done, info
+
+    def advance(self, action):
+        """
+        Выполняет действие без построения наблюдения
+
+        :param action: Номер действия от 0 до 7
+        :type action: int
+        :returns: Кортеж (награда, эпизод завершён)
+        :rtype: tuple
+        """
+        world = self.world
+        player = world.player
+        controls = self._actions[action]
+        x, lives, score = player.rect.x, player.lives, player.score
+        for _ in range(self.frame_skip):
+            world.step(controls)
+            if world.finished:
+                break
+        reward = (player.rect.x - x) / 100 + (player.score - score) / 10 - (lives - player.lives)
+        if world.game_won:
+            reward += 10
+        return reward, world.finished or world.tick >= self.max_ticks
+
+    def observe(self, out=None):
+        """
+        Строит вектор наблюдения
+
+        :param out: Изменяемая последовательность длины OBSERVATION_SIZE для записи
+            наблюдения без выделения памяти, например строка общего массива
+        :returns: out или новый массив float32 (список, если NumPy не установлен);
+            для кадровых наблюдений — массив ObservationRenderer, общий для всех шагов
+        """
+        if self.renderer is not None:
+            frame = self.renderer.render(self.world)
+            if out is None:
+                return frame
+            out[...] = frame
+            return out
+        world = self.world
+        player = world.player
+        rect = player.rect
+        view = pygame.Rect(0, 0, world.screen_width, world.screen_height)
+        view.center = rect.center
+        bullets = [bullet.rect.center for bullet in world.turrets.bullets_near(view)] \
+            if hasattr(world.turrets, "bullets_near") else []
+        swarm = getattr(world.turrets, "swarm", None)
+        if swarm is not None:
+            bullets += [bullet_rect.center for image, bullet_rect in swarm.visible(view)]
+        cx, cy = rect.center
+        bullets.sort(key=lambda center: abs(center[0] - cx) + abs(center[1] - cy))
+        values = [
+            rect.x / world.level_width, rect.y / world.level_height,
+            player.vel_x / (10 * world.time_scale), player.vel_y / (20 * world.time_scale),
+            float(player.on_ground), float(player.immune), float(player.lives), float(player.score),
+            (world.checkpoint.rect.centerx - cx) / world.level_width,
+            (world.checkpoint.rect.centery - cy) / world.level_height,
+            float(len(bullets)),
+        ]
+        for i in range(self.NEAREST_BULLETS):
+            if i < len(bullets):
+                values.append((bullets[i][0] - cx) / world.screen_width)
+                values.append((bullets[i][1] - cy) / world.screen_height)
+            else:
+                values += (0.0, 0.0)
+        if out is not None:
+            out[:] = values
+            return out
+        if np is None:
+            return values
+        return np.array(values, dtype=np.float32)
+
+
+def _vector_views(buffer, num_envs, spec):
+    """
+    Раскладывает общий буфер векторной среды на массивы NumPy без копирования
+
+    Награды идут первыми, чтобы наблюдения float32 оставались выровненными
+    при любом размере кадров uint8.
+
+    :param buffer: Буфер общей памяти
+    :param num_envs: Количество сред
+    :type num_envs: int
+    :param spec: Форма и тип наблюдения из PlatformerEnv.observation_spec
+    :type spec: tuple
+    :returns: Кортеж (наблюдения, награды, флаги завершения, действия)
+    :rtype: tuple
+    """
+    shape, dtype = spec
+    rewards = np.ndarray(num_envs, dtype=np.float32, buffer=buffer)
+    offset = rewards.nbytes
+    observations = np.ndarray((num_envs,) + shape, dtype=dtype, buffer=buffer, offset=offset)
+    offset += observations.nbytes
+    dones = np.ndarray(num_envs, dtype=np.bool_, buffer=buffer, offset=offset)
+    offset += dones.nbytes
+    actions = np.ndarray(num_envs, dtype=np.uint8, buffer=buffer, offset=offset)
+    return observations, rewards, dones, actions
+
+
+def _vector_buffer_size(num_envs, spec):
+    """
+    Размер общего буфера векторной среды в байтах
+
+    :param num_envs: Количество сред
+    :type num_envs: int
+    :param spec: Форма и тип наблюдения из PlatformerEnv.observation_spec
+    :type spec: tuple
+    :rtype: int
+    """
+    shape, dtype = spec
+    observation_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return num_envs * (observation_bytes + 4 + 1 + 1)
+
+
+def _vector_worker(connection, buffer_name, start, stop, num_envs, spec, env_kwargs):
+    """
+    Рабочий процесс VectorEnv: ведёт среды с номерами [start, stop)
+
+    Команды приходят по каналу: "reset", "step" и "close". Действия
+    читаются, а наблюдения, награды и флаги завершения пишутся прямо в
+    общую память.
+    """
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    observations, rewards, dones, actions = _vector_views(buffer.buf, num_envs, spec)
+    envs = [PlatformerEnv(**env_kwargs) for _ in range(start, stop)]
+    try:
+        while True:
+            command = connection.recv()
+            if command == "close":
+                break
+            for index, env in enumerate(envs, start):
+                if command == "reset":
+                    env.world.restart()
+                    rewards[index] = 0
+                    dones[index] = False
+                else:
+                    reward, done = env.advance(int(actions[index]))
+                    if done:
+                        env.world.restart()
+                    rewards[index] = reward
+                    dones[index] = done
+                env.observe(observations[index])
+            connection.send(True)
+    finally:
+        del observations, rewards, dones, actions
+        buffer.close()
+        connection.close()
+
+
+class VectorEnv:
+    """N независимых сред PlatformerEnv в нескольких рабочих процессах
+
+    Среды делятся между процессами поровну. Действия, наблюдения, награды и
+    флаги завершения лежат в одном блоке multiprocessing.shared_memory,
+    поэтому за шаг по каналам передаются только короткие команды.
+    Завершившиеся эпизоды сразу начинаются заново, и в наблюдении такой
+    среды уже первое состояние нового эпизода.
+
+    Массивы, которые возвращают reset и step, — представления общей памяти:
+    следующий шаг их перезаписывает, поэтому сохранять их нужно копией.
+
+    :ivar num_envs: Количество сред
+    :type num_envs: int
+    :ivar observations: Наблюдения, массив num_envs наблюдений в форме и типе
+        PlatformerEnv.observation_spec: векторы float32 или кадры uint8
+    :ivar rewards: Награды последнего шага
+    :ivar dones: Флаги завершения эпизодов на последнем шаге
+    """
+
+    def __init__(self, num_envs, workers=None, **env_kwargs):
+        """
+        Конструктор класса VectorEnv
+
+        :param num_envs: Количество сред
+        :type num_envs: int
+        :param workers: Количество процессов, по умолчанию по числу ядер
+        :type workers: int
+        :param env_kwargs: Аргументы PlatformerEnv для каждой среды
+        :raises ImportError: Если NumPy не установлен
+        :raises ValueError: Если вид наблюдения неизвестен
+        """
+        if np is None:
+            raise ImportError("VectorEnv requires numpy")
+        self.num_envs = num_envs
+        spec = PlatformerEnv.observation_spec(env_kwargs.get("observation", "vector"),
+                                              env_kwargs.get("observation_size", (100, 60)))
+        workers = max(1, min(num_envs, workers or os.cpu_count() or 1))
+        self._buffer = shared_memory.SharedMemory(create=True, size=_vector_buffer_size(num_envs, spec))
+        self.observations, self.rewards, self.dones, self.actions = _vector_views(self._buffer.buf, num_envs, spec)
+        self._connections = []
+        self._processes = []
+        bounds = [num_envs * worker // workers for worker in range(workers + 1)]
+        for start, stop in zip(bounds, bounds[1:]):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_vector_worker, daemon=True,
+                                              args=(child, self._buffer.name, start, stop, num_envs, spec, env_kwargs))
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _command(self, command):
+        """
+        Отправляет команду всем процессам и ждёт их ответа
+
+        :param command: "reset" или "step"
+        :type command: str
+        """
+        for connection in self._connections:
+            connection.send(command)
+        for connection in self._connections:
+            connection.recv()
+
+    def reset(self):
+        """
+        Начинает новые эпизоды во всех средах
+
+        :returns: Наблюдения
+        """
+        self._command("reset")
+        return self.observations
+
+    def step(self, actions):
+        """
+        Выполняет по действию в каждой среде
+
+        :param actions: Последовательность num_envs номеров действий
+        :returns: Кортеж (наблюдения, награды, флаги завершения)
+        :rtype: tuple
+        """
+        self.actions[:] = actions
+        self._command("step")
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        """
+        Останавливает рабочие процессы и освобождает общую память
+        """
+        if self._buffer is None:
+            return
+        for connection in self._connections:
+            try:
+                connection.send("close")
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self.observations = self.rewards = self.dones = self.actions = None
+        try:
+            self._buffer.close()
+        except BufferError:
+            pass
+        self._buffer.unlink()
+        self._buffer = None
+
+
+class StaticLayer:
+    """Неподвижная геометрия уровня, запечённая в поверхности-колонки
+
+    Колонки шириной chunk_width строятся лениво при приближении камеры,
+    дальние колонки выгружаются, поэтому память ограничена max_chunks
+    колонками независимо от длины уровня.
+
+    :ivar chunk_width: Ширина колонки в пикселях
+    :type chunk_width: int
+    :ivar height: Высота колонки в пикселях
+    :type height: int
+    :ivar width: Правая граница запечённой геометрии
+    :type width: int
+    :ivar max_chunks: Максимальное количество колонок в памяти
+    :type max_chunks: int
+    :ivar chunks: Построенные колонки по номеру
+    :type chunks: collections.OrderedDict
+    :ivar built: Количество построений колонок
+    :type built: int
+    """
+
+    def __init__(self, sprites, chunk_width=1024, max_chunks=4, height=None):
+        """
+        Конструктор класса StaticLayer
+
+        :param sprites: Неподвижные спрайты уровня
+        :param chunk_width: Ширина колонки, по умолчанию 1024
+        :type chunk_width: int
+        :param max_chunks: Максимальное количество колонок в памяти, по умолчанию 4
+        :type max_chunks: int
+        :param height: Высота колонки, по умолчанию по нижней границе спрайтов
+        :type height: int
+        """
+        sprites = list(sprites)
+        self.chunk_width = chunk_width
+        self.max_chunks = max_chunks
+        if height is None:
+            height = max([LEVEL_HEIGHT] + [sprite.rect.bottom for sprite in sprites])
+        self.height = height
+        self.width = max([0] + [sprite.rect.right for sprite in sprites])
+        self.index = IntervalIndex(sprites, max_span=chunk_width)
+        self.chunks = OrderedDict()
+        self.built = 0
+
+    def chunk(self, number):
+        """
+        Возвращает колонку, строя её при первом обращении
+
+        :param number: Номер колонки
+        :type number: int
+        :returns: Поверхность колонки
+        :rtype: pygame.Surface
+        """
+        surface = self.chunks.get(number)
+        if surface is not None:
+            self.chunks.move_to_end(number)
+            return surface
+        left = number * self.chunk_width
+        surface = pygame.Surface((self.chunk_width, self.height), pygame.SRCALPHA)
+        for sprite in self.index.query(left, left + self.chunk_width):
+            surface.blit(sprite.image, (sprite.rect.x - left, sprite.rect.y))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        self.chunks[number] = surface
+        self.built += 1
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return surface
+
+    def blits(self, camera_x, camera_y, width):
+        """
+        Возвращает колонки, видимые камерой, и подготавливает соседнюю
+
+        За кадр строится не больше одной невидимой соседней колонки,
+        чтобы стоимость построения распределялась по кадрам.
+
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y
+        :type camera_y: int
+        :param width: Ширина экрана
+        :type width: int
+        :returns: Список пар (поверхность, позиция на экране)
+        :rtype: list
+        """
+        first = camera_x // self.chunk_width
+        last = (camera_x + width - 1) // self.chunk_width
+        result = [
+            (self.chunk(number), (number * self.chunk_width - camera_x, -camera_y))
+            for number in range(first, last + 1)
+        ]
+        if len(self.chunks) < self.max_chunks:
+            for number in (last + 1, first - 1):
+                if 0 <= number * self.chunk_width < self.width and number not in self.chunks:
+                    self.chunk(number)
+                    break
+        return result
+
+
+class TextCache:
+    """LRU-кэш отрисованного текста
+
+    :ivar max_size: Максимальное количество хранимых поверхностей
+    :type max_size: int
+    :ivar renders: Количество вызовов font.render
+    :type renders: int
+    :ivar hits: Количество попаданий в кэш
+    :type hits: int
+    """
+
+    def __init__(self, max_size=64):
+        """
+        Конструктор класса TextCache
+
+        :param max_size: Размер кэша, по умолчанию 64
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+
+    def render(self, font, text, antialias, color):
+        """
+        Возвращает поверхность с текстом, отрисовывая её только при промахе
+
+        :param font: Шрифт
+        :type font: pygame.font.Font
+        :param text: Строка
+        :type text: str
+        :param antialias: Сглаживание
+        :type antialias: bool
+        :param color: Цвет текста
+        :type color: tuple
+        :returns: Поверхность с текстом
+        :rtype: pygame.Surface
+        """
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        surface = font.render(text, antialias, color)
+        self.renders += 1
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class HUD:
+    """Интерфейс поверх игрового поля: жизни, счёт, управление и сообщения
+
+    Надписи с жизнями и счётом перерисовываются только при изменении значений.
+
+    :ivar font: Основной шрифт
+    :type font: pygame.font.Font
+    :ivar small_font: Шрифт подсказки управления
+    :type small_font: pygame.font.Font
+    :ivar text_cache: Кэш отрисованного текста
+    :type text_cache: TextCache
+    """
+
+    CONTROLS = "Управление: <- ->/A D - движение, W/Пробел - прыжок"
+    WIN = "УРОВЕНЬ ПРОЙДЕН! Нажмите R для перезапуска"
+    LOSE = "ВЫ ПРОИГРАЛИ! Нажмите R для перезапуска"
+
+    def __init__(self, font, small_font, text_cache=None):
+        """
+        Конструктор класса HUD
+
+        :param font: Основной шрифт
+        :type font: pygame.font.Font
+        :param small_font: Шрифт подсказки управления
+        :type small_font: pygame.font.Font
+        :param text_cache: Кэш текста, по умолчанию создаётся новый
+        :type text_cache: TextCache
+        """
+        self.font = font
+        self.small_font = small_font
+        self.text_cache = text_cache if text_cache is not None else TextCache()
+        self._lives = None
+        self._score = None
+        self._lives_text = None
+        self._score_text = None
+
+    def state(self, player, game_won=False, game_over=False):
+        """
+        Возвращает значения, от которых зависит изображение интерфейса
+
+        :param player: Объект игрока
+        :type player: Player
+        :param game_won: Уровень пройден
+        :type game_won: bool
+        :param game_over: Игра проиграна
+        :type game_over: bool
+        :returns: Кортеж (жизни, счёт, победа, поражение)
+        :rtype: tuple
+        """
+        return player.lives, player.score, game_won, game_over
+
+    def layout(self, screen, player, game_won=False, game_over=False):
+        """
+        Подготавливает надписи интерфейса и их позиции на экране
+
+        :param screen: Поверхность для отрисовки
+        :type screen: pygame.Surface
+        :param player: Объект игрока
+        :type player: Player
+        :param game_won: Уровень пройден
+        :type game_won: bool
+        :param game_over: Игра проиграна
+        :type game_over: bool
+        :returns: Список пар (поверхность, прямоугольник на экране)
+        :rtype: list
+        """
+        cache = self.text_cache
+        if player.lives != self._lives:
+            self._lives = player.lives
+            self._lives_text = cache.render(self.font, f"Жизни: {player.lives}", True, (255, 255, 255))
+        if player.score != self._score:
+            self._score = player.score
+            self._score_text = cache.render(self.font, f"Счёт: {player.score}", True, (255, 255, 255))
+        controls_text = cache.render(self.small_font, self.CONTROLS, True, (255, 255, 255))
+        items = [
+            (self._lives_text, self._lives_text.get_rect(topleft=(10, 10))),
+            (self._score_text, self._score_text.get_rect(topleft=(10, 50))),
+            (controls_text, controls_text.get_rect(topright=(screen.get_width() - 10, 10))),
+        ]
+        if game_won:
+            items.append(self._banner(screen, cache.render(self.font, self.WIN, True, (50, 255, 50))))
+        if game_over:
+            items.append(self._banner(screen, cache.render(self.font, self.LOSE, True, (255, 50, 50))))
+        return items
+
+    def draw(self, screen, player, game_won=False, game_over=False):
+        """
+        Рисует интерфейс на экране
+
+        :param screen: Поверхность для отрисовки
+        :type screen: pygame.Surface
+        :param player: Объект игрока
+        :type player: Player
+        :param game_won: Уровень пройден
+        :type game_won: bool
+        :param game_over: Игра проиграна
+        :type game_over: bool
+        :returns: Прямоугольники экрана, на которых нарисован интерфейс
+        :rtype: list
+        """
+        items = self.layout(screen, player, game_won, game_over)
+        for text, rect in items:
+            screen.blit(text, rect)
+        return [rect for text, rect in items]
+
+    @staticmethod
+    def _banner(screen, text):
+        """
+        Располагает сообщение по центру экрана
+
+        :param screen: Поверхность для отрисовки
+        :type screen: pygame.Surface
+        :param text: Поверхность с текстом сообщения
+        :type text: pygame.Surface
+        :returns: Пара (поверхность, прямоугольник на экране)
+        :rtype: tuple
+        """
+        rect = text.get_rect(topleft=(screen.get_width() // 2 - text.get_width() // 2, screen.get_height() // 2 - 50))
+        return text, rect
+
+
+class SwarmBullet(namedtuple("SwarmBullet", ("image", "rect", "vel_x", "vel_y"), defaults=(0.0, 0.0))):
+    """Снимок пули из BulletSwarm для отрисовки наравне со спрайтами
+
+    :ivar image: Изображение пули
+    :type image: pygame.Surface
+    :ivar rect: Прямоугольник пули в координатах уровня
+    :type rect: pygame.Rect
+    :ivar vel_x: Скорость по оси X для интерполяции
+    :type vel_x: float
+    :ivar vel_y: Скорость по оси Y для интерполяции
+    :type vel_y: float
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+
+class RenderQueue:
+    """Очередь отрисовки кадра с явными слоями
+
+    Объекты кадра ставятся в очередь парой (изображение, позиция) со
+    слоем, а flush выводит каждый слой одним вызовом Surface.blits в
+    порядке возрастания номера слоя. При sort элементы слоя упорядочиваются
+    по изображению, чтобы одинаковые поверхности шли подряд; для программной
+    отрисовки SDL это не даёт выигрыша, поэтому по умолчанию выключено.
+
+    Очередь не очищается при выводе: в режиме грязных прямоугольников один
+    и тот же кадр выводится в несколько областей экрана.
+
+    :ivar sort: Упорядочивать элементы слоя по изображению
+    :type sort: bool
+    :ivar draw_calls: Количество вызовов blit и blits с последнего clear
+    :type draw_calls: int
+    :ivar blitted: Количество выведенных изображений с последнего clear
+    :type blitted: int
+    """
+
+    def __init__(self, sort=False):
+        """
+        Конструктор класса RenderQueue
+
+        :param sort: Упорядочивать элементы слоя по изображению, по умолчанию False
+        :type sort: bool
+        """
+        self.sort = sort
+        self.draw_calls = 0
+        self.blitted = 0
+        self._layers = {}
+        self._sorted = True
+
+    def __len__(self):
+        return sum(len(items) for items in self._layers.values())
+
+    def clear(self):
+        """
+        Очищает очередь и счётчики перед новым кадром
+        """
+        self._layers.clear()
+        self._sorted = True
+        self.draw_calls = 0
+        self.blitted = 0
+
+    def submit(self, image, position, layer=0):
+        """
+        Ставит изображение в очередь
+
+        :param image: Изображение
+        :type image: pygame.Surface
+        :param position: Прямоугольник на экране
+        :type position: pygame.Rect
+        :param layer: Номер слоя, меньшие рисуются раньше, по умолчанию 0
+        :type layer: int
+        """
+        items = self._layers.get(layer)
+        if items is None:
+            items = self._layers[layer] = []
+        items.append((image, position))
+        self._sorted = False
+
+    def extend(self, items, layer=0):
+        """
+        Ставит в очередь несколько изображений одного слоя
+
+        :param items: Пары (изображение, прямоугольник на экране)
+        :param layer: Номер слоя, по умолчанию 0
+        :type layer: int
+        """
+        queued = self._layers.get(layer)
+        if queued is None:
+            queued = self._layers[layer] = []
+        queued.extend(items)
+        self._sorted = False
+
+    def flush(self, surface, area=None):
+        """
+        Выводит очередь на поверхность по одному вызову blits на слой
+
+        :param surface: Поверхность для отрисовки
+        :type surface: pygame.Surface
+        :param area: Выводить только элементы, пересекающие эту область
+        :type area: pygame.Rect
+        """
+        if not self._sorted:
+            if self.sort:
+                for items in self._layers.values():
+                    items.sort(key=lambda item: id(item[0]))
+            self._sorted = True
+        for layer in sorted(self._layers):
+            items = self._layers[layer]
+            if area is not None:
+                items = [item for item in items if area.colliderect(item[1])]
+            if items:
+                surface.blits(items, doreturn=False)
+                self.draw_calls += 1
+                self.blitted += len(items)
+
+
+class Renderer:
+    """Отрисовывает видимую камерой часть уровня
+
+    Неподвижные объекты выбираются через IntervalIndex, пули через индекс
+    пуль группы турелей, поэтому стоимость кадра зависит от количества
+    объектов на экране, а не от длины уровня.
+
+    При bake_static платформы и шипы рисуются из колонок StaticLayer,
+    то есть не больше чем двумя-тремя блитами за кадр.
+
+    Объекты кадра выводятся через RenderQueue по слоям из LAYERS, поэтому
+    количество вызовов blits за кадр не зависит от количества объектов.
+
+    В режиме грязных прямоугольников (dirty) при неподвижной камере
+    перерисовываются и выводятся на дисплей только изменившиеся области,
+    при движении камеры выполняется полная перерисовка.
+
+    :ivar screen: Поверхность для отрисовки
+    :type screen: pygame.Surface
+    :ivar background: Фон экрана
+    :type background: pygame.Surface
+    :ivar hud: Интерфейс поверх игрового поля или None
+    :type hud: HUD
+    :ivar dirty: Включён режим грязных прямоугольников
+    :type dirty: bool
+    :ivar drawn: Количество объектов, отрисованных в последнем кадре
+    :type drawn: int
+    :ivar culled: Количество объектов, отброшенных в последнем кадре
+    :type culled: int
+    :ivar updated_rects: Области экрана для display.update или None для полного flip
+    :type updated_rects: list
+    :ivar bake_static: Рисовать платформы и шипы из запечённых колонок StaticLayer
+    :type bake_static: bool
+    :ivar static_layer: Запечённая неподвижная геометрия или None
+    :type static_layer: StaticLayer
+    :ivar profiler: Замеры этапов кадра или None
+    :type profiler: FrameProfiler
+    :ivar queue: Очередь отрисовки последнего кадра
+    :type queue: RenderQueue
+    """
+
+    LAYERS = ("static", "platforms", "spikes", "turrets", "bullets", "items", "checkpoint", "player")
+
+    def __init__(self, screen, background, hud=None, dirty=False, bake_static=False, chunk_width=1024):
+        """
+        Конструктор класса Renderer
+
+        :param screen: Поверхность для отрисовки
+        :type screen: pygame.Surface
+        :param background: Фон экрана
+        :type background: pygame.Surface
+        :param hud: Интерфейс поверх игрового поля, по умолчанию None
+        :type hud: HUD
+        :param dirty: Включить режим грязных прямоугольников, по умолчанию False
+        :type dirty: bool
+        :param bake_static: Запекать платформы и шипы в колонки, по умолчанию False
+        :type bake_static: bool
+        :param chunk_width: Ширина колонки запечённого слоя, по умолчанию 1024
+        :type chunk_width: int
+        """
+        self.screen = screen
+        self.background = background
+        self.hud = hud
+        self.dirty = dirty
+        self.bake_static = bake_static
+        self.chunk_width = chunk_width
+        self.static_layer = None
+        self.drawn = 0
+        self.culled = 0
+        self.updated_rects = None
+        self.layers = []
+        self.turrets = None
+        self.checkpoint = None
+        self._last_camera = None
+        self._last_frame = None
+        self._last_hud = None
+        self._hud_rects = []
+        self.profiler = None
+        self.queue = RenderQueue()
+
+    def set_level(self, platforms, spikes, turrets, collectibles, checkpoint, streamed=False):
+        """
+        Строит индексы отсечения для объектов уровня
+
+        Для уровня с секциями (streamed) состав групп меняется во время игры,
+        поэтому объекты выбираются из пространственных индексов самих групп,
+        а запекание неподвижной геометрии не используется.
+
+        :param platforms: Группа платформ
+        :param spikes: Группа шипов
+        :param turrets: Группа турелей
+        :param collectibles: Группа собираемых предметов
+        :param checkpoint: Финиш уровня
+        :type checkpoint: Checkpoint
+        :param streamed: Группы принадлежат LevelStream, по умолчанию False
+        :type streamed: bool
+        """
+        layer = self.LAYERS.index
+        if streamed:
+            self.static_layer = None
+            self.layers = [
+                (layer(name), None, group)
+                for name, group in (("platforms", platforms), ("spikes", spikes), ("turrets", turrets),
+                                    ("items", collectibles))
+            ]
+            self.turrets = turrets
+            self.checkpoint = checkpoint
+            self._last_frame = None
+            return
+        if self.bake_static:
+            self.static_layer = StaticLayer(list(platforms) + list(spikes), self.chunk_width)
+            self.layers = []
+        else:
+            self.static_layer = None
+            self.layers = [
+                (layer("platforms"), IntervalIndex(platforms), platforms),
+                (layer("spikes"), IntervalIndex(spikes), spikes),
+            ]
+        self.layers += [
+            (layer("turrets"), IntervalIndex(turrets), turrets),
+            (layer("items"), IntervalIndex(collectibles), collectibles),
+        ]
+        self.turrets = turrets
+        self.checkpoint = checkpoint
+        self._last_frame = None
+
+    def visible(self, camera_x, camera_y):
+        """
+        Выбирает объекты, попадающие в поле зрения камеры
+
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y
+        :type camera_y: int
+        :returns: Список видимых спрайтов в порядке отрисовки
+        :rtype: list
+        """
+        return [sprite for layer, sprites in self.visible_layers(camera_x, camera_y) for sprite in sprites]
+
+    def visible_layers(self, camera_x, camera_y):
+        """
+        Выбирает объекты, попадающие в поле зрения камеры, вместе с их слоями
+
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y
+        :type camera_y: int
+        :returns: Список пар (номер слоя из LAYERS, список спрайтов) в порядке отрисовки
+        :rtype: list
+        """
+        view = pygame.Rect(camera_x, camera_y, self.screen.get_width(), self.screen.get_height())
+        left, right = view.left, view.right
+        layers = []
+        drawn = 0
+        total = 0
+        for layer, index, group in self.layers:
+            total += len(group)
+            candidates = group.query(view) if index is None else index.query(left, right)
+            sprites = [sprite for sprite in candidates if sprite.alive() and view.colliderect(sprite.rect)]
+            layers.append((layer, sprites))
+            drawn += len(sprites)
+            if group is self.turrets:
+                if hasattr(group, "bullets_near"):
+                    bullets = group.bullets_near(view)
+                    total += len(group.bullet_grid)
+                else:
+                    bullets = [bullet for turret in group for bullet in turret.bullets]
+                    total += len(bullets)
+                sprites = [bullet for bullet in bullets if view.colliderect(bullet.rect)]
+                swarm = getattr(group, "swarm", None)
+                if swarm is not None:
+                    total += len(swarm)
+                    sprites.extend(SwarmBullet(*bullet) for bullet in swarm.visible(view, velocities=True))
+                layers.append((self.LAYERS.index("bullets"), sprites))
+                drawn += len(sprites)
+        if self.checkpoint is not None:
+            total += 1
+            if view.colliderect(self.checkpoint.rect):
+                layers.append((self.LAYERS.index("checkpoint"), [self.checkpoint]))
+                drawn += 1
+        self.drawn = drawn
+        self.culled = total - drawn
+        return layers
+
+    def draw(self, player, camera_x, camera_y, game_won=False, game_over=False, player_pos=None, alpha=1.0):
+        """
+        Рисует фон, видимые объекты уровня, игрока и интерфейс
+
+        Для интерполяции между тиками передаются положение игрока из
+        World.interpolate и доля тика alpha: пули рисуются смещёнными назад
+        по своей скорости на (1 - alpha) тика.
+
+        :param player: Объект игрока
+        :type player: Player
+        :param camera_x: Позиция камеры по X
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y
+        :type camera_y: int
+        :param game_won: Уровень пройден
+        :type game_won: bool
+        :param game_over: Игра проиграна
+        :type game_over: bool
+        :param player_pos: Левый верхний угол игрока на уровне, по умолчанию player.rect
+        :type player_pos: tuple
+        :param alpha: Доля тика, прошедшая после последнего шага мира, по умолчанию 1
+        :type alpha: float
+        """
+        queue = self.queue
+        queue.clear()
+        if self.static_layer is not None:
+            static = self.LAYERS.index("static")
+            for image, position in self.static_layer.blits(camera_x, camera_y, self.screen.get_width()):
+                queue.submit(image, image.get_rect(topleft=position), static)
+        frame = {}
+        for layer, sprites in self.visible_layers(camera_x, camera_y):
+            items = [(sprite.image, sprite.rect.move(-camera_x, -camera_y)) for sprite in sprites]
+            queue.extend(items, layer)
+            frame.update(zip(sprites, items))
+        if player_pos is None:
+            player_rect = player.rect.move(-camera_x, -camera_y)
+        else:
+            player_rect = player.rect.move(player_pos[0] - player.rect.x - camera_x,
+                                           player_pos[1] - player.rect.y - camera_y)
+        frame[player] = (player.image, player_rect)
+        queue.submit(player.image, player_rect, self.LAYERS.index("player"))
+        if alpha < 1:
+            lag = 1 - alpha
+            for sprite, (image, rect) in frame.items():
+                if isinstance(sprite, (Bullet, SwarmBullet)):
+                    rect.move_ip(-round(sprite.vel_x * lag), -round(sprite.vel_y * lag))
+        hud_state = self.hud.state(player, game_won, game_over) if self.hud is not None else None
+        camera = (camera_x, camera_y)
+        if not self.dirty or self._last_frame is None or camera != self._last_camera:
+            self._draw_full(frame, player, game_won, game_over)
+            self.updated_rects = None
+        else:
+            dirty = self._dirty_rects(frame)
+            self._mark("render")
+            if hud_state != self._last_hud:
+                dirty.extend(self._hud_rects)
+                self._hud_rects = [rect for text, rect in self.hud.layout(self.screen, player, game_won, game_over)]
+                dirty.extend(self._hud_rects)
+            self._mark("hud")
+            self.updated_rects = self._draw_dirty(frame, dirty, player, game_won, game_over)
+            self._mark("render")
+        self._last_frame = frame
+        self._last_camera = camera
+        self._last_hud = hud_state
+
+    def _draw_full(self, frame, player, game_won, game_over):
+        """
+        Полностью перерисовывает экран
+
+        :param frame: Словарь {спрайт: (изображение, прямоугольник на экране)}
+        :type frame: dict
+        """
+        screen = self.screen
+        screen.blit(self.background, (0, 0))
+        self.queue.flush(screen)
+        self._mark("render")
+        if self.hud is not None:
+            self._hud_rects = self.hud.draw(screen, player, game_won, game_over)
+        self._mark("hud")
+
+    def _dirty_rects(self, frame):
+        """
+        Находит области экрана, изменившиеся с прошлого кадра
+
+        :param frame: Словарь {спрайт: (изображение, прямоугольник на экране)}
+        :type frame: dict
+        :returns: Список изменившихся прямоугольников
+        :rtype: list
+        """
+        last = self._last_frame
+        dirty = []
+        for sprite, (image, rect) in frame.items():
+            old = last.get(sprite)
+            if old is None:
+                dirty.append(rect)
+            elif old[0] is not image or old[1] != rect:
+                dirty.append(rect)
+                dirty.append(old[1])
+        for sprite, (image, rect) in last.items():
+            if sprite not in frame:
+                dirty.append(rect)
+        return dirty
+
+    def _draw_dirty(self, frame, dirty, player, game_won, game_over):
+        """
+        Перерисовывает только изменившиеся области экрана
+
+        :param frame: Словарь {спрайт: (изображение, прямоугольник на экране)}
+        :type frame: dict
+        :param dirty: Изменившиеся прямоугольники
+        :type dirty: list
+        :returns: Прямоугольники для pygame.display.update
+        :rtype: list
+        """
+        screen = self.screen
+        bounds = screen.get_rect()
+        rects = [rect.clip(bounds) for rect in dirty]
+        rects = [rect for rect in rects if rect.width and rect.height]
+        for rect in rects:
+            screen.set_clip(rect)
+            screen.blit(self.background, rect, rect)
+            self.queue.flush(screen, rect)
+            if self.hud is not None:
+                self.hud.draw(screen, player, game_won, game_over)
+        screen.set_clip(None)
+        return rects
 
-class Spike(pygame.sprite.Sprite):
-    """Представляет опасное препятствие, наносящее урон при касании
+    def _mark(self, stage):
+        """
+        Отмечает окончание этапа кадра в профилировщике, если он задан
 
-    :ivar image: Графическое представление шипа
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    """
+        :param stage: Этап из FrameProfiler.STAGES
+        :type stage: str
+        """
+        if self.profiler is not None:
+            self.profiler.mark(stage)
 
-    def __init__(self, x, y, width=30, height=30):
+    def invalidate(self):
         """
-        Конструктор класса Spike
+        Требует полной перерисовки следующего кадра
+        """
+        self._last_frame = None
 
-        :param x: Координата X левого верхнего угла
-        :type x: int
-        :param y: Координата Y левого верхнего угла
-        :type y: int
-        :param width: Ширина шипа, по умолчанию 30
-        :type width: int
-        :param height: Высота шипа, по умолчанию 30
-        :type height: int
+    def present(self):
         """
-        super().__init__()
-        try:
-            self.original_image = pygame.image.load('pictures/spike.png').convert_alpha()
-            self.image = pygame.transform.scale(self.original_image, (width, height))
-        except FileNotFoundError:
-            self.image = pygame.Surface((width, height), pygame.SRCALPHA)
-            pygame.draw.polygon(self.image, (255, 50, 50), [(width // 2, 0), (0, height), (width, height)])
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+        Выводит кадр на дисплей целиком или только изменившимися областями
+        """
+        if self.updated_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.updated_rects)
 
 
-class Turret(pygame.sprite.Sprite):
-    """Представляет стреляющую турель с заданным направлением
+class ObservationRenderer:
+    """Отрисовка поля зрения камеры вне экрана в маленький массив NumPy
 
-    :ivar image: Графическое представление турели
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    :ivar direction: Направление стрельбы
-    :type direction: str
-    :ivar bullets: Список активных пуль
-    :type bullets: list
-    :ivar last_shot: Время последнего выстрела
-    :type last_shot: int
-    :ivar shoot_delay: Задержка между выстрелами в миллисекундах
-    :type shoot_delay: int
+    Поверхность создаётся через pygame.image.frombuffer поверх массива
+    NumPy, поэтому после render() кадр уже лежит в array: ни копирования,
+    ни блокировки поверхности, как у surfarray.pixels3d, не нужно. Массив
+    хранится в порядке (строка, столбец), как принято для изображений в
+    NumPy.
+
+    В режиме "pixels" спрайты рисуются заранее уменьшенными изображениями,
+    массив имеет форму (height, width, 3). В режиме "grid" каждый пиксель —
+    клетка семантической сетки с номером класса из CLASSES, массив имеет
+    форму (height, width).
+
+    :ivar width: Ширина наблюдения в пикселях или клетках
+    :type width: int
+    :ivar height: Высота наблюдения в пикселях или клетках
+    :type height: int
+    :ivar mode: Режим "pixels" или "grid"
+    :type mode: str
+    :ivar array: Кадр наблюдения
+    :ivar surface: Поверхность pygame, разделяющая память с array
+    :type surface: pygame.Surface
     """
 
-    def __init__(self, x, y, direction="right"):
+    CLASSES = {
+        "empty": 0,
+        "platform": 1,
+        "spike": 2,
+        "item": 3,
+        "turret": 4,
+        "checkpoint": 5,
+        "bullet": 6,
+        "player": 7,
+    }
+    PALETTE = [(0, 0, 0), (139, 69, 19), (200, 200, 200), (255, 215, 0),
+               (50, 255, 50), (0, 0, 255), (255, 50, 50), (50, 100, 255)]
+
+    def __init__(self, width=100, height=60, mode="pixels", view_width=SCREEN_WIDTH, view_height=SCREEN_HEIGHT,
+                 background=None):
         """
-        Конструктор класса Turret
+        Конструктор класса ObservationRenderer
 
-        :param x: Координата X левого верхнего угла
-        :type x: int
-        :param y: Координата Y левого верхнего угла
-        :type y: int
-        :param direction: Направление стрельбы ("left" или "right"), по умолчанию "right"
-        :type direction: str
+        :param width: Ширина наблюдения, по умолчанию 100
+        :type width: int
+        :param height: Высота наблюдения, по умолчанию 60
+        :type height: int
+        :param mode: "pixels" — уменьшенная картинка, "grid" — семантическая сетка
+        :type mode: str
+        :param view_width: Ширина поля зрения камеры в пикселях уровня
+        :type view_width: int
+        :param view_height: Высота поля зрения камеры в пикселях уровня
+        :type view_height: int
+        :param background: Фон для режима "pixels", по умолчанию серая заливка
+        :type background: pygame.Surface
+        :raises ImportError: Если NumPy не установлен
+        :raises ValueError: Если режим неизвестен
         """
-        super().__init__()
-        try:
-            self.image = pygame.transform.scale(pygame.image.load('pictures/turret.png').convert_alpha(), (70, 60))
-            self.base_image = self.image.copy()
-            if direction == "right":
-                self.base_image = pygame.transform.flip(self.base_image, True, False)
-        except FileNotFoundError:
-            self.base_image = pygame.Surface((70, 60), pygame.SRCALPHA)
-            self.base_image.fill((50, 255, 50))
-            self.image = self.base_image.copy()
+        if np is None:
+            raise ImportError("ObservationRenderer requires numpy")
+        if mode not in ("pixels", "grid"):
+            raise ValueError(f"unknown observation mode {mode!r}")
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.view_width = view_width
+        self.view_height = view_height
+        self.scale_x = width / view_width
+        self.scale_y = height / view_height
+        if mode == "pixels":
+            self.array = np.zeros((height, width, 3), dtype=np.uint8)
+            self.surface = pygame.image.frombuffer(self.array, (width, height), "RGB")
+            if background is None:
+                self.background = pygame.Surface((width, height))
+                self.background.fill((100, 100, 100))
+            else:
+                self.background = pygame.transform.smoothscale(background.convert(self.surface), (width, height))
+        else:
+            self.array = np.zeros((height, width), dtype=np.uint8)
+            self.surface = pygame.image.frombuffer(self.array, (width, height), "P")
+            self.surface.set_palette(self.PALETTE)
+            self.background = None
+        self._scaled = {}
 
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+    def _scaled_image(self, image):
+        """
+        Возвращает изображение, уменьшенное в масштабе наблюдения, из кэша
 
-        self.direction = direction
-        self.bullets = []
-        self.last_shot = 0
-        self.shoot_delay = 2000
+        :param image: Исходное изображение
+        :type image: pygame.Surface
+        :rtype: pygame.Surface
+        """
+        scaled = self._scaled.get(image)
+        if scaled is None:
+            width, height = image.get_size()
+            size = (max(1, round(width * self.scale_x)), max(1, round(height * self.scale_y)))
+            if image.get_bitsize() >= 24:
+                scaled = pygame.transform.smoothscale(image, size)
+            else:
+                scaled = pygame.transform.scale(image, size)
+            if len(self._scaled) >= 256:
+                self._scaled.clear()
+            self._scaled[image] = scaled
+        return scaled
 
-    def update(self, player, platforms=None):
+    def _target(self, rect, camera_x, camera_y):
         """
-        Обновляет состояние турели каждый кадр
+        Переводит прямоугольник уровня в прямоугольник наблюдения
 
-        :param player: Объект игрока
-        :type player: Player
-        :param platforms: Группа платформ для проверки коллизий пуль
-        :type platforms: list
+        :rtype: pygame.Rect
         """
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_shot > self.shoot_delay:
-            self.shoot()
-            self.last_shot = current_time
+        left = int((rect.left - camera_x) * self.scale_x)
+        top = int((rect.top - camera_y) * self.scale_y)
+        right = max(left + 1, int((rect.right - camera_x) * self.scale_x + 0.999))
+        bottom = max(top + 1, int((rect.bottom - camera_y) * self.scale_y + 0.999))
+        return pygame.Rect(left, top, right - left, bottom - top)
 
-        for bullet in self.bullets[:]:
-            collided = bullet.update(platforms)
-            if collided:
-                self.bullets.remove(bullet)
+    def visible(self, world, view):
+        """
+        Перечисляет видимые объекты мира с их классами в порядке отрисовки
 
-    def shoot(self):
+        :param world: Мир
+        :type world: World
+        :param view: Поле зрения в координатах уровня
+        :type view: pygame.Rect
+        :returns: Список пар (класс, объект с image и rect)
+        :rtype: list
         """
-        Производит выстрел из турели
+        layers = (("platform", world.platforms), ("spike", world.spikes), ("item", world.collectibles),
+                  ("turret", world.turrets))
+        visible = []
+        for kind, group in layers:
+            visible.extend((kind, sprite) for sprite in nearby(group, view) if view.colliderect(sprite.rect))
+        if view.colliderect(world.checkpoint.rect):
+            visible.append(("checkpoint", world.checkpoint))
+        turrets = world.turrets
+        if hasattr(turrets, "bullets_near"):
+            visible.extend(("bullet", bullet) for bullet in turrets.bullets_near(view) if view.colliderect(bullet.rect))
+        swarm = getattr(turrets, "swarm", None)
+        if swarm is not None:
+            visible.extend(("bullet", SwarmBullet(image, rect)) for image, rect in swarm.visible(view))
+        visible.append(("player", world.player))
+        return visible
+
+    def render(self, world, camera_x=None, camera_y=None):
         """
-        if self.direction == "right":
-            bullet = Bullet(self.rect.right, self.rect.centery, 5, 0)
+        Рисует поле зрения камеры в array
+
+        :param world: Мир
+        :type world: World
+        :param camera_x: Позиция камеры по X, по умолчанию world.camera_x
+        :type camera_x: int
+        :param camera_y: Позиция камеры по Y, по умолчанию world.camera_y
+        :type camera_y: int
+        :returns: Массив кадра (тот же объект при каждом вызове)
+        """
+        if camera_x is None:
+            camera_x = world.camera_x
+        if camera_y is None:
+            camera_y = world.camera_y
+        view = pygame.Rect(camera_x, camera_y, self.view_width, self.view_height)
+        surface = self.surface
+        if self.mode == "grid":
+            surface.fill(0)
+            classes = self.CLASSES
+            for kind, sprite in self.visible(world, view):
+                surface.fill(classes[kind], self._target(sprite.rect, camera_x, camera_y))
         else:
-            bullet = Bullet(self.rect.left, self.rect.centery, -5, 0)
-        self.bullets.append(bullet)
+            surface.blit(self.background, (0, 0))
+            for kind, sprite in self.visible(world, view):
+                surface.blit(self._scaled_image(sprite.image), self._target(sprite.rect, camera_x, camera_y))
+        return self.array
 
 
-class Bullet(pygame.sprite.Sprite):
-    """Представляет снаряд, выпущенный турелью
+class FrameProfiler:
+    """Замеры длительности этапов каждого кадра
 
-    :ivar image: Графическое представление пули
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    :ivar vel_x: Скорость по оси X
-    :type vel_x: int
-    :ivar vel_y: Скорость по оси Y
-    :type vel_y: int
+    Работает как секундомер с кругами: begin_frame запускает отсчёт, а
+    каждый mark(этап) относит время, прошедшее с предыдущей отметки, к
+    указанному этапу. Последние window кадров хранятся для скользящих
+    перцентилей, вся история при keep_history — для выгрузки в CSV или JSON.
+
+    :ivar window: Количество кадров для скользящих перцентилей
+    :type window: int
+    :ivar recent: Длительности этапов последних кадров в миллисекундах
+    :type recent: collections.deque
+    :ivar history: Длительности этапов всех кадров или None
+    :type history: list
     """
 
-    def __init__(self, x, y, vel_x, vel_y):
+    STAGES = ("input", "player", "turrets", "checkpoint", "camera", "render", "hud", "flip")
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=300, keep_history=False, clock=time.perf_counter):
         """
-        Конструктор класса Bullet
+        Конструктор класса FrameProfiler
 
-        :param x: Координата X центра пули
-        :type x: int
-        :param y: Координата Y центра пули
-        :type y: int
-        :param vel_x: Скорость по оси X
-        :type vel_x: int
-        :param vel_y: Скорость по оси Y
-        :type vel_y: int
+        :param window: Количество кадров для скользящих перцентилей, по умолчанию 300
+        :type window: int
+        :param keep_history: Хранить длительности всех кадров для выгрузки, по умолчанию False
+        :type keep_history: bool
+        :param clock: Функция текущего времени в секундах, по умолчанию time.perf_counter
+        :type clock: callable
         """
-        super().__init__()
-        try:
-            self.image = pygame.image.load('pictures/bullet.png').convert_alpha()
-            self.image = pygame.transform.scale(self.image, (15, 15))
-            if vel_x > 0:
-                self.image = pygame.transform.flip(self.image, True, False)
-        except FileNotFoundError:
-            self.image = pygame.Surface((10, 10))
-            self.image.fill((255, 50, 50))
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        self.vel_x = vel_x
-        self.vel_y = vel_y
+        self.window = window
+        self.recent = deque(maxlen=window)
+        self.history = [] if keep_history else None
+        self.clock = clock
+        self._index = {stage: index for index, stage in enumerate(self.STAGES)}
+        self._current = None
+        self._last = 0.0
+
+    def __len__(self):
+        return len(self.recent)
 
-    def update(self, platforms=None):
+    def begin_frame(self):
         """
-        Обновляет положение пули с проверкой коллизий
+        Начинает замер нового кадра
+        """
+        self._current = [0.0] * len(self.STAGES)
+        self._last = self.clock()
 
-        :param platforms: Группа платформ для проверки коллизий (опционально)
-        :return: True если пуля столкнулась с платформой, иначе False
+    def mark(self, stage):
         """
-        old_rect = self.rect.copy()
+        Относит время с предыдущей отметки к этапу; вне кадра ничего не делает
 
-        self.rect.x += self.vel_x
-        self.rect.y += self.vel_y
+        :param stage: Этап из STAGES
+        :type stage: str
+        """
+        if self._current is None:
+            return
+        now = self.clock()
+        self._current[self._index[stage]] += (now - self._last) * 1000
+        self._last = now
 
-        if platforms:
-            for platform in platforms:
-                if self.rect.colliderect(platform.rect):
-                    self.rect.x = old_rect.x
-                    if self.vel_x > 0:
-                        self.rect.right = platform.rect.left
-                    else:
-                        self.rect.left = platform.rect.right
-                    return True
+    def end_frame(self):
+        """
+        Завершает замер кадра
+        """
+        if self._current is None:
+            return
+        frame = tuple(self._current)
+        self.recent.append(frame)
+        if self.history is not None:
+            self.history.append(frame)
+        self._current = None
 
-        if self.rect.right < -50 or self.rect.left > LEVEL_WIDTH + 50:
-            return True
+    def percentiles(self, stage=None, points=PERCENTILES):
+        """
+        Скользящие перцентили длительности этапа по последним кадрам
 
-        return False
+        :param stage: Этап из STAGES или None для всего кадра
+        :type stage: str
+        :param points: Перцентили, по умолчанию (50, 95, 99)
+        :type points: tuple
+        :returns: Значения перцентилей в миллисекундах
+        :rtype: tuple
+        """
+        if stage is None:
+            values = sorted(sum(frame) for frame in self.recent)
+        else:
+            index = self._index[stage]
+            values = sorted(frame[index] for frame in self.recent)
+        if not values:
+            return tuple(0.0 for _ in points)
+        return tuple(values[max(0, -(-point * len(values) // 100) - 1)] for point in points)
 
+    def summary(self):
+        """
+        Скользящие перцентили всех этапов и всего кадра
 
-class Collectible(pygame.sprite.Sprite):
-    """Представляет бонус, который можно собрать для получения различных эффектов
-    :ivar image: Графическое представление предмета
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    :ivar type: Тип предмета ("life", "speed" или "immune")
-    :type type: str
-    """
+        :returns: Словарь {этап: перцентили}, всему кадру соответствует ключ "total"
+        :rtype: dict
+        """
+        result = {stage: self.percentiles(stage) for stage in self.STAGES}
+        result["total"] = self.percentiles()
+        return result
 
-    def __init__(self, x, y, type="life"):
+    def _frames(self):
         """
-        Конструктор класса Collectible
+        Кадры для выгрузки: вся история или последние window кадров
 
-        :param x: Координата X левого верхнего угла
-        :type x: int
-        :param y: Координата Y левого верхнего угла
-        :type y: int
-        :param type: Тип предмета ("life", "speed" или "immune"), по умолчанию "life"
-        :type type: str
+        :rtype: list
         """
-        super().__init__()
-        self.type = type
+        return self.history if self.history is not None else list(self.recent)
 
-        image_files = {
-            "life": "pictures/heart.png",
-            "speed": "pictures/speed.png",
-            "immune": "pictures/immune.png"
-        }
+    def export_csv(self, path):
+        """
+        Выгружает длительности этапов по кадрам в CSV
 
-        try:
-            filename = image_files[type]
-            self.image = pygame.image.load(filename).convert_alpha()
-            self.image = pygame.transform.scale(self.image, (30, 30))
+        :param path: Путь к файлу
+        :type path: str
+        """
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(("frame",) + self.STAGES + ("total",))
+            for number, frame in enumerate(self._frames()):
+                writer.writerow((number,) + tuple(f"{value:.4f}" for value in frame) + (f"{sum(frame):.4f}",))
 
-        except FileNotFoundError:
-            self.image = pygame.Surface((20, 20), pygame.SRCALPHA)
-            if type == "life":
-                self.image.fill((255, 50, 50))
-            elif type == "speed":
-                self.image.fill((255, 255, 0))
-            elif type == "immune":
-                self.image.fill((120, 120, 120))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
+    def export_json(self, path):
+        """
+        Выгружает длительности этапов по кадрам и сводку перцентилей в JSON
 
-    def apply_effect(self, player):
+        :param path: Путь к файлу
+        :type path: str
         """
-        Применяет эффект предмета к игроку
+        data = {
+            "stages": list(self.STAGES),
+            "frames": [[round(value, 4) for value in frame] for frame in self._frames()],
+            "percentiles": {stage: {f"p{point}": value for point, value in zip(self.PERCENTILES, values)}
+                            for stage, values in self.summary().items()},
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
 
-        :param player: Объект игрока, к которому применяется эффект
-        :type player: Player
+    def export(self, path):
         """
-        if self.type == "life":
-            player.lives += 1
-        elif self.type == "speed":
-            player.speed_boost = 3
-            player.speed_boost_time = pygame.time.get_ticks() + 5000
-        elif self.type == "immune":
-            player.immune = True
-            player.immune_time = pygame.time.get_ticks() + 3000
+        Выгружает замеры в CSV или JSON в зависимости от расширения файла
 
+        :param path: Путь к файлу (.csv или .json)
+        :type path: str
+        """
+        if path.endswith(".json"):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
 
-class Checkpoint(pygame.sprite.Sprite):
-    """Представляет цель уровня, достижение которой означает победу
-    :ivar image: Графическое представление флага
-    :type image: pygame.Surface
-    :ivar rect: Прямоугольник для коллизий и позиционирования
-    :type rect: pygame.Rect
-    :ivar active: Флаг активности точки сохранения
-    :type active: bool
+
+class ProfilerOverlay:
+    """Панель поверх игры со скользящими перцентилями этапов кадра
+
+    Текст панели перерисовывается раз в refresh кадров, в остальных кадрах
+    выводится готовая поверхность. Панель не уменьшается, поэтому всегда
+    закрывает свой прошлый кадр и не оставляет следов в режиме грязных
+    прямоугольников.
+
+    :ivar profiler: Источник замеров
+    :type profiler: FrameProfiler
+    :ivar refresh: Период обновления текста в кадрах
+    :type refresh: int
+    :ivar queue: Очередь отрисовки, счётчики которой выводятся на панели, или None
+    :type queue: RenderQueue
     """
 
-    def __init__(self, x, y):
+    def __init__(self, profiler, font, refresh=15, position=(10, 130), queue=None):
         """
-        Конструктор класса Checkpoint
+        Конструктор класса ProfilerOverlay
 
-        :param x: Координата X левого верхнего угла
-        :type x: int
-        :param y: Координата Y левого верхнего угла
-        :type y: int
+        :param profiler: Источник замеров
+        :type profiler: FrameProfiler
+        :param font: Шрифт панели
+        :type font: pygame.font.Font
+        :param refresh: Период обновления текста в кадрах, по умолчанию 15
+        :type refresh: int
+        :param position: Левый верхний угол панели на экране
+        :type position: tuple
+        :param queue: Очередь отрисовки для счётчиков вызовов, по умолчанию None
+        :type queue: RenderQueue
         """
-        super().__init__()
-        try:
-            self.image = pygame.image.load('pictures/finish.png').convert_alpha()
-            self.image = pygame.transform.scale(self.image, (60, 80))
-        except FileNotFoundError:
-            self.image = pygame.Surface((40, 60))
-            self.image.fill((50, 255, 50))
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.active = True
+        self.profiler = profiler
+        self.queue = queue
+        self.font = font
+        self.refresh = refresh
+        self.position = position
+        self.surface = None
+        self._frames = 0
 
-    def update(self, player):
+    def lines(self):
         """
-        Проверяет, достиг ли игрок точки сохранения
+        Строки панели: заголовок, перцентили p50/p95/p99 каждого этапа в миллисекундах
+        и счётчики очереди отрисовки последнего кадра
 
-        :param player: Объект игрока
-        :type player: Player
-        :returns: True если игрок достиг точки сохранения, иначе False
-        :rtype: bool
+        :rtype: list
         """
-        if self.active and player.rect.colliderect(self.rect):
-            self.active = False
-            return True
-        return False
-
-
-def create_level():
-    """
-    Создает и настраивает игровой уровень
-
-    :returns: Кортеж объектов уровня (platforms, spikes, turrets, collectibles, checkpoint)
-    :rtype: tuple
-    """
-    platforms = pygame.sprite.Group()
-    spikes = pygame.sprite.Group()
-    turrets = pygame.sprite.Group()
-    collectibles = pygame.sprite.Group()
-
-    platforms.add(Platform(0, LEVEL_HEIGHT - 40, LEVEL_WIDTH, 40))
-    horizontal_platforms = [
-        (200, 700, 200, 30),
-        (600, 650, 180, 25),
-        (1000, 600, 160, 20),
-        (1400, 650, 200, 30),
-        (1800, 600, 180, 25),
-        (2200, 550, 150, 25),
-        (2600, 400, 200, 30),
-        (3000, 350, 180, 25),
-        (3400, 400, 160, 20),
-        (3800, 350, 200, 30),
-        (3500, 300, 180, 25),
-        (3900, 250, 150, 25),
-    ]
-
-    for x, y, width, height in horizontal_platforms:
-        platforms.add(Platform(x, y, width, height))
+        summary = self.profiler.summary()
+        lines = ["stage        p50    p95    p99"]
+        for stage, (p50, p95, p99) in summary.items():
+            lines.append(f"{stage:<10} {p50:6.2f} {p95:6.2f} {p99:6.2f}")
+        if self.queue is not None:
+            lines.append(f"draw calls {self.queue.draw_calls}, blits {self.queue.blitted}")
+        return lines
 
-    vertical_platforms = [
-        (500, 600, 30, 150),
-        (1500, 550, 25, 120),
-        (2500, 450, 35, 180),
-        (3500, 370, 30, 150),
-        (800, 620, 20, 100),
-        (1700, 590, 25, 90),
-        (2800, 370, 30, 130),
-    ]
-
-    for x, y, width, height in vertical_platforms:
-        platforms.add(VerticalPlatform(x, y, width, height))
+    def _render(self):
+        """
+        Рисует панель на новой непрозрачной поверхности
+        """
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in self.lines()]
+        height = self.font.get_linesize()
+        width = max(surface.get_width() for surface in rendered) + 10
+        if self.surface is not None:
+            width = max(width, self.surface.get_width())
+        self.surface = pygame.Surface((width, height * len(rendered) + 10))
+        self.surface.fill((0, 0, 0))
+        for row, surface in enumerate(rendered):
+            self.surface.blit(surface, (5, 5 + row * height))
 
-    spikes_data = [
-        (425, LEVEL_HEIGHT - 90, 50, 50),
-        (1200, LEVEL_HEIGHT - 70, 30, 30),
-        (2000, LEVEL_HEIGHT - 70, 30, 30),
-        (2200, 520, 30, 30),
-        (3150, 300, 50, 50),
-        (3900, 200, 50, 50),
-    ]
+    def draw(self, screen):
+        """
+        Рисует панель на экране
 
-    for x, y, width, height in spikes_data:
-        spikes.add(Spike(x, y, width, height))
+        :param screen: Поверхность для отрисовки
+        :type screen: pygame.Surface
+        :returns: Занятая панелью область экрана
+        :rtype: pygame.Rect
+        """
+        if self.surface is None or self._frames % self.refresh == 0:
+            self._render()
+        self._frames += 1
+        return screen.blit(self.surface, self.position)
 
-    turrets_data = [
-        (980, 550, "left"),
-        (1900, 550, "left"),
-        (3500, 250, "left"),
-    ]
-
-    for x, y, direction in turrets_data:
-        turrets.add(Turret(x, y, direction))
-
-    items_data = [
-        (700, 600, "speed"),
-        (1300, 600, "immune"),
-        (1600, 550, "life"),
-        (2100, 500, "speed"),
-        (2650, 350, "life"),
-        (3100, 300, "speed"),
-        (3450, 350, "immune"),
-        (3600, 250, "life"),
-        (3950, 200, "speed"),
-        (2750, 320, "immune"),
-    ]
-
-    for x, y, item_type in items_data:
-        collectibles.add(Collectible(x, y, item_type))
 
-    checkpoint = Checkpoint(3950, 200)
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки
 
-    return platforms, spikes, turrets, collectibles, checkpoint
+    :param argv: Список аргументов, по умолчанию sys.argv[1:]
+    :type argv: list
+    :returns: Разобранные аргументы
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description="Platformer")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="обновлять на дисплее только изменившиеся области экрана")
+    parser.add_argument("--bake-static", action="store_true",
+                        help="рисовать платформы и шипы из заранее запечённых колонок")
+    parser.add_argument("--bullet-swarm", action="store_true",
+                        help="хранить пули в пуле массивов NumPy")
+    parser.add_argument("--level", metavar="PATH",
+                        help="загрузить уровень из JSON-файла или скомпилированного файла")
+    parser.add_argument("--tile-collision", action="store_true",
+                        help="отсекать проверки столкновений растровой картой платформ (клетки 8 пикселей)")
+    parser.add_argument("--checkpoints", action="store_true",
+                        help=f"сохранять контрольную точку каждые {World.CHECKPOINT_DISTANCE} пикселей пути: "
+                             "после падения игрок возвращается на неё, после проигрыша C продолжает с неё")
+    parser.add_argument("--stream", action="store_true",
+                        help="создавать объекты уровня по секциям рядом с камерой")
+    parser.add_argument("--record", metavar="PATH",
+                        help="записать управление первого прохождения в файл")
+    parser.add_argument("--replay", nargs="+", metavar="PATH",
+                        help="без окна прогнать записи и проверить контрольные суммы")
+    parser.add_argument("--profile", action="store_true",
+                        help="показать панель замеров этапов кадра (переключается клавишей F3)")
+    parser.add_argument("--profile-export", metavar="PATH",
+                        help="при выходе выгрузить замеры всех кадров в CSV или JSON")
+    parser.add_argument("--physics-rate", type=int, default=60, metavar="HZ",
+                        help="частота тиков симуляции (по умолчанию 60; скорость игры от неё не зависит)")
+    parser.add_argument("--max-fps", type=int, metavar="FPS",
+                        help="ограничение частоты кадров отрисовки, 0 — без ограничения "
+                             "(по умолчанию равно частоте тиков)")
+    parser.add_argument("--vsync", action="store_true",
+                        help="синхронизировать вывод кадров с частотой обновления дисплея")
+    parser.add_argument("--compile-level", nargs=2, metavar=("JSON", "OUTPUT"),
+                        help="скомпилировать JSON-уровень в двоичный файл и выйти")
+    parser.add_argument("--build-atlas", action="store_true",
+                        help=f"упаковать изображения в атлас {ATLAS_MANIFEST} и выйти")
+    return parser.parse_args(argv)
 
 
-def main():
+def main(argv=None):
     """
     Главная функция игры
+
+    :param argv: Аргументы командной строки, по умолчанию sys.argv[1:]
+    :type argv: list
+    :returns: Код завершения: 1, если хотя бы одна запись разошлась с контрольной суммой
+    :rtype: int
     """
+    args = parse_args(argv)
+    if args.compile_level:
+        source, output = args.compile_level
+        compile_level(read_level_json(source), output)
+        return 0
+    if args.build_atlas:
+        pack_atlas()
+        return 0
+    if args.replay:
+        return run_replays(args.replay)
     pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    screen = None
+    if args.vsync:
+        try:
+            screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED, vsync=1)
+        except pygame.error:
+            screen = None
+    if screen is None:
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Platformer")
     clock = pygame.time.Clock()
+    assets.preload()
     try:
-        bg_tile = pygame.image.load('pictures/background.png').convert()
+        bg_tile = assets.get('pictures/background.png', convert="opaque")
         tile_width, tile_height = bg_tile.get_size()
         bg_image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         for x in range(0, SCREEN_WIDTH, tile_width):
@@ -617,77 +5373,97 @@ def main():
     except FileNotFoundError:
         bg_image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         bg_image.fill((100, 100, 100))
-    platforms, spikes, turrets, collectibles, checkpoint = create_level()
-    player = Player(100, 100)
-    camera_x = 0
-    camera_y = 0
-    font = pygame.font.SysFont(None, 36)
-    small_font = pygame.font.SysFont(None, 24)
-    game_over = False
-    game_won = False
+    world = World(make_level_factory(args.level, args.stream), tick_rate=args.physics_rate,
+                  bullet_swarm=args.bullet_swarm, tile_collision=args.tile_collision, checkpoints=args.checkpoints)
+    max_fps = world.tick_rate if args.max_fps is None else args.max_fps
+    fixed_step = FixedStep(world.tick_rate)
+    recording = None
+    if args.record:
+        flags = ((RECORDING_SWARM if args.bullet_swarm else 0) | (RECORDING_STREAM if args.stream else 0)
+                 | (RECORDING_TILES if args.tile_collision else 0)
+                 | (RECORDING_CHECKPOINTS if args.checkpoints else 0))
+        recording = Recording(world.tick_rate, args.level or "", flags)
+    recording_done = False
+    hud = HUD(pygame.font.SysFont(None, 36), pygame.font.SysFont(None, 24))
+    renderer = Renderer(screen, bg_image, hud, dirty=args.dirty_rects, bake_static=args.bake_static)
+    renderer.set_level(*world.level, streamed=world.stream is not None)
+    profiler = FrameProfiler(keep_history=bool(args.profile_export))
+    world.profiler = renderer.profiler = profiler
+    overlay = ProfilerOverlay(profiler, pygame.font.SysFont(None, 22), queue=renderer.queue)
+    show_overlay = args.profile
     running = True
+    last_frame = time.perf_counter()
     while running:
+        frame_start = time.perf_counter()
+        elapsed = frame_start - last_frame
+        last_frame = frame_start
+        profiler.begin_frame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
-                if (game_over or game_won) and event.key == pygame.K_r:
-                    platforms, spikes, turrets, collectibles, checkpoint = create_level()
-                    player = Player(100, 100)
-                    game_over = False
-                    game_won = False
-                    camera_x = 0
-                    camera_y = 0
-
-        if not game_over and not game_won:
-            player.update(platforms, spikes, turrets, collectibles, SCREEN_WIDTH, SCREEN_HEIGHT, camera_x, camera_y)
-            for turret in turrets:
-                turret.update(player, platforms)
-            if checkpoint.update(player):
-                game_won = True
-            if player.lives <= 0:
-                game_over = True
-            camera_x = player.rect.centerx - SCREEN_WIDTH // 2
-            camera_y = player.rect.centery - SCREEN_HEIGHT // 2
-            if camera_x < 0:
-                camera_x = 0
-            if camera_x > LEVEL_WIDTH - SCREEN_WIDTH:
-                camera_x = LEVEL_WIDTH - SCREEN_WIDTH
-            if camera_y < 0:
-                camera_y = 0
-            if camera_y > LEVEL_HEIGHT - SCREEN_HEIGHT:
-                camera_y = LEVEL_HEIGHT - SCREEN_HEIGHT
-        screen.blit(bg_image, (0, 0))
-        for platform in platforms:
-            screen.blit(platform.image, (platform.rect.x - camera_x, platform.rect.y - camera_y))
-        for spike in spikes:
-            screen.blit(spike.image, (spike.rect.x - camera_x, spike.rect.y - camera_y))
-        for turret in turrets:
-            screen.blit(turret.image, (turret.rect.x - camera_x, turret.rect.y - camera_y))
-            for bullet in turret.bullets:
-                screen.blit(bullet.image, (bullet.rect.x - camera_x, bullet.rect.y - camera_y))
-        for collectible in collectibles:
-            screen.blit(collectible.image, (collectible.rect.x - camera_x, collectible.rect.y - camera_y))
-        screen.blit(checkpoint.image, (checkpoint.rect.x - camera_x, checkpoint.rect.y - camera_y))
-        screen.blit(player.image, (player.rect.x - camera_x, player.rect.y - camera_y))
-        lives_text = font.render(f"Жизни: {player.lives}", True, (255, 255, 255))
-        screen.blit(lives_text, (10, 10))
-        score_text = font.render(f"Счёт: {player.score}", True, (255, 255, 255))
-        screen.blit(score_text, (10, 50))
-        controls_text = small_font.render("Управление: <- ->/A D - движение, W/Пробел - прыжок", True, (255, 255, 255))
-        screen.blit(controls_text, (SCREEN_WIDTH - controls_text.get_width() - 10, 10))
-        if game_won:
-            win_text = font.render("УРОВЕНЬ ПРОЙДЕН! Нажмите R для перезапуска", True, (50, 255, 50))
-            screen.blit(win_text, (SCREEN_WIDTH // 2 - win_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-        if game_over:
-            lose_text = font.render("ВЫ ПРОИГРАЛИ! Нажмите R для перезапуска", True, (255, 50, 50))
-            screen.blit(lose_text, (SCREEN_WIDTH // 2 - lose_text.get_width() // 2, SCREEN_HEIGHT // 2 - 50))
-        pygame.display.flip()
-        clock.tick(60)
+                if event.key == pygame.K_F3:
+                    show_overlay = not show_overlay
+                    renderer.invalidate()
+                if world.finished and event.key == pygame.K_r:
+                    world.restart()
+                    renderer.invalidate()
+                if world.game_over and world.saved is not None and event.key == pygame.K_c:
+                    world.respawn()
+                    renderer.invalidate()
+
+        controls = InputState.from_keys(pygame.key.get_pressed())
+        profiler.mark("input")
+        for _ in range(fixed_step.advance(elapsed)):
+            if recording is not None and not recording_done:
+                recording.append(controls)
+            world.step(controls)
+            if recording is not None and world.finished and not recording_done:
+                recording.finish(world)
+                recording_done = True
+        alpha = fixed_step.alpha
+        player_x, player_y, camera_x, camera_y = world.interpolate(alpha)
+        renderer.draw(world.player, camera_x, camera_y, world.game_won, world.game_over,
+                      player_pos=(player_x, player_y), alpha=alpha)
+        if show_overlay:
+            overlay_rect = overlay.draw(screen)
+            if renderer.updated_rects is not None:
+                renderer.updated_rects.append(overlay_rect)
+            profiler.mark("hud")
+        renderer.present()
+        profiler.mark("flip")
+        profiler.end_frame()
+        clock.tick(max_fps)
+    if recording is not None:
+        if not recording_done:
+            recording.finish(world)
+        recording.save(args.record)
+    if args.profile_export:
+        profiler.export(args.profile_export)
     pygame.quit()
+    return 0
+
+
+def run_replays(paths):
+    """
+    Прогоняет записи без окна и печатает результат проверки каждой
+
+    :param paths: Пути к файлам записей
+    :type paths: list
+    :returns: 0, если все контрольные суммы совпали, иначе 1
+    :rtype: int
+    """
+    failed = 0
+    for path in paths:
+        recording = Recording.load(path)
+        world, matched = replay(recording)
+        print(f"{path}: {'ok' if matched else 'MISMATCH'} ({len(recording)} ticks, "
+              f"checksum {world.checksum():08x}, expected {recording.checksum:08x})")
+        failed += not matched
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
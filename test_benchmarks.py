@@ -0,0 +1,107 @@
+import pytest
+
+from benchmarks import (
+    bench_assets, bench_bullet_pool, bench_collision, bench_hazards, bench_level_load, bench_observation,
+    bench_player_frames, bench_render_queue, bench_replay, bench_scaling, bench_snapshot, bench_vector_env,
+    load_baseline, print_table, save_baseline,
+)
+from platformer import assets
+
+
+@pytest.fixture(autouse=True)
+def clear_assets():
+    yield
+    assets.clear()
+
+
+def test_bench_player_frames_no_allocations_after():
+    results = bench_player_frames(frames=20)
+    after = [row for row in results if row[0] == "after"]
+    before = [row for row in results if row[0] == "before"]
+    assert all(row[2] == 0 for row in after)
+    assert all(row[2] >= 1 for row in before)
+
+
+def test_bench_bullet_pool_reuses_bullets():
+    results = {row[0]: row for row in bench_bullet_pool(bullets=200, turrets=4)}
+    assert results["no pool"][1] == 200
+    assert results["pool"][1] < 200
+
+
+def test_bench_level_load_runs():
+    results = bench_level_load(sizes=(50,))
+    assert results[0][0] == 50
+    assert all(value >= 0 for value in results[0][1:])
+
+
+def test_bench_replay_matches_checksums():
+    sessions, ticks, matched = bench_replay(sessions=2, ticks=120)[0][:3]
+    assert (sessions, ticks, matched) == (2, 240, 2)
+
+
+def test_bench_scaling_reports_every_size():
+    results = bench_scaling(sizes=(100, 300), ticks=20)
+    assert [row[0] for row in results] == [100, 300]
+    for row in results:
+        ticks_per_second, p50, p95, p99, worst = row[1:6]
+        assert ticks_per_second > 0 and p50 <= p95 <= p99 <= worst
+        assert row[-1] > 0
+
+
+def test_baseline_round_trip_and_diff(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    save_baseline(path, {"replay": [(2, 240, 2, 100.0, 5.0)]})
+    save_baseline(path, {"scaling": [(100, 50.0, 1.0, 1.0, 1.0, 1.0, 0.1, 0.5)]})
+    baseline = load_baseline(path)
+    assert set(baseline) == {"replay", "scaling"}
+    print_table("replay", ("a", "b", "c", "d", "e"), [(2, 240, 2, 110.0, 5.0)], baseline["replay"])
+    output = capsys.readouterr().out
+    assert "110.00 (+10.0%)" in output
+    assert "5.00 (+0.0%)" in output
+
+
+def test_bench_vector_env_runs():
+    pytest.importorskip("numpy")
+    results = {row[0]: row for row in bench_vector_env(num_envs=2, steps=20, workers=2)}
+    assert results["vector"][1:3] == (2, 2)
+    assert results["single"][3] > 0 and results["vector"][3] > 0
+
+
+def test_bench_observation_reports_every_mode():
+    results = {row[0]: row for row in bench_observation(ticks=5)}
+    assert results["full"][1:4] == (1000, 600, 1800000)
+    assert results["pixels"][1:4] == (100, 60, 18000)
+    assert results["grid"][1:4] == (50, 30, 1500)
+
+
+def test_bench_assets_decodes_atlas_once():
+    results = {row[0]: row for row in bench_assets(size=200, repeats=1)}
+    assert results["files"][1] == 11 and results["atlas"][1] == 2
+    assert results["atlas"][3] == results["files"][3]
+    assert results["atlas"][4] < results["files"][4]
+
+
+def test_bench_render_queue_uses_one_call_per_layer():
+    results = bench_render_queue(counts=(50,), frames=2)
+    assert [row[1] for row in results] == ["blit", "queue", "queue sorted"]
+    assert results[0][2] == 50
+    assert all(row[2] <= 4 for row in results[1:])
+
+
+def test_bench_hazards_reports_both_modes():
+    results = bench_hazards(size=200, ticks=100, chunk=50)
+    assert [row[0] for row in results] == ["rects", "masks"]
+    assert results[1][1] <= results[0][1]
+    assert results[0][4] == 0
+
+
+def test_bench_snapshot_restart_beats_reset():
+    results = {row[1]: row for row in bench_snapshot(sizes=(200,), ticks=60, repeats=5)}
+    assert set(results) == {"reset", "snapshot", "restart"}
+    assert results["restart"][2] < results["reset"][2]
+
+
+def test_bench_collision_reports_both_modes():
+    results = bench_collision(tile_widths=(64,), ticks=30)
+    assert [row[2] for row in results] == ["rects", "tiles"]
+    assert results[0][1] == results[1][1] > 0
@@ -1,8 +1,18 @@
+import json
+
 import pygame
+import pytest
 from unittest.mock import Mock, patch
 from platformer import (
     Player, Platform, Spike, Turret, Bullet,
-    Collectible, Checkpoint, create_level,
+    Collectible, Checkpoint, create_level, AssetCache, ASSET_PATHS, pack_atlas,
+    SpatialGrid, IndexedGroup, TurretGroup, IntervalIndex, Renderer, RenderQueue,
+    TextCache, HUD, StaticLayer, InputState, World, BulletSwarm, SwarmBullet,
+    BulletPool, default_level_data, build_level, read_level_json,
+    write_level_json, compile_level, load_compiled_level, load_level,
+    LevelStream, create_streamed_level, Recording, replay, main,
+    FrameProfiler, ProfilerOverlay, sweep, FixedStep, PlatformerEnv, VectorEnv,
+    ObservationRenderer, CollisionMap, make_level_factory, assets,
 )
 
 
@@ -266,3 +276,1166 @@ def test_create_level():
         assert len(spikes) == 6
         assert len(turrets) == 3
         assert len(collectibles) == 10
+
+
+def test_asset_cache_hit_and_miss():
+    cache = AssetCache()
+    first = cache.get('pictures/bullet.png', (15, 15))
+    second = cache.get('pictures/bullet.png', (15, 15))
+    assert first is second
+    assert first.get_size() == (15, 15)
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_asset_cache_decodes_file_once():
+    cache = AssetCache()
+    with patch('pygame.image.load', wraps=pygame.image.load) as load:
+        cache.get('pictures/platform.png', (100, 20), convert="opaque")
+        cache.get('pictures/platform.png', (200, 30), convert="opaque")
+        cache.get('pictures/platform.png', (200, 30), flip=True, convert="opaque")
+        assert load.call_count == 1
+
+
+def test_pack_atlas_serves_subsurface_views(tmp_path):
+    sources = {}
+    for name, size, color in (("a", (40, 30), (255, 0, 0, 255)), ("b", (20, 50), (0, 255, 0, 128)),
+                              ("c", (600, 300), (0, 0, 255, 255))):
+        image = pygame.Surface(size, pygame.SRCALPHA)
+        image.fill(color)
+        image.fill((1, 2, 3, 4), (0, 0, 5, 5))
+        path = str(tmp_path / f"{name}.png")
+        pygame.image.save(image, path)
+        sources[path] = image
+    manifest = str(tmp_path / "atlas.json")
+    regions = pack_atlas(sources, manifest, width=300, max_size=256)
+    assert regions[str(tmp_path / "c.png")][2:] == (256, 128)
+    rects = [pygame.Rect(region) for region in regions.values()]
+    assert not any(rect.colliderect(other) for i, rect in enumerate(rects) for other in rects[i + 1:])
+
+    cache = AssetCache(manifest=manifest)
+    with patch('pygame.image.load', wraps=pygame.image.load) as load:
+        for path in sorted(sources)[:2]:
+            image = cache.get(path, convert=None)
+            assert image.get_parent() is cache.atlas
+            assert pygame.image.tobytes(image, "RGBA") == pygame.image.tobytes(sources[path], "RGBA")
+        assert cache.get('pictures/heart.png', convert=None).get_parent() is None
+        assert load.call_count == 2
+    assert AssetCache(manifest=None).get(sorted(sources)[0], convert=None).get_parent() is None
+
+
+def test_atlas_skips_sources_edited_after_packing(tmp_path):
+    paths = []
+    for name in ("a", "b"):
+        image = pygame.Surface((20, 10), pygame.SRCALPHA)
+        image.fill((255, 0, 0, 255))
+        paths.append(str(tmp_path / f"{name}.png"))
+        pygame.image.save(image, paths[-1])
+    manifest = str(tmp_path / "atlas.json")
+    pack_atlas(paths, manifest)
+    with open(manifest, encoding="utf-8") as file:
+        assert set(json.load(file)["sources"]) == set(paths)
+    edited = pygame.Surface((30, 30), pygame.SRCALPHA)
+    edited.fill((0, 0, 255, 255))
+    pygame.image.save(edited, paths[1])
+    cache = AssetCache(manifest=manifest)
+    assert cache.load_atlas() == 1 and set(cache.regions) == {paths[0]}
+    assert cache.get(paths[0], convert=None).get_parent() is cache.atlas
+    image = cache.get(paths[1], convert=None)
+    assert image.get_parent() is None and image.get_size() == (30, 30)
+
+
+def test_committed_atlas_covers_sprites():
+    cache = AssetCache()
+    assert cache.load_atlas() == len(ASSET_PATHS) - 1
+    assert 'pictures/background.png' not in cache.regions
+    for path, region in cache.regions.items():
+        assert cache.atlas.get_rect().contains(region)
+        source = pygame.image.load(path).get_size()
+        assert max(region.size) == min(256, max(source))
+
+
+def test_asset_cache_lru_eviction():
+    cache = AssetCache(max_variants=2)
+    cache.get('pictures/heart.png', (10, 10))
+    cache.get('pictures/heart.png', (20, 20))
+    cache.get('pictures/heart.png', (10, 10))
+    cache.get('pictures/heart.png', (30, 30))
+    assert len(cache.variants) == 2
+    assert [key[1] for key in cache.variants] == [(10, 10), (30, 30)]
+
+
+def test_asset_cache_converts_after_display_is_created():
+    pygame.display.quit()
+    cache = AssetCache(manifest=None)
+    early = cache.get('pictures/heart.png', (10, 10))
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    try:
+        late = cache.get('pictures/heart.png', (10, 10))
+        assert late is not early
+        assert set(cache.images) == {('pictures/heart.png', None), ('pictures/heart.png', "alpha")}
+        assert cache.get('pictures/heart.png', (10, 10)) is late
+    finally:
+        pygame.display.quit()
+
+
+def test_asset_cache_missing_file_not_cached():
+    cache = AssetCache()
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        with pytest.raises(FileNotFoundError):
+            cache.get('pictures/bullet.png', (15, 15))
+        assert cache.preload() == 0
+    assert len(cache.variants) == 0
+    assert len(cache.images) == 0
+
+
+def test_player_immune_frame_precomputed():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+        player.immune = True
+        player.immune_time = 10 ** 9
+        with patch('pygame.key.get_pressed', return_value={k: False for k in (
+                pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_a,
+                pygame.K_d, pygame.K_w, pygame.K_SPACE)}):
+            player.update([], [], [], [], 1000, 600, 0, 0, now=1000)
+            assert player.image is player.frames["immune"]
+            player.immune_time = 0
+            player.update([], [], [], [], 1000, 600, 0, 0, now=1000)
+            assert player.image is player.frames["normal"]
+        assert player.frames["immune"].get_size() == player.frames["normal"].get_size()
+
+
+def test_spatial_grid_query_insert_remove():
+    grid = SpatialGrid(cell_size=100)
+    near = Mock(rect=pygame.Rect(10, 10, 20, 20))
+    far = Mock(rect=pygame.Rect(1000, 10, 20, 20))
+    wide = Mock(rect=pygame.Rect(0, 500, 2000, 40))
+    for item in (near, far, wide):
+        grid.insert(item)
+    assert grid.query(pygame.Rect(0, 0, 50, 50)) == [near]
+    assert grid.query(pygame.Rect(990, 0, 50, 540)) == [far, wide]
+    grid.remove(far)
+    assert grid.query(pygame.Rect(990, 0, 50, 50)) == []
+    assert len(grid) == 2
+
+
+def test_spatial_grid_move():
+    grid = SpatialGrid(cell_size=100)
+    item = Mock(rect=pygame.Rect(10, 10, 10, 10))
+    grid.insert(item)
+    item.rect.x = 450
+    grid.move(item)
+    assert grid.query(pygame.Rect(0, 0, 50, 50)) == []
+    assert grid.query(pygame.Rect(440, 0, 50, 50)) == [item]
+
+
+def test_indexed_group_tracks_removal():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        collectibles = IndexedGroup()
+        item = Collectible(100, 100, "life")
+        collectibles.add(item)
+        assert collectibles.query(item.rect) == [item]
+        collectibles.remove(item)
+        assert collectibles.query(item.rect) == []
+
+
+def test_player_lands_on_indexed_platform():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        platforms = IndexedGroup(Platform(0, 200, 400, 20))
+        player = Player(100, 125)
+        with patch('pygame.key.get_pressed', return_value={k: False for k in (
+                pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_a,
+                pygame.K_d, pygame.K_w, pygame.K_SPACE)}):
+            for _ in range(10):
+                player.update(platforms, [], [], [], 1000, 600, 0, 0)
+        assert player.on_ground
+        assert player.rect.bottom == 200
+
+
+def test_turret_group_indexes_bullets():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        turrets = TurretGroup(Turret(500, 200, "right"))
+        turret = turrets.sprites()[0]
+        turret.shoot()
+        bullet = turret.bullets[0]
+        assert turrets.bullets_near(bullet.rect) == [bullet]
+        turret.remove_bullet(bullet)
+        assert turrets.bullets_near(bullet.rect) == []
+        assert turret.bullets == []
+
+
+def test_interval_index_query():
+    items = [Mock(rect=pygame.Rect(x, 0, 50, 50)) for x in (0, 300, 600, 900)]
+    ground = Mock(rect=pygame.Rect(0, 500, 5000, 40))
+    index = IntervalIndex(items + [ground], max_span=100)
+    assert index.query(280, 620) == [items[1], items[2], ground]
+    assert index.query(20, 40) == [items[0], ground]
+    assert index.query(6000, 7000) == []
+
+
+def test_renderer_culls_offscreen_entities():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        platforms, spikes, turrets, collectibles, checkpoint = create_level()
+        renderer = Renderer(pygame.Surface((1000, 600)), pygame.Surface((1000, 600)))
+        renderer.set_level(platforms, spikes, turrets, collectibles, checkpoint)
+        visible = renderer.visible(0, 200)
+        assert all(sprite.rect.left < 1000 for sprite in visible)
+        assert platforms.sprites()[0] in visible
+        assert checkpoint not in visible
+        assert renderer.drawn == len(visible)
+        assert renderer.drawn + renderer.culled == 20 + 6 + 3 + 10 + 1
+        renderer.draw(Player(100, 100), 0, 200)
+
+
+def test_render_queue_flushes_one_blits_per_layer():
+    red, blue = pygame.Surface((10, 10)), pygame.Surface((10, 10))
+    red.fill((255, 0, 0))
+    blue.fill((0, 0, 255))
+    queue = RenderQueue()
+    queue.submit(red, pygame.Rect(0, 0, 10, 10), layer=2)
+    for x in range(0, 40, 5):
+        queue.submit(blue, pygame.Rect(x, 0, 10, 10), layer=1)
+    screen = pygame.Surface((50, 10))
+    queue.flush(screen)
+    assert screen.get_at((5, 5)) == (255, 0, 0) and screen.get_at((30, 5)) == (0, 0, 255)
+    assert (queue.draw_calls, queue.blitted, len(queue)) == (2, 9, 9)
+    queue.flush(screen, pygame.Rect(42, 0, 5, 5))
+    assert (queue.draw_calls, queue.blitted) == (3, 10)
+    queue.clear()
+    assert (queue.draw_calls, queue.blitted, len(queue)) == (0, 0, 0)
+
+
+def test_renderer_batches_layers_without_changing_pixels():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        level = create_level()
+        player = Player(100, 100)
+    background = pygame.Surface((1000, 600))
+    background.fill((100, 100, 100))
+    renderer = Renderer(pygame.Surface((1000, 600)), background)
+    renderer.set_level(*level)
+    renderer.draw(player, 0, 200)
+    expected = background.copy()
+    for sprite in renderer.visible(0, 200) + [player]:
+        expected.blit(sprite.image, sprite.rect.move(0, -200))
+    assert pygame.image.tobytes(renderer.screen, "RGB") == pygame.image.tobytes(expected, "RGB")
+    assert renderer.queue.blitted == renderer.drawn + 1
+    assert renderer.queue.draw_calls <= len(Renderer.LAYERS) < renderer.queue.blitted
+
+
+def test_text_cache_renders_once_and_evicts():
+    pygame.font.init()
+    font = pygame.font.Font(None, 24)
+    cache = TextCache(max_size=2)
+    first = cache.render(font, "a", True, (255, 255, 255))
+    assert cache.render(font, "a", True, (255, 255, 255)) is first
+    cache.render(font, "b", True, (255, 255, 255))
+    cache.render(font, "c", True, (255, 255, 255))
+    assert cache.renders == 3
+    assert len(cache.surfaces) == 2
+    cache.render(font, "a", True, (255, 255, 255))
+    assert cache.renders == 4
+
+
+def test_hud_steady_state_frame_does_not_render():
+    pygame.font.init()
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+    hud = HUD(pygame.font.Font(None, 36), pygame.font.Font(None, 24))
+    screen = pygame.Surface((1000, 600))
+    hud.draw(screen, player)
+    renders = hud.text_cache.renders
+    hud.draw(screen, player)
+    assert hud.text_cache.renders == renders
+    player.score += 10
+    hud.draw(screen, player)
+    assert hud.text_cache.renders == renders + 1
+
+
+def test_dirty_renderer_matches_full_redraw():
+    pygame.font.init()
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        level = create_level()
+        player = Player(100, 100)
+        turret = level[2].sprites()[0]
+        turret.shoot()
+    font = pygame.font.Font(None, 36)
+    small_font = pygame.font.Font(None, 24)
+    background = pygame.Surface((1000, 600))
+    background.fill((100, 100, 100))
+    full = Renderer(pygame.Surface((1000, 600)), background, HUD(font, small_font))
+    dirty = Renderer(pygame.Surface((1000, 600)), background, HUD(font, small_font), dirty=True)
+    for renderer in (full, dirty):
+        renderer.set_level(*level)
+    for frame in range(5):
+        player.rect.x += 7
+        turret.bullets[0].rect.x -= 5
+        if frame == 3:
+            player.score += 10
+            level[3].remove(level[3].sprites()[0])
+        full.draw(player, 0, 200)
+        dirty.draw(player, 0, 200)
+        if frame > 0:
+            assert dirty.updated_rects is not None
+        assert pygame.image.tobytes(full.screen, "RGB") == pygame.image.tobytes(dirty.screen, "RGB")
+    dirty.draw(player, 10, 200)
+    assert dirty.updated_rects is None
+
+
+def test_static_layer_builds_lazily_and_evicts():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        platforms = [Platform(x, 700, 100, 20) for x in range(0, 10000, 500)]
+    layer = StaticLayer(platforms, chunk_width=1000, max_chunks=3)
+    assert layer.built == 0
+    blits = layer.blits(1500, 0, 1000)
+    assert [position for surface, position in blits] == [(-500, 0), (500, 0)]
+    assert len(layer.chunks) == 3
+    for camera_x in range(0, 9000, 250):
+        layer.blits(camera_x, 0, 1000)
+        assert len(layer.chunks) <= 3
+    assert set(layer.chunks) <= {7, 8, 9}
+
+
+def test_baked_renderer_matches_sprite_renderer():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        level = create_level()
+        player = Player(100, 100)
+    background = pygame.Surface((1000, 600))
+    background.fill((100, 100, 100))
+    plain = Renderer(pygame.Surface((1000, 600)), background)
+    baked = Renderer(pygame.Surface((1000, 600)), background, bake_static=True)
+    for renderer in (plain, baked):
+        renderer.set_level(*level)
+    for camera_x in (0, 700, 2100, 3000):
+        plain.draw(player, camera_x, 200)
+        baked.draw(player, camera_x, 200)
+        assert pygame.image.tobytes(plain.screen, "RGB") == pygame.image.tobytes(baked.screen, "RGB")
+
+
+def test_input_state_from_keys():
+    keys = {pygame.K_LEFT: False, pygame.K_a: True, pygame.K_RIGHT: False, pygame.K_d: False,
+            pygame.K_UP: False, pygame.K_w: False, pygame.K_SPACE: True}
+    assert InputState.from_keys(keys) == InputState(left=True, jump=True)
+
+
+def test_player_update_with_explicit_controls():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+    with patch('pygame.key.get_pressed', side_effect=AssertionError):
+        player.update([], [], [], [], 1000, 600, 0, 0, controls=InputState(right=True), now=0)
+    assert player.vel_x == 6
+
+
+def test_world_steps_headless_with_fixed_clock():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+    with patch('pygame.time.get_ticks', side_effect=AssertionError):
+        world.run(120)
+        assert world.now == 2000
+        assert all(len(turret.bullets) == 0 for turret in world.turrets)
+        world.step()
+        active = world.turrets.active(world.camera_x, world.camera_x + world.screen_width)
+        assert active and all(len(turret.bullets) == 1 for turret in active)
+        assert all(not turret.bullets for turret in world.turrets if turret not in active)
+        assert world.player.on_ground
+        start_x = world.player.rect.x
+        world.run(30, InputState(right=True))
+        assert world.player.rect.x > start_x
+        assert world.tick == 151
+
+
+def test_world_reset():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        world.run(10, InputState(right=True))
+        world.game_over = True
+        world.step()
+        assert world.tick == 10
+        world.reset()
+    assert world.tick == 0
+    assert not world.finished
+    assert world.player.rect.topleft == (100, 100)
+
+
+BRANCH_PATTERN = [InputState(right=True)] * 50 + [InputState(right=True, jump=True)] * 5 + [InputState(left=True)] * 10
+
+
+def run_branch(world, ticks, pattern=BRANCH_PATTERN):
+    trace = []
+    for tick in range(ticks):
+        world.step(pattern[tick % len(pattern)])
+        trace.append(world.checksum())
+    return trace, world.player.score, len(world.collectibles)
+
+
+@pytest.mark.parametrize("options", [{}, {"bullet_swarm": True}, {"level_factory": create_streamed_level}])
+def test_world_restore_replays_branch(options):
+    if options.get("bullet_swarm"):
+        pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World(**options)
+        world.run(100, InputState(right=True, jump=True))
+        state = world.snapshot()
+        branches = []
+        for pattern in ([InputState(right=True, jump=True)], BRANCH_PATTERN, [InputState(right=True, jump=True)]):
+            world.restore(state)
+            branches.append(run_branch(world, 600, pattern))
+    assert branches[0] == branches[2] != branches[1]
+    assert branches[0][1] > 0
+
+
+def test_world_restart_matches_fresh_world():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        first = run_branch(world, 900)
+        world.restart()
+        assert world.tick == 0 and world.player.lives == 3 and world.player.score == 0
+        assert run_branch(world, 900) == run_branch(World(), 900) == first
+
+
+def test_world_checkpoints_respawn_player():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World(checkpoints=True)
+        world.run(400, InputState(right=True, jump=True))
+        assert world.saved is not None
+        spawn = world.player.spawn
+        assert spawn[0] >= 100 + World.CHECKPOINT_DISTANCE
+        lives = world.player.lives
+        tick = world.saved.tick
+        world.player.rect.top = 2000
+        world.step()
+        assert world.player.rect.topleft == spawn
+        assert world.player.lives == lives - 1
+        world.game_over = True
+        world.respawn()
+    assert world.tick == tick and not world.finished
+    assert world.player.rect.topleft == spawn
+
+
+def test_bullet_swarm_moves_and_compacts():
+    pytest.importorskip("numpy")
+    assets.clear()
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        wall = Platform(200, 0, 20, 400)
+        swarm = BulletSwarm([wall], capacity=2)
+    for y in (50, 100, 150):
+        swarm.spawn(100, y, 5, 0)
+    swarm.spawn(300, 50, 5, 0)
+    assert len(swarm) == 4
+    for _ in range(19):
+        swarm.update()
+    assert len(swarm) == 4
+    swarm.update()
+    assert len(swarm) == 1
+    assert swarm.x[0] == 300 - 5 + 20 * 5
+    assert swarm.hit(pygame.Rect(int(swarm.x[0]), 40, 20, 20)) == 1
+    assert len(swarm) == 0
+
+
+def test_bullet_swarm_platform_cells_match_brute_force():
+    pytest.importorskip("numpy")
+    rng = __import__("random").Random(5)
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        platforms = [Platform(rng.randrange(20000), rng.randrange(800), rng.randrange(1, 400), rng.randrange(1, 60))
+                     for _ in range(300)] + [Platform(0, 780, 20000, 20)]
+        swarm = BulletSwarm(platforms, level_width=20000)
+    for _ in range(2000):
+        swarm.spawn(rng.randrange(-100, 20100), rng.randrange(-50, 850), rng.choice((-5, 5, 40)), rng.choice((0, 7)))
+    x, y = swarm.x[:len(swarm)] + swarm.vel_x[:len(swarm)], swarm.y[:len(swarm)] + swarm.vel_y[:len(swarm)]
+    expected = []
+    for bx, by, vx, vy in zip(x.tolist(), y.tolist(), swarm.vel_x[:len(swarm)].tolist(),
+                              swarm.vel_y[:len(swarm)].tolist()):
+        path = pygame.Rect(bx - max(vx, 0), by - max(vy, 0), swarm.width + abs(vx), swarm.height + abs(vy))
+        if -50 <= bx + swarm.width and bx <= 20050 and path.collidelist([p.rect for p in platforms]) < 0:
+            expected.append((bx, by))
+    swarm.update()
+    assert sorted(zip(swarm.x[:len(swarm)].tolist(), swarm.y[:len(swarm)].tolist())) == sorted(expected)
+    assert 0 < len(expected) < 2000
+
+
+def test_bullet_swarm_matches_sprite_bullets():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        worlds = [World(), World(bullet_swarm=True)]
+        for world in worlds:
+            world.run(1200)
+    sprite_world, swarm_world = worlds
+    assert swarm_world.player.rect == sprite_world.player.rect
+    assert swarm_world.player.lives == sprite_world.player.lives
+    sprite_bullets = sorted(bullet.rect.topleft for turret in sprite_world.turrets for bullet in turret.bullets)
+    swarm_bullets = sorted(zip(swarm_world.turrets.swarm.x[:len(swarm_world.turrets.swarm)].tolist(),
+                               swarm_world.turrets.swarm.y[:len(swarm_world.turrets.swarm)].tolist()))
+    assert swarm_bullets == sprite_bullets
+
+
+def test_bullet_pool_recycles_instances():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        pool = BulletPool(max_size=1)
+        first = pool.acquire(100, 100, 5, 0)
+        second = pool.acquire(200, 100, -5, 0)
+        pool.release(first)
+        pool.release(second)
+        assert pool.free == [first]
+        reused = pool.acquire(300, 50, -5, 0)
+    assert reused is first
+    assert reused.rect.center == (300, 50)
+    assert reused.vel_x == -5
+    assert reused.image is second.image
+    assert pool.created == 2
+    assert pool.reused == 1
+    assert not hasattr(reused, "__dict__")
+
+
+def test_turret_returns_bullets_to_pool():
+    with patch('pygame.image.load', side_effect=FileNotFoundError), \
+            patch('platformer.bullet_pool', BulletPool()) as pool:
+        turret = Turret(500, 200, "right")
+        turret.shoot()
+        bullet = turret.bullets[0]
+        turret.update(Mock(), [Platform(600, 0, 20, 400)], now=0)
+        for _ in range(20):
+            turret.update(Mock(), [Platform(600, 0, 20, 400)], now=0)
+        assert turret.bullets == []
+        assert pool.free == [bullet]
+        turret.shoot()
+        assert turret.bullets[0] is bullet
+
+
+def test_create_level_loads_default_level_file():
+    with patch('pygame.image.load', side_effect=FileNotFoundError), \
+            patch('platformer.load_level', wraps=load_level) as loader:
+        platforms, spikes, turrets, collectibles, checkpoint = create_level()
+    loader.assert_called_once_with('levels/default.json')
+    data = read_level_json('levels/default.json')
+    assert len(platforms) == len(data["platforms"]) + len(data["vertical_platforms"])
+    assert checkpoint.rect.topleft == tuple(data["checkpoint"])
+
+
+@pytest.mark.parametrize("suffix", [".json", ".lvl"])
+def test_world_uses_size_of_loaded_level(tmp_path, suffix):
+    data = {"width": 10000, "height": 1200, "platforms": [(0, 1160, 10000, 40)], "turrets": [(9000, 1100, "right")],
+            "checkpoint": (9900, 1080)}
+    path = str(tmp_path / f"wide{suffix}")
+    if suffix == ".json":
+        write_level_json(data, path)
+    else:
+        compile_level(data, path)
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        level = load_level(path)
+        assert (level.width, level.height) == (10000, 1200)
+        world = World(make_level_factory(path))
+        world.player.rect.topleft = (8000, 1000)
+        world.run(130)
+        assert sum(len(turret.bullets) for turret in world.turrets) == 1
+        world.run(30, InputState(right=True))
+    assert (world.stream is not None) == (suffix == ".lvl")
+    assert (world.level_width, world.level_height) == (10000, 1200)
+    assert (world.player.level_width, world.player.level_height) == (10000, 1200)
+    assert [turret.level_width for turret in world.turrets] == [10000]
+    assert world.player.rect.x > 8000 and world.player.lives == 3
+    assert world.camera_x > 4000 and world.camera_y == 1200 - world.screen_height
+
+
+def test_read_level_json_rejects_unknown_item(tmp_path):
+    data = default_level_data()
+    data["items"] = [(0, 0, "coin")]
+    path = str(tmp_path / "bad.json")
+    write_level_json(data, path)
+    with pytest.raises(ValueError):
+        read_level_json(path)
+
+
+def test_compiled_level_round_trip(tmp_path):
+    path = str(tmp_path / "level.lvl")
+    compile_level(default_level_data(), path)
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        built = build_level(default_level_data())
+        loaded = load_compiled_level(path)
+        assert load_level(path)[4].rect == built[4].rect
+    for built_group, loaded_group in zip(built[:4], loaded[:4]):
+        assert sorted(map(tuple, (s.rect for s in built_group))) == sorted(map(tuple, (s.rect for s in loaded_group)))
+    assert sorted(type(s).__name__ for s in loaded[0]) == sorted(type(s).__name__ for s in built[0])
+    assert [s.type for s in loaded[3]] == [s.type for s in sorted(built[3], key=lambda s: (s.rect.x, s.rect.y))]
+    probe = pygame.Rect(0, 0, 64, 64)
+    for x in range(0, 4000, 50):
+        for y in range(0, 800, 50):
+            probe.topleft = (x, y)
+            for built_group, loaded_group in zip(built[:4], loaded[:4]):
+                assert {tuple(s.rect) for s in built_group.query(probe) if s.rect.colliderect(probe)} == \
+                    {tuple(s.rect) for s in loaded_group.query(probe) if s.rect.colliderect(probe)}
+    item = loaded[3].sprites()[0]
+    loaded[3].remove(item)
+    assert item not in loaded[3].query(item.rect)
+
+
+def test_load_compiled_level_rejects_other_files(tmp_path):
+    path = tmp_path / "level.lvl"
+    path.write_bytes(b"not a level at all")
+    with pytest.raises(ValueError):
+        load_compiled_level(str(path))
+
+
+def long_level_data(width=40000):
+    return {
+        "width": width,
+        "height": 800,
+        "platforms": [(x, 760, 2000, 40) for x in range(0, width, 2000)] + [(x, 600, 100, 20) for x in range(300, width, 400)],
+        "vertical_platforms": [],
+        "spikes": [],
+        "turrets": [(x, 500, "left") for x in range(500, width, 1000)],
+        "items": [(x, 700, "life") for x in range(250, width, 500)],
+        "checkpoint": (width - 100, 680),
+    }
+
+
+def test_level_stream_keeps_only_nearby_sections():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        stream = LevelStream(long_level_data(), section_width=1000, margin=500)
+        stream.update(0, 1000)
+        assert all(sprite.rect.left < 2000 for sprite in stream.live.values())
+        turret = next(iter(stream.turrets))
+        turret.shoot()
+        assert stream.update(20000, 1000)
+        assert not stream.update(20000, 1000)
+        loaded = len(stream.live)
+        stream.update(30000, 1000)
+        assert len(stream.live) == loaded
+        stream.update(20000, 1000)
+    assert all(18000 <= sprite.rect.right and sprite.rect.left < 22000 for sprite in stream.live.values())
+    assert turret not in stream.turrets and not turret.bullets
+    assert set(stream.platforms) == {sprite for sprite in stream.live.values() if isinstance(sprite, Platform)}
+    assert len(stream.platforms.query(pygame.Rect(20000, 0, 1000, 800))) > 0
+
+
+def test_level_stream_remembers_collected_items():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        stream = LevelStream(long_level_data(), section_width=1000, margin=500)
+        stream.update(0, 1000)
+        item = next(sprite for sprite in stream.collectibles if sprite.rect.x == 250)
+        stream.collectibles.remove(item)
+        stream.update(20000, 1000)
+        stream.update(0, 1000)
+    assert all(sprite.rect.x != 250 for sprite in stream.collectibles)
+    assert any(sprite.rect.x == 750 for sprite in stream.collectibles)
+
+
+def test_compiled_level_streams_sections_near_camera(tmp_path):
+    path = str(tmp_path / "long.lvl")
+    compile_level(long_level_data(), path)
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        compiled = make_level_factory(path)()
+        direct = LevelStream(long_level_data())
+        for camera_x in (0, 20000, 39000, 0):
+            compiled.update(camera_x)
+            direct.update(camera_x)
+            for compiled_group, direct_group in zip(compiled.level[:4], direct.level[:4]):
+                assert sorted(tuple(s.rect) for s in compiled_group) == sorted(tuple(s.rect) for s in direct_group)
+    assert 0 < len(compiled.live) < 20
+
+
+def test_world_walks_through_streamed_level():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        full = World()
+        streamed = World(create_streamed_level)
+        for world in (full, streamed):
+            world.run(240, InputState(right=True))
+    assert streamed.stream is not None and full.stream is None
+    assert streamed.player.rect.topleft == full.player.rect.topleft
+    assert streamed.camera_x == full.camera_x
+    assert len(streamed.stream.live) < sum(len(group) for group in full.level[:4])
+
+
+def record_session(ticks=400):
+    world = World()
+    recording = Recording(world.tick_rate)
+    pattern = [InputState(right=True)] * 50 + [InputState(right=True, jump=True)] * 5 + [InputState(left=True)] * 10
+    for tick in range(ticks):
+        controls = pattern[tick % len(pattern)]
+        recording.append(controls)
+        world.step(controls)
+    recording.finish(world)
+    return world, recording
+
+
+def test_input_state_bits_round_trip():
+    for bits in range(8):
+        assert InputState.from_bits(bits).bits == bits
+    assert InputState(right=True, jump=True).bits == 6
+
+
+def test_recording_replays_to_same_checksum(tmp_path):
+    path = str(tmp_path / "session.rec")
+    with patch('pygame.image.load', side_effect=FileNotFoundError), \
+            patch('pygame.time.get_ticks', side_effect=AssertionError):
+        world, recording = record_session()
+        recording.save(path)
+        loaded = Recording.load(path)
+        replayed, matched = replay(loaded)
+        assert main(["--replay", path]) == 0
+        loaded.inputs[:200] = bytes(200)
+        assert not replay(loaded)[1]
+    assert matched
+    assert len(loaded) == 400 and loaded.tick_rate == 60
+    assert replayed.player.rect == world.player.rect
+    assert any(turret.bullets for turret in replayed.turrets)
+
+
+def test_recording_load_rejects_other_files(tmp_path):
+    path = tmp_path / "session.rec"
+    path.write_bytes(b"PLVL")
+    with pytest.raises(ValueError):
+        Recording.load(str(path))
+
+
+class FakeClock:
+    def __init__(self, step=0.001):
+        self.time = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.time += self.step
+        return self.time
+
+
+def test_frame_profiler_laps_and_percentiles():
+    profiler = FrameProfiler(window=100, keep_history=True, clock=FakeClock())
+    for _ in range(150):
+        profiler.begin_frame()
+        profiler.mark("input")
+        profiler.mark("render")
+        profiler.mark("render")
+        profiler.end_frame()
+    profiler.mark("flip")
+    assert len(profiler) == 100 and len(profiler.history) == 150
+    assert profiler.percentiles("input") == pytest.approx((1.0, 1.0, 1.0))
+    assert profiler.percentiles("render") == pytest.approx((2.0, 2.0, 2.0))
+    assert profiler.percentiles("flip") == (0.0, 0.0, 0.0)
+    assert profiler.summary()["total"] == pytest.approx((3.0, 3.0, 3.0))
+
+
+def test_frame_profiler_percentiles_of_spikes():
+    profiler = FrameProfiler(window=100, clock=FakeClock(0))
+    for value in range(1, 101):
+        profiler.recent.append((float(value),) + (0.0,) * 7)
+    assert profiler.percentiles("input") == (50.0, 95.0, 99.0)
+
+
+def test_frame_profiler_export(tmp_path):
+    profiler = FrameProfiler(keep_history=True, clock=FakeClock())
+    for _ in range(3):
+        profiler.begin_frame()
+        profiler.mark("player")
+        profiler.end_frame()
+    profiler.export(str(tmp_path / "frames.csv"))
+    profiler.export(str(tmp_path / "frames.json"))
+    rows = (tmp_path / "frames.csv").read_text().splitlines()
+    assert rows[0].split(",") == ["frame", *FrameProfiler.STAGES, "total"]
+    assert len(rows) == 4
+    data = json.loads((tmp_path / "frames.json").read_text())
+    assert data["stages"] == list(FrameProfiler.STAGES)
+    assert len(data["frames"]) == 3
+    assert data["percentiles"]["player"]["p50"] == pytest.approx(1.0)
+
+
+def test_world_and_renderer_report_stages():
+    pygame.font.init()
+    profiler = FrameProfiler(clock=FakeClock())
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        renderer = Renderer(pygame.Surface((1000, 600)), pygame.Surface((1000, 600)),
+                            HUD(pygame.font.Font(None, 36), pygame.font.Font(None, 24)))
+        renderer.set_level(*world.level)
+        world.profiler = renderer.profiler = profiler
+        profiler.begin_frame()
+        world.step()
+        renderer.draw(world.player, world.camera_x, world.camera_y)
+        profiler.end_frame()
+    stages = dict(zip(FrameProfiler.STAGES, profiler.recent[0]))
+    for stage in ("player", "turrets", "checkpoint", "camera", "render", "hud"):
+        assert stages[stage] == pytest.approx(1.0)
+    overlay = ProfilerOverlay(profiler, pygame.font.Font(None, 20))
+    screen = pygame.Surface((1000, 600))
+    rect = overlay.draw(screen)
+    assert rect.topleft == overlay.position and rect.height > 9 * overlay.font.get_linesize()
+    assert overlay.draw(screen) == rect
+
+
+def test_sweep_finds_first_obstacle_on_path():
+    wall = Mock(rect=pygame.Rect(100, 0, 20, 100))
+    far = Mock(rect=pygame.Rect(200, 0, 20, 100))
+    rect = pygame.Rect(0, 10, 10, 10)
+    time, hit, axis = sweep(rect, 300, 0, [far, wall])
+    assert hit is wall and axis == "x"
+    assert time == pytest.approx(90 / 300)
+    assert sweep(rect, 80, 0, [wall]) == (1.0, None, None)
+    assert sweep(rect, 0, 300, [wall])[1] is None
+    floor = Mock(rect=pygame.Rect(0, 50, 100, 20))
+    assert sweep(rect, 0, 200, [floor])[1:] == (floor, "y")
+    assert sweep(pygame.Rect(0, 40, 10, 10), 50, 0, [floor])[1] is None
+
+
+def test_sweep_ignores_obstacles_it_leaves():
+    block = Mock(rect=pygame.Rect(0, 0, 20, 20))
+    assert sweep(pygame.Rect(10, 0, 10, 10), 30, 0, [block])[1] is None
+    assert sweep(pygame.Rect(5, 0, 10, 10), 2, 0, [block])[:2] == (0.0, block)
+
+
+def test_fast_player_does_not_tunnel_through_thin_wall():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+        wall = Platform(180, 0, 20, 400)
+    player.speed_boost = 60
+    player.update([wall], [], [], [], 1000, 600, 0, 0, controls=InputState(right=True), now=0)
+    assert player.rect.right == wall.rect.left
+
+
+def test_fast_bullet_stops_at_thin_wall():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        bullet = Bullet(0, 50, 50, 0)
+        wall = Platform(30, 0, 20, 100)
+    assert bullet.update([wall])
+    assert bullet.rect.right == wall.rect.left
+
+
+def test_fast_swarm_bullet_does_not_tunnel():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        swarm = BulletSwarm([Platform(30, 0, 20, 100)])
+    swarm.spawn(0, 50, 50, 0)
+    swarm.update()
+    assert len(swarm) == 0
+
+
+def test_fixed_step_accumulates_and_drops_backlog():
+    fixed_step = FixedStep(tick_rate=60, max_steps=5)
+    assert fixed_step.advance(1 / 60) == 1
+    assert fixed_step.advance(0.5 / 60) == 0
+    assert fixed_step.alpha == pytest.approx(0.5)
+    assert fixed_step.advance(0.75 / 60) == 1
+    assert fixed_step.alpha == pytest.approx(0.25)
+    assert fixed_step.advance(1.0) == 5
+    assert fixed_step.dropped == 55
+    assert fixed_step.alpha == 0
+    rendered = sum(fixed_step.advance(1 / 144) for _ in range(144))
+    assert rendered == 60
+
+
+@pytest.mark.parametrize("tick_rate", [30, 120])
+def test_world_speed_does_not_depend_on_tick_rate(tick_rate):
+    def trace(rate):
+        with patch('pygame.image.load', side_effect=FileNotFoundError):
+            world = World(tick_rate=rate)
+        points = []
+        for step in range(90):
+            world.run(rate // 30, InputState(right=step % 20 < 14, jump=step % 15 == 0))
+            points.append(world.player.rect.topleft)
+        bullets = sorted(bullet.rect.topleft for turret in world.turrets for bullet in turret.bullets)
+        return points, bullets
+
+    reference, reference_bullets = trace(60)
+    points, bullets = trace(tick_rate)
+    assert max(abs(x - x0) + abs(y - y0) for (x, y), (x0, y0) in zip(points, reference)) <= 2
+    assert bullets and bullets == reference_bullets
+
+
+def test_world_interpolates_between_ticks():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        assert world.interpolate(0.5) == world.interpolate(1.0)
+        world.run(30)
+        world.step(InputState(right=True))
+    x = world.player.rect.x
+    assert world.interpolate(1.0)[0] == x
+    assert world.interpolate(0.0)[0] == x - world.player.speed
+    assert world.interpolate(0.5)[0] == x - world.player.speed // 2
+    world._previous = (x - 500,) + world._previous[1:]
+    assert world.interpolate(0.5)[0] == x
+
+
+def test_renderer_draws_interpolated_player_and_bullets():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+        turret = Turret(300, 100, "right")
+        turrets = TurretGroup(turret)
+        turret.shoot()
+    renderer = Renderer(pygame.Surface((1000, 600)), pygame.Surface((1000, 600)))
+    renderer.set_level(IndexedGroup(), IndexedGroup(), turrets, IndexedGroup(), Checkpoint(900, 100))
+    bullet = turret.bullets[0]
+    renderer.draw(player, 10, 0, player_pos=(90, 100), alpha=0.4)
+    assert renderer._last_frame[player][1].topleft == (80, 100)
+    assert renderer._last_frame[bullet][1].x == bullet.rect.x - 10 - 3
+    assert player.rect.topleft == (100, 100)
+
+
+def test_renderer_interpolates_swarm_bullets():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        player = Player(100, 100)
+        turrets = TurretGroup()
+        turrets.use_swarm(BulletSwarm())
+    turrets.swarm.spawn(300, 100, 8, -4)
+    renderer = Renderer(pygame.Surface((1000, 600)), pygame.Surface((1000, 600)))
+    renderer.set_level(IndexedGroup(), IndexedGroup(), turrets, IndexedGroup(), Checkpoint(900, 100))
+    renderer.draw(player, 10, 0, alpha=0.5)
+    rects = [rect for sprite, (image, rect) in renderer._last_frame.items() if isinstance(sprite, SwarmBullet)]
+    swarm = turrets.swarm
+    assert [rect.topleft for rect in rects] == [(int(swarm.x[0]) - 10 - 4, int(swarm.y[0]) + 2)]
+
+
+def test_env_step_and_reset():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        env = PlatformerEnv(max_ticks=40, frame_skip=2)
+        observation = env.reset()
+        assert len(observation) == PlatformerEnv.OBSERVATION_SIZE
+        env.step(0)
+        for _ in range(8):
+            observation, reward, done, info = env.step(InputState(right=True).bits)
+        assert reward > 0 and not done
+        assert info["tick"] == 18 and info["lives"] == 3
+        assert observation[PlatformerEnv.OBSERVATION_FIELDS.index("vel_x")] == pytest.approx(0.6)
+        for _ in range(11):
+            done = env.step(0)[2]
+        assert done
+        out = [0.0] * PlatformerEnv.OBSERVATION_SIZE
+        assert env.observe(out) is out
+        env.reset()
+    assert env.world.tick == 0
+
+
+def test_vector_env_matches_sequential_envs():
+    pytest.importorskip("numpy")
+    actions = [[InputState(right=True).bits, 0, InputState(left=True, jump=True).bits]] * 30 + [[4, 2, 1]] * 30
+    envs = [PlatformerEnv(max_ticks=50) for _ in range(3)]
+    expected = [env.reset() for env in envs]
+    with VectorEnv(3, workers=2, max_ticks=50) as vector:
+        observations = vector.reset()
+        assert observations.shape == (3, PlatformerEnv.OBSERVATION_SIZE)
+        assert (observations == expected).all()
+        for step_actions in actions:
+            observations, rewards, dones = vector.step(step_actions)
+            for index, env in enumerate(envs):
+                observation, reward, done, info = env.step(step_actions[index])
+                if done:
+                    observation = env.reset()
+                assert dones[index] == done
+                assert rewards[index] == pytest.approx(reward)
+                assert list(observations[index]) == pytest.approx(list(observation))
+        assert dones.dtype == bool
+
+
+@pytest.mark.parametrize("observation, shape", [("grid", (12, 20)), ("pixels", (12, 20, 3))])
+def test_vector_env_shares_frame_observations(observation, shape):
+    pytest.importorskip("numpy")
+    env = PlatformerEnv(max_ticks=20, observation=observation, observation_size=(20, 12))
+    expected = env.reset().copy()
+    with VectorEnv(2, workers=2, max_ticks=20, observation=observation, observation_size=(20, 12)) as vector:
+        observations = vector.reset()
+        assert observations.shape == (2,) + shape and observations.dtype == "uint8"
+        assert (observations == expected).all()
+        observations, rewards, dones = vector.step([InputState(right=True).bits] * 2)
+        assert (observations == env.step(InputState(right=True).bits)[0]).all()
+        assert rewards[0] == rewards[1]
+
+
+def test_vector_env_rejects_unknown_observation():
+    pytest.importorskip("numpy")
+    with pytest.raises(ValueError, match="unknown observation mode"):
+        VectorEnv(2, observation="depth")
+
+
+def test_observation_grid_marks_semantic_classes():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        world.run(130)
+        renderer = ObservationRenderer(50, 30, mode="grid")
+        frame = renderer.render(world)
+    classes = ObservationRenderer.CLASSES
+    assert frame is renderer.array and frame.shape == (30, 50)
+    assert (frame[-1] == classes["platform"]).all()
+    x = (world.player.rect.x - world.camera_x) // 20
+    y = (world.player.rect.y - world.camera_y) // 20
+    assert frame[y + 1, x + 1] == classes["player"]
+    assert (frame == classes["bullet"]).any() and (frame == classes["turret"]).any()
+    renderer.render(world, camera_x=world.camera_x + 20)
+    assert frame[y + 1, x] == classes["player"]
+
+
+def test_observation_pixels_share_memory_with_surface():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World()
+        renderer = ObservationRenderer(100, 60)
+        frame = renderer.render(world)
+        env = PlatformerEnv(observation="grid", observation_size=(20, 12))
+        assert env.reset().shape == (12, 20)
+    assert frame.shape == (60, 100, 3)
+    assert tuple(frame[0, 99]) == (100, 100, 100)
+    x = (world.player.rect.centerx - world.camera_x) // 10
+    y = (world.player.rect.centery - world.camera_y) // 10
+    assert tuple(frame[y, x]) != (100, 100, 100)
+    renderer.surface.fill((1, 2, 3))
+    assert tuple(frame[30, 50]) == (1, 2, 3)
+    with pytest.raises(ValueError):
+        ObservationRenderer(mode="depth")
+
+
+def test_turret_group_activates_turrets_near_camera_strip():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        near, edge, far = Turret(300, 0), Turret(1400, 0), Turret(5000, 0)
+        group = TurretGroup(near, edge, far)
+        assert group.active(0, 1000) == [near, edge]
+        edge.activation_radius = 100
+        late = Turret(-400, 0)
+        group.add(late)
+        assert group.active(0, 1000) == [late, near]
+        group.remove(near)
+        assert group.active(0, 1000) == [late]
+
+
+def test_turret_bullets_despawn_outside_camera_margin():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        turret = Turret(900, 0)
+        group = TurretGroup(turret, despawn_margin=200)
+        group.update_near(Mock(), [], 2001, 0, 1000)
+        assert len(turret.bullets) == 1
+        for now in range(2002, 2030):
+            group.update_near(Mock(), [], now, 0, 1000)
+        assert len(turret.bullets) == 1
+        group.update_near(Mock(), [], 5000, 3000, 4000)
+        assert not turret.bullets and not group.bullet_grid.query(pygame.Rect(0, 0, 2000, 100))
+
+
+def test_far_turrets_do_not_fire():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        def level():
+            turrets = TurretGroup(*(Turret(x, 700) for x in range(0, 20000, 400)))
+            return [Platform(0, 780, 20000, 20)], [], turrets, [], Checkpoint(19900, 700)
+        world = World(level)
+        world.level_width = 20000
+        world.run(600)
+    assert sum(len(turret.bullets) for turret in world.turrets) <= 10
+    assert sum(turret.last_shot > 0 for turret in world.turrets) == 4
+
+
+def aligned_level_data():
+    return {
+        "width": 4000,
+        "height": 800,
+        "platforms": [(0, 760, 4000, 40), (400, 640, 160, 24), (800, 560, 200, 16), (1200, 680, 96, 80),
+                      (1600, 520, 240, 32), (2000, 600, 400, 16), (2600, 640, 56, 120)],
+        "vertical_platforms": [(1000, 600, 32, 160)],
+        "spikes": [],
+        "turrets": [(1500, 600, "left"), (2500, 560, "right")],
+        "items": [],
+        "checkpoint": (3900, 680),
+    }
+
+
+def test_collision_map_marks_every_overlapped_cell():
+    collision_map = CollisionMap(64, 64, cell_size=8)
+    left, right = Mock(rect=pygame.Rect(8, 16, 16, 8)), Mock(rect=pygame.Rect(20, 16, 12, 8))
+    collision_map.add(left)
+    collision_map.add(Mock(rect=pygame.Rect(37, 37, 2, 2)))
+    collision_map.add(Mock(rect=pygame.Rect(50, 0, 0, 8)))
+    assert [collision_map.solid(x, 20) for x in (4, 8, 20, 24)] == [False, True, True, False]
+    assert collision_map.solid(37, 37) and collision_map.solid(50, 4) and not collision_map.solid(58, 4)
+    collision_map.add(right)
+    collision_map.remove(left)
+    assert [collision_map.solid(x, 20) for x in (8, 15, 16, 30, 32)] == [False, False, True, True, False]
+    assert collision_map.owners[2] == [right]
+
+
+def test_collision_map_sweep_stops_at_platform_edges():
+    wall, floor, far = (Mock(rect=pygame.Rect(99, 3, 10, 190)), Mock(rect=pygame.Rect(0, 243, 400, 16)),
+                        Mock(rect=pygame.Rect(140, 0, 8, 200)))
+    collision_map = CollisionMap.from_platforms([wall, floor, far], 400, 400, cell_size=8)
+    rect = pygame.Rect(0, 10, 10, 10)
+    assert collision_map.sweep(rect, 300, 0) == (pytest.approx(89 / 300), wall, "x")
+    assert collision_map.sweep(rect, 89, 0) == (1.0, None, None)
+    assert collision_map.sweep(pygame.Rect(200, 10, 10, 10), -100, 0) == (pytest.approx(52 / 100), far, "x")
+    assert collision_map.sweep(pygame.Rect(150, 100, 10, 10), 0, 200) == (pytest.approx(133 / 200), floor, "y")
+    assert collision_map.sweep(pygame.Rect(150, 300, 10, 10), 0, -100)[1] is floor
+    assert collision_map.sweep(pygame.Rect(150, 100, 10, 10), 0, 133) == (1.0, None, None)
+    assert collision_map.sweep(pygame.Rect(100, 100, 5, 5), 5, 0)[1] is wall
+    for dx, dy in ((60, 120), (60, 20), (-70, 100)):
+        rect = pygame.Rect(60, 150, 10, 10)
+        assert collision_map.sweep(rect, dx, dy) == sweep(rect, dx, dy, [wall, floor, far])
+
+
+def test_collision_map_sweep_matches_rect_sweep():
+    rng = __import__("random").Random(11)
+    platforms = [Mock(rect=pygame.Rect(rng.randrange(-50, 1000), rng.randrange(-50, 600), rng.randrange(120),
+                                       rng.randrange(40))) for _ in range(80)]
+    collision_map = CollisionMap.from_platforms(platforms, 1200, 700, left=-56, top=-56)
+    for platform in platforms[::7]:
+        collision_map.remove(platform)
+    remaining = [platform for index, platform in enumerate(platforms) if index % 7]
+    for _ in range(2000):
+        rect = pygame.Rect(rng.randrange(-60, 1000), rng.randrange(-60, 600), rng.randrange(1, 50), rng.randrange(1, 60))
+        dx, dy = rng.choice((0, rng.randrange(-30, 31))), rng.choice((0, rng.randrange(-30, 31)))
+        assert collision_map.sweep(rect, dx, dy) == sweep(rect, dx, dy, remaining)
+
+
+@pytest.mark.parametrize("level_data", [aligned_level_data, default_level_data])
+def test_tile_collision_matches_rect_collision(level_data):
+    rng = __import__("random").Random(3)
+    controls = [InputState(*(rng.random() < p for p in (0.2, 0.6, 0.1))) for _ in range(1500)]
+    checksums = []
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        for tile_collision in (False, True):
+            world = World(lambda: build_level(level_data()), tile_collision=tile_collision)
+            trace = []
+            for state in controls:
+                world.step(state)
+                trace.append(world.checksum())
+            checksums.append(trace)
+    assert world.platforms.collision_map is not None
+    assert checksums[0] == checksums[1]
+
+
+def test_tile_collision_map_follows_streamed_sections():
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        world = World(make_level_factory(stream=True), tile_collision=True)
+        world.run(600, InputState(right=True, jump=True))
+        fresh = CollisionMap.from_platforms(world.platforms, world.level_width, 800)
+    assert world.stream.active
+    assert world.platforms.collision_map.data == fresh.data
+
+
+def test_player_survives_transparent_spike_corner():
+    assets.clear()
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        spike = Spike(200, 100, 50, 50)
+        for pixel_perfect, lives in ((True, 3), (False, 2)):
+            player = Player(151, 31)
+            player.pixel_perfect = pixel_perfect
+            player.update([], [spike], [], [], 1000, 600, 0, 0, controls=InputState(), now=0)
+            assert player.lives == lives
+        player = Player(176, 31)
+        player.update([], [spike], [], [], 1000, 600, 0, 0, controls=InputState(), now=0)
+        assert player.lives == 2
+    assert player.touches(spike.rect, spike.image)
+
+
+def test_hazard_masks_are_shared_per_image():
+    assets.clear()
+    first, second = Spike(0, 0, 40, 40), Spike(500, 0, 40, 40)
+    assert first.image is second.image
+    assert assets.mask(first.image) is assets.mask(second.image)
+    assert len(assets.masks) == 1
+    assert assets.mask(first.image).count() < 40 * 40
+    assets.clear()
+    assert len(assets.masks) == 0
+
+
+def test_swarm_hit_checks_masks_after_rect_overlap():
+    pytest.importorskip("numpy")
+    with patch('pygame.image.load', side_effect=FileNotFoundError):
+        swarm = BulletSwarm()
+    swarm.spawn(105, 105, 5, 0)
+    hollow = pygame.mask.Mask((20, 20))
+    hollow.draw(pygame.mask.Mask((20, 5), fill=True), (0, 15))
+    rect = pygame.Rect(100, 100, 20, 20)
+    assert swarm.hit(rect, hollow) == 0 and len(swarm) == 1
+    assert swarm.hit(rect) == 1 and len(swarm) == 0